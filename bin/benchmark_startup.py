@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+
+BIN_DIR = os.path.dirname(os.path.abspath(__file__))
+COMMANDS = [
+    ("validate", ["reporting.py", "validate"]),
+    ("gen_reports --help", ["reporting.py", "gen_reports", "--help"]),
+    ("gen_stats --help", ["reporting.py", "gen_stats", "--help"]),
+]
+MODULES = ["lib.options", "lib.validate", "lib.intervals", "lib.fragments", "lib.stats", "lib.reports"]
+
+
+def parse_args(args=None):
+    Description = "Time the startup of the reporting subcommands and the import of each reporting library module in fresh interpreters."
+    Epilog = "Example usage: python benchmark_startup.py --repeats 10"
+
+    parser = argparse.ArgumentParser(description=Description, epilog=Epilog)
+    parser.add_argument("-r", "--repeats", type=int, dest="REPEATS", default=5, help="Number of timed runs of each command.")
+    return parser.parse_args(args)
+
+
+def time_command(command, repeats):
+    """
+    Return the median wall time in seconds of running a command in a fresh interpreter.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=BIN_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    baseline = time_command([sys.executable, "-c", "pass"], args.REPEATS)
+    print("{:<32}{:>10}".format("command", "median_s"))
+    print("{:<32}{:>10.3f}".format("python (interpreter only)", baseline))
+    for name, command in COMMANDS:
+        print("{:<32}{:>10.3f}".format(name, time_command([sys.executable] + command, args.REPEATS)))
+    for module in MODULES:
+        print("{:<32}{:>10.3f}".format("import " + module, time_command([sys.executable, "-c", "import " + module], args.REPEATS)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
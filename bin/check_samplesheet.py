@@ -5,8 +5,11 @@
 
 import os
 import sys
+import csv
+import gzip
 import errno
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 
 def parse_args(args=None):
@@ -17,6 +20,9 @@ def parse_args(args=None):
     parser.add_argument("FILE_IN", help="Input samplesheet file.")
     parser.add_argument("FILE_OUT", help="Output file.")
     parser.add_argument("IGG", help="Boolean for whether or not igg is given")
+    parser.add_argument("-cf", "--check_files", dest="CHECK_FILES", action="store_true", help="Check that every local FastQ file exists and starts with a valid gzip-compressed FastQ record.")
+    parser.add_argument("-bd", "--base_dir", type=str, dest="BASE_DIR", default="", help="Directory that relative FastQ paths are resolved from when checking files (default: working directory).")
+    parser.add_argument("-t", "--threads", type=int, dest="THREADS", default=4, help="Number of threads used to check FastQ files (default: 4).")
     return parser.parse_args(args)
 
 
@@ -29,17 +35,56 @@ def make_dir(path):
                 raise exception
 
 
-def print_error(error, context="Line", context_str=""):
+def format_error(error, context="Line", context_str=""):
     error_str = "ERROR: Please check samplesheet -> {}".format(error)
     if context != "" and context_str != "":
         error_str = "ERROR: Please check samplesheet -> {}\n{}: '{}'".format(
             error, context.strip(), context_str.strip()
         )
-    print(error_str)
+    return error_str
+
+
+def print_errors(errors):
+    for error in errors:
+        print(error)
+    print("ERROR: {} problem(s) found in samplesheet!".format(len(errors)))
     sys.exit(1)
 
 
-def check_samplesheet(file_in, file_out, igg_control):
+def check_fastq(fastq, base_dir=""):
+    """
+    Return an error string if a FastQ file is missing or its first record is not a valid
+    gzip-compressed FastQ entry, otherwise None. Relative paths are resolved from base_dir and
+    remote paths are left for Nextflow to stage.
+    """
+    if "://" in fastq:
+        return None
+    path = os.path.join(base_dir, fastq)
+    if not os.path.isfile(path):
+        return "FastQ file does not exist!"
+    try:
+        with gzip.open(path, "rt") as fin:
+            record = [fin.readline().rstrip("\n") for _ in range(4)]
+    except (OSError, EOFError, UnicodeDecodeError):
+        return "FastQ file is not a valid gzip file!"
+    if not record[0]:
+        return "FastQ file is empty!"
+    if not record[0].startswith("@") or not record[2].startswith("+") or len(record[1]) != len(record[3]):
+        return "FastQ file does not start with a valid FastQ record!"
+    return None
+
+
+def check_fastq_files(fastq_lines, threads=4, base_dir=""):
+    errors = []
+    fastqs = list(fastq_lines.keys())
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        for fastq, error in zip(fastqs, executor.map(check_fastq, fastqs, [base_dir] * len(fastqs))):
+            if error:
+                errors.append(format_error(error, "File", "{} (line {})".format(fastq, fastq_lines[fastq])))
+    return errors
+
+
+def check_samplesheet(file_in, file_out, igg_control, check_files=False, threads=4, base_dir=""):
     """
     This function checks that the samplesheet follows the following structure:
 
@@ -48,24 +93,34 @@ def check_samplesheet(file_in, file_out, igg_control):
     WT,1,WT_LIB2_REP1_1.fastq.gz,WT_LIB2_REP1_2.fastq.gz
     WT,2,WT_LIB1_REP2_1.fastq.gz,WT_LIB1_REP2_2.fastq.gz
     KO,1,KO_LIB1_REP1_1.fastq.gz,KO_LIB1_REP1_2.fastq.gz
+
+    All rows are checked in a single pass and every problem is reported together.
     """
 
     igg_present = False
+    errors = []
 
     sample_run_dict = {}
-    with open(file_in, "r") as fin:
+    seen_rows = set()
+    fastq_lines = {}
+    with open(file_in, "r", newline="") as fin:
+        reader = csv.reader(fin)
 
         ## Check header
         MIN_COLS = 3
         HEADER = ["group", "replicate", "fastq_1", "fastq_2"]
-        header = [x.strip('"') for x in fin.readline().strip().split(",")]
+        header = [x.strip().strip('"') for x in next(reader, [])]
         if header[: len(HEADER)] != HEADER:
             print("ERROR: Please check samplesheet header -> {} != {}".format(",".join(header), ",".join(HEADER)))
             sys.exit(1)
 
         ## Check sample entries
-        for line in fin:
-            lspl = [x.strip().strip('"') for x in line.strip().split(",")]
+        for lspl in reader:
+            line_no = reader.line_num
+            lspl = [x.strip().strip('"') for x in lspl]
+            line = ",".join(lspl)
+            if not any(lspl):
+                continue
 
             if not igg_present:
                 if 'igg' in lspl:
@@ -73,71 +128,84 @@ def check_samplesheet(file_in, file_out, igg_control):
 
             ## Check valid number of columns per row
             if len(lspl) < len(HEADER):
-                print_error(
-                    "Invalid number of columns (minimum = {})!".format(len(HEADER)),
-                    "Line",
-                    line,
-                )
+                errors.append(format_error("Invalid number of columns (minimum = {})!".format(len(HEADER)), "Line", line))
+                continue
             num_cols = len([x for x in lspl if x])
             if num_cols < MIN_COLS:
-                print_error(
-                    "Invalid number of populated columns (minimum = {})!".format(MIN_COLS),
-                    "Line",
-                    line,
-                )
+                errors.append(format_error("Invalid number of populated columns (minimum = {})!".format(MIN_COLS), "Line", line))
+                continue
+
+            row_errors = []
 
             ## Check sample name entries
             sample, replicate, fastq_1, fastq_2 = lspl[: len(HEADER)]
             if sample:
                 if sample.find(" ") != -1:
-                    print_error("Group entry contains spaces!", "Line", line)
+                    row_errors.append("Group entry contains spaces!")
             else:
-                print_error("Group entry has not been specified!", "Line", line)
+                row_errors.append("Group entry has not been specified!")
 
             ## Check replicate entry is integer
             if not replicate.isdigit():
-                print_error("Replicate id not an integer!", "Line", line)
-            replicate = int(replicate)
+                row_errors.append("Replicate id not an integer!")
 
             ## Check FastQ file extension
             for fastq in [fastq_1, fastq_2]:
                 if fastq:
                     if fastq.find(" ") != -1:
-                        print_error("FastQ file contains spaces!", "Line", line)
+                        row_errors.append("FastQ file contains spaces!")
                     if not fastq.endswith(".fastq.gz") and not fastq.endswith(".fq.gz"):
-                        print_error(
-                            "FastQ file does not have extension '.fastq.gz' or '.fq.gz'!",
-                            "Line",
-                            line,
-                        )
+                        row_errors.append("FastQ file does not have extension '.fastq.gz' or '.fq.gz'!")
 
             ## Auto-detect paired-end/single-end
-            sample_info = []
-            if sample and fastq_1 and fastq_2:  ## Paired-end short reads
-                sample_info = [sample, str(replicate), "0", fastq_1, fastq_2]
-            elif sample and fastq_1 and not fastq_2:  ## Single-end short reads
-                sample_info = [sample, str(replicate), "1", fastq_1, fastq_2]
-            else:
-                print_error("Invalid combination of columns provided!", "Line", line)
+            if not (sample and fastq_1):
+                row_errors.append("Invalid combination of columns provided!")
+
+            if row_errors:
+                errors.extend([format_error(x, "Line", line) for x in row_errors])
+                continue
+
+            replicate = int(replicate)
+            single_end = "0" if fastq_2 else "1"
+            sample_info = [sample, str(replicate), single_end, fastq_1, fastq_2]
+
+            ## Duplicate rows are found with a hashed lookup rather than scanning the replicate list
+            row_key = tuple(sample_info)
+            if row_key in seen_rows:
+                errors.append(format_error("Samplesheet contains duplicate rows!", "Line", line))
+                continue
+            seen_rows.add(row_key)
+
             ## Create sample mapping dictionary = {sample: {replicate : [ single_end, fastq_1, fastq_2 ]}}
-            if sample not in sample_run_dict:
-                sample_run_dict[sample] = {}
-            if replicate not in sample_run_dict[sample]:
-                sample_run_dict[sample][replicate] = [sample_info]
-            else:
-                if sample_info in sample_run_dict[sample][replicate]:
-                    print_error("Samplesheet contains duplicate rows!", "Line", line)
-                else:
-                    sample_run_dict[sample][replicate].append(sample_info)
+            sample_run_dict.setdefault(sample, {}).setdefault(replicate, []).append(sample_info)
+            for fastq in [fastq_1, fastq_2]:
+                if fastq:
+                    fastq_lines.setdefault(fastq, line_no)
 
-    ## Check igg_control parameter is consistent with input groups
+    ## Check igg_control parameter is consistent with input groups
     if (igg_control == 'true' and not igg_present):
-        print("ERROR: No 'igg' group was found in " + str(file_in) + " If you are not supplying an IgG control, please specify --igg_control 'false' on command line.")
-        sys.exit(1)
+        errors.append("ERROR: No 'igg' group was found in " + str(file_in) + " If you are not supplying an IgG control, please specify --igg_control 'false' on command line.")
 
     if (igg_control == 'false' and igg_present):
-        print("ERROR: Parameter --igg_control was set to false, but an 'igg' group was found in " + str(file_in) + ".")
-        sys.exit(1)
+        errors.append("ERROR: Parameter --igg_control was set to false, but an 'igg' group was found in " + str(file_in) + ".")
+
+    for sample in sorted(sample_run_dict.keys()):
+        ## Check that replicate ids are in format 1..<NUM_REPS>
+        uniq_rep_ids = set(sample_run_dict[sample].keys())
+        if len(uniq_rep_ids) != max(uniq_rep_ids):
+            errors.append(format_error("Replicate ids must start with 1..<num_replicates>!", "Group", sample))
+
+        ## Check that multiple runs of the same sample are of the same datatype
+        for replicate in sorted(sample_run_dict[sample].keys()):
+            if len(set(x[2] for x in sample_run_dict[sample][replicate])) > 1:
+                errors.append(format_error("Multiple runs of a sample must be of the same datatype!", "Group", sample))
+
+    ## Probe the FastQ files themselves in parallel
+    if check_files:
+        errors.extend(check_fastq_files(fastq_lines, threads, base_dir))
+
+    if errors:
+        print_errors(errors)
 
     ## Write validated samplesheet with appropriate columns
     if len(sample_run_dict) > 0:
@@ -147,26 +215,7 @@ def check_samplesheet(file_in, file_out, igg_control):
 
             fout.write(",".join(["id", "group", "replicate", "single_end", "fastq_1", "fastq_2"]) + "\n")
             for sample in sorted(sample_run_dict.keys()):
-
-                ## Check that replicate ids are in format 1..<NUM_REPS>
-                uniq_rep_ids = set(sample_run_dict[sample].keys())
-                if len(uniq_rep_ids) != max(uniq_rep_ids):
-                    print_error(
-                        "Replicate ids must start with 1..<num_replicates>!",
-                        "Group",
-                        sample,
-                    )
                 for replicate in sorted(sample_run_dict[sample].keys()):
-
-                    ## Check that multiple runs of the same sample are of the same datatype
-                    if not all(
-                        x[0] == sample_run_dict[sample][replicate][0][0] for x in sample_run_dict[sample][replicate]
-                    ):
-                        print_error(
-                            "Multiple runs of a sample must be of the same datatype!",
-                            "Group",
-                            sample,
-                        )
                     ## Write to file
                     for idx, sample_info in enumerate(sample_run_dict[sample][replicate]):
                         sample_id = "{}_R{}_T{}".format(sample, replicate, idx + 1)
@@ -175,7 +224,7 @@ def check_samplesheet(file_in, file_out, igg_control):
 
 def main(args=None):
     args = parse_args(args)
-    check_samplesheet(args.FILE_IN, args.FILE_OUT, args.IGG)
+    check_samplesheet(args.FILE_IN, args.FILE_OUT, args.IGG, args.CHECK_FILES, args.THREADS, args.BASE_DIR)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import csv
+import glob
+import errno
+import argparse
+
+
+BT2_COLS = ["bt2_total_reads", "bt2_align1", "bt2_align_gt1", "bt2_non_aligned", "bt2_total_aligned"]
+
+
+def parse_args(args=None):
+    Description = "Collect bowtie2 and Picard MarkDuplicates reports for a batch of samples into a single meta-data table."
+    Epilog = "Example usage: python collect_meta.py <FILE_OUT> --meta <META_IN> --bt2_target '*.target.bowtie2.log'"
+
+    parser = argparse.ArgumentParser(description=Description, epilog=Epilog)
+    parser.add_argument("FILE_OUT", help="Output meta-data table in csv format.")
+    parser.add_argument("-m", "--meta", type=str, dest="META", default="", help="Meta-data csv with an 'id' column that the report columns are added to. Reports for ids not in it are skipped with a warning.")
+    parser.add_argument("-bt", "--bt2_target", type=str, dest="BT2_TARGET", default="", help="Glob of bowtie2 logs for the target genome.")
+    parser.add_argument("-bs", "--bt2_spikein", type=str, dest="BT2_SPIKEIN", default="", help="Glob of bowtie2 logs for the spike-in genome.")
+    parser.add_argument("-pd", "--picard_dedup", type=str, dest="PICARD_DEDUP", default="", help="Glob of Picard MarkDuplicates metrics files.")
+    return parser.parse_args(args)
+
+
+def make_dir(path):
+    if len(path) > 0:
+        try:
+            os.makedirs(path)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise exception
+
+
+def sample_id_from_path(path):
+    return os.path.basename(path).split(".")[0].split("_summary")[0]
+
+
+def to_number(value):
+    """
+    Return value as an int or float where possible so the table is written with consistent types.
+    """
+    value = value.strip()
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+############################################
+############################################
+## REPORT PARSERS
+############################################
+############################################
+
+def parse_bowtie2_log(file_in):
+    """
+    Parse a bowtie2 alignment summary. Paired-end counts use the concordant alignment lines,
+    single-end logs fall back to the unpaired lines.
+    """
+    data = {}
+    patterns = [
+        ("reads; of these:", "bt2_total_reads"),
+        ("aligned concordantly exactly 1 time", "bt2_align1"),
+        ("aligned concordantly >1 times", "bt2_align_gt1"),
+        ("aligned concordantly 0 times", "bt2_non_aligned"),
+    ]
+    se_patterns = [
+        ("aligned exactly 1 time", "bt2_align1"),
+        ("aligned >1 times", "bt2_align_gt1"),
+        ("aligned 0 times", "bt2_non_aligned"),
+    ]
+    with open(file_in, "r") as fin:
+        lines = fin.read().splitlines()
+
+    for line in lines:
+        for pattern, col in patterns:
+            if col not in data and pattern in line:
+                data[col] = int(line.split()[0])
+
+    if "bt2_align1" not in data:
+        for line in lines:
+            for pattern, col in se_patterns:
+                if col not in data and pattern in line:
+                    data[col] = int(line.split()[0])
+
+    data["bt2_total_aligned"] = data.get("bt2_align1", 0) + data.get("bt2_align_gt1", 0)
+    return dict([(x, data.get(x, "")) for x in BT2_COLS])
+
+
+def parse_picard_metrics(file_in):
+    """
+    Parse the metrics section of a Picard MarkDuplicates report. Keys and values are lower-cased
+    to match the columns previously produced by the 'awk_dedup' module.
+    """
+    with open(file_in, "r") as fin:
+        lines = [x for x in fin.read().splitlines() if x.strip() and not x.startswith("#")]
+    if len(lines) < 2:
+        return {}
+    header = lines[0].lower().split("\t")
+    values = lines[1].lower().split("\t")
+    return dict([(x, to_number(y)) for x, y in zip(header, values)])
+
+
+############################################
+############################################
+## MAIN FUNCTION
+############################################
+############################################
+
+def collect_meta(file_out, meta_in="", bt2_target="", bt2_spikein="", picard_dedup=""):
+    ## Ordered {id: {column: value}} table seeded from the input meta-data
+    meta_dict = {}
+    header = ["id"]
+    if meta_in:
+        with open(meta_in, "r", newline="") as fin:
+            reader = csv.DictReader(fin)
+            header = list(reader.fieldnames)
+            for row in reader:
+                meta_dict[row["id"]] = dict([(x, to_number(y) if y is not None else "") for x, y in row.items()])
+
+    ## Every report is parsed in this one process; the prefix and suffix give each report its own columns
+    reports = [
+        (bt2_target, parse_bowtie2_log, "", "_target"),
+        (bt2_spikein, parse_bowtie2_log, "", "_spikein"),
+        (picard_dedup, parse_picard_metrics, "dedup_", ""),
+    ]
+    orphan_ids = set()
+    for pattern, parser, prefix, suffix in reports:
+        if not pattern:
+            continue
+        for file_in in sorted(glob.glob(pattern)):
+            sample_id = sample_id_from_path(file_in)
+            ## Without an input table the reports define the samples, otherwise only its ids are annotated
+            if meta_in and sample_id not in meta_dict:
+                orphan_ids.add(sample_id)
+                continue
+            row = meta_dict.setdefault(sample_id, {"id": sample_id})
+            for key, value in parser(file_in).items():
+                col = prefix + key + suffix
+                if col not in header:
+                    header.append(col)
+                row[col] = value
+
+    if orphan_ids:
+        print("WARNING: Skipped reports for ids not in the meta-data table: {}".format(", ".join(sorted(orphan_ids))))
+
+    if not meta_dict:
+        print("ERROR: No samples found to collect meta-data for!")
+        sys.exit(1)
+
+    out_dir = os.path.dirname(file_out)
+    make_dir(out_dir)
+    with open(file_out, "w", newline="") as fout:
+        writer = csv.DictWriter(fout, fieldnames=header, restval="", lineterminator="\n")
+        writer.writeheader()
+        for sample_id in meta_dict:
+            writer.writerow(meta_dict[sample_id])
+
+
+def main(args=None):
+    args = parse_args(args)
+    collect_meta(args.FILE_OUT, args.META, args.BT2_TARGET, args.BT2_SPIKEIN, args.PICARD_DEDUP)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import errno
+import argparse
+
+from lib.coverage import read_chrom_sizes
+from lib.matrix import sample_matrices, MATRIX_SUFFIX
+
+
+def parse_args(args=None):
+    Description = "Compute deeptools computeMatrix style region x bin matrices of coverage for many samples at once, writing a .mat.gz per sample for deeptools plotHeatmap."
+    Epilog = "Example usage: python compute_matrix.py reference-point --regionsFileName peaks.bed --scoreFileName *.bedGraph --chrom_sizes genome.sizes -a 3000 -b 3000 --referencePoint center"
+
+    parser = argparse.ArgumentParser(description=Description, epilog=Epilog)
+    parser.add_argument("MODE", choices=["scale-regions", "reference-point"], help="Scale each region body to the same length, or centre the matrix on a reference point.")
+    parser.add_argument("-R", "--regionsFileName", type=str, dest="REGIONS", required=True, help="BED file of regions.")
+    parser.add_argument("-S", "--scoreFileName", type=str, dest="SCORES", nargs="+", required=True, help="Coverage stores (*.coverage.bin) or bedGraph files, one per sample.")
+    parser.add_argument("-c", "--chrom_sizes", type=str, dest="CHROM_SIZES", required=True, help="Chromosome sizes file, used to read bedGraph files.")
+    parser.add_argument("-o", "--outdir", type=str, dest="OUTDIR", default="./", help="Output directory for the <sample>.computeMatrix.mat.gz files.")
+    parser.add_argument("-b", "--beforeRegionStartLength", "--upstream", type=int, dest="UPSTREAM", default=0, help="Distance upstream of the region start or reference point.")
+    parser.add_argument("-a", "--afterRegionStartLength", "--downstream", type=int, dest="DOWNSTREAM", default=0, help="Distance downstream of the region end or reference point.")
+    parser.add_argument("-m", "--regionBodyLength", type=int, dest="BODY", default=1000, help="Length every region body is scaled to in scale-regions mode.")
+    parser.add_argument("-bs", "--binSize", type=int, dest="BIN_SIZE", default=10, help="Bin size in bases.")
+    parser.add_argument("--referencePoint", type=str, dest="REF_POINT", default="TSS", choices=["TSS", "TES", "center"], help="Reference point in reference-point mode.")
+    parser.add_argument("--skipZeros", dest="SKIP_ZEROS", action="store_true", help="Drop regions with only zero or missing values.")
+    parser.add_argument("-p", "--numberOfProcessors", type=int, dest="THREADS", default=1, help="Number of samples to compute in parallel.")
+    return parser.parse_args(args)
+
+
+def make_dir(path):
+    if len(path) > 0:
+        try:
+            os.makedirs(path)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise exception
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    for path in [args.REGIONS, args.CHROM_SIZES] + args.SCORES:
+        if not os.path.exists(path):
+            print("ERROR: Please check input file -> {}".format(path))
+            sys.exit(1)
+    for value in [args.UPSTREAM, args.DOWNSTREAM, args.BODY if args.MODE == "scale-regions" else 0]:
+        if value % args.BIN_SIZE != 0:
+            print("ERROR: Region lengths must be a multiple of the bin size -> {}".format(args.BIN_SIZE))
+            sys.exit(1)
+
+    make_dir(args.OUTDIR)
+    body = args.BODY if args.MODE == "scale-regions" else 0
+    outputs = [os.path.join(args.OUTDIR, os.path.basename(x).split(".")[0] + MATRIX_SUFFIX) for x in args.SCORES]
+    results = sample_matrices(args.SCORES, args.REGIONS, read_chrom_sizes(args.CHROM_SIZES), outputs, args.MODE,
+        args.UPSTREAM, args.DOWNSTREAM, body, args.BIN_SIZE, args.REF_POINT, args.SKIP_ZEROS, args.THREADS)
+    for output, n_regions in results:
+        print("Wrote {} regions to {}".format(n_regions, output))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
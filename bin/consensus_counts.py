@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import errno
+import argparse
+
+from lib.consensus import consensus_count_matrix
+
+
+def parse_args(args=None):
+    Description = "Merge the peaks of all samples into a consensus peak set and count the fragments of every sample in each consensus peak, writing the count matrix used by deseq2_diff.r."
+    Epilog = "Example usage: python consensus_counts.py <OUT_DIR> --peaks *.peaks.bed --samples *.fragments.tsv.gz --min_replicates 2"
+
+    parser = argparse.ArgumentParser(description=Description, epilog=Epilog)
+    parser.add_argument("OUT_DIR", help="Output directory.")
+    parser.add_argument("-p", "--peaks", type=str, dest="PEAKS", nargs="+", required=True, help="Peak BED files named <group>_<replicate>.*, one per sample.")
+    parser.add_argument("-s", "--samples", type=str, dest="SAMPLES", nargs="+", required=True, help="Fragments files (*.fragments.tsv.gz) or paired-end BAM files named <group>_<replicate>.*, one per sample.")
+    parser.add_argument("-m", "--min_replicates", type=int, dest="MIN_REPLICATES", default=1, help="Minimum number of replicates of a group that must have a peak within a consensus peak to keep it.")
+    parser.add_argument("-t", "--threads", type=int, dest="THREADS", default=1, help="Number of samples to count in parallel.")
+    parser.add_argument("-kd", "--keep_duplicates", dest="KEEP_DUPLICATES", action="store_true", help="Count reads flagged as duplicates in BAM files and every copy of a fragment in fragments files.")
+    return parser.parse_args(args)
+
+
+def make_dir(path):
+    if len(path) > 0:
+        try:
+            os.makedirs(path)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise exception
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    for path in args.PEAKS + args.SAMPLES:
+        if not os.path.exists(path):
+            print("ERROR: Please check input file -> {}".format(path))
+            sys.exit(1)
+
+    consensus, matrix = consensus_count_matrix(args.PEAKS, args.SAMPLES, args.MIN_REPLICATES, args.THREADS, args.KEEP_DUPLICATES)
+    if matrix.shape[1] == 4:
+        print("ERROR: No fragments found for the samples with peaks!")
+        sys.exit(1)
+
+    make_dir(args.OUT_DIR)
+    consensus.to_csv(os.path.join(args.OUT_DIR, "consensus_peaks.bed"), sep="\t", header=False, index=False)
+    matrix.to_csv(os.path.join(args.OUT_DIR, "consensus_counts.tsv.gz"), sep="\t", index=False, compression="gzip")
+    print("Counted {} samples over {} consensus peaks".format(matrix.shape[1] - 4, consensus.shape[0]))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import errno
+import argparse
+
+from lib.coverage import read_chrom_sizes, write_coverage_store
+
+
+def parse_args(args=None):
+    Description = "Convert a bedGraph into a memory-mapped coverage store: one flat per-base array with a chromosome sizes header, sliced by chromosome without decompression."
+    Epilog = "Example usage: python coverage_store.py <BEDGRAPH_IN> <STORE_OUT> --chrom_sizes genome.sizes"
+
+    parser = argparse.ArgumentParser(description=Description, epilog=Epilog)
+    parser.add_argument("BEDGRAPH_IN", help="Input bedGraph file.")
+    parser.add_argument("STORE_OUT", help="Output coverage store, named <sample>.coverage.bin.")
+    parser.add_argument("-c", "--chrom_sizes", type=str, dest="CHROM_SIZES", required=True, help="Chromosome sizes file, e.g. from GET_CHROM_SIZES.")
+    parser.add_argument("-d", "--dtype", type=str, dest="DTYPE", default="float32", choices=["float32", "int32"], help="Data type of the stored coverage; int32 suits unscaled read counts.")
+    return parser.parse_args(args)
+
+
+def make_dir(path):
+    if len(path) > 0:
+        try:
+            os.makedirs(path)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise exception
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    for path in [args.BEDGRAPH_IN, args.CHROM_SIZES]:
+        if not os.path.exists(path):
+            print("ERROR: Please check input file -> {}".format(path))
+            sys.exit(1)
+
+    make_dir(os.path.dirname(args.STORE_OUT))
+    store = write_coverage_store(args.STORE_OUT, args.BEDGRAPH_IN, read_chrom_sizes(args.CHROM_SIZES), args.DTYPE)
+    print("Wrote {} bases over {} chromosomes to {}".format(store.data.shape[0], len(store.chroms), args.STORE_OUT))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
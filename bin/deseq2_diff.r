@@ -38,6 +38,7 @@ option_list <- list(
     make_option(c("-g", "--groups"), type="character", default=NULL    , metavar="string"   , help="comma-separated list of experimental group names" ),
     make_option(c("-b", "--bed"    ), type="character", default=NULL    , metavar="path"   , help="TODO" ),
     make_option(c("-a", "--bam"    ), type="character", default=NULL    , metavar="path"   , help="TODO"  ),
+    make_option(c("-m", "--count_matrix"), type="character", default=NULL, metavar="path"   , help="consensus peak x sample count matrix from consensus_counts.py, used in place of --bed and --bam"),
     make_option(c("-i", "--include"), type="character", default=NULL    , metavar="string"   , help="experimental groups to include in analysis"),
     make_option(c("-e", "--exclude"), type="character", default=NULL    , metavar="string"   , help="experimental groups to exclude in analysis"),
     make_option(c("-o", "--outdir"        ), type="character", default='./'    , metavar="path"   , help="Output directory."  ),
@@ -67,19 +68,21 @@ if (is.null(opt$groups)){
 #    stop("Please provide a treatment group name.", call.=FALSE)
 #}
 
-if (is.null(opt$bed)){
+if (is.null(opt$bed) && is.null(opt$count_matrix)){
     print_help(opt_parser)
     stop("Please provide a list of bed files to load.", call.=FALSE)
 }
 
-if (is.null(opt$bam)){
+if (is.null(opt$bam) && is.null(opt$count_matrix)){
     print_help(opt_parser)
     stop("Please provide a list of bam files to load", call.=FALSE)
 }
 
 # Get file lists
-bed_list <- unlist(strsplit(opt$bed, ","))
-bam_list <- unlist(strsplit(opt$bam, ","))
+if (is.null(opt$count_matrix)) {
+    bed_list <- unlist(strsplit(opt$bed, ","))
+    bam_list <- unlist(strsplit(opt$bam, ","))
+}
 
 # Check same length <- MAYBE TAKE THIS OUT IF WE SIMPLY PASS THE ALIGNMENT CHANNEL AS IT WILL CONTAIN IGG
 #if (length(bed_list) != length(bam_list)) {
@@ -105,50 +108,69 @@ if (!is.null(opt$exclude)) {
     groups = groups[!matching]
 }
 
-# Init
-mPeak = GRanges()
-file_count = 0
-file_list=vector()
-# Read in bed files that match the control or treatment group
-for(group in groups){
-    search_res <-  str_detect(bed_list, group)
-    if (!any(search_res)) {
-        stop(paste("group", group, "was not found amongst bed files"))
+if (!is.null(opt$count_matrix)) {
+    # Consensus peaks and counts were built upstream; columns are <group>_<replicate> ordered by group then replicate
+    countTable = read.table(opt$count_matrix, header = TRUE, sep = "\t", check.names = FALSE)
+    sample_cols = colnames(countTable)[-(1:4)]
+    sample_groups = sub("_[^_]+$", "", sample_cols)
+    for (group in groups) {
+        if (!any(sample_groups == group)) {
+            stop(paste("group", group, "was not found amongst count matrix columns"))
+        }
+    }
+    # Groups may have different numbers of replicates, so each column takes the condition of its own group
+    selected = unlist(lapply(groups, function(group) which(sample_groups == group)))
+    sample_cols = sample_cols[selected]
+    condition = factor(sample_groups[selected], levels = groups)
+    countMat = as.matrix(countTable[, sample_cols])
+    colnames(countMat) = sample_cols
+} else {
+    # Init
+    mPeak = GRanges()
+    file_count = 0
+    file_list=vector()
+    # Read in bed files that match the control or treatment group
+    for(group in groups){
+        search_res <-  str_detect(bed_list, group)
+        if (!any(search_res)) {
+            stop(paste("group", group, "was not found amongst bed files"))
+        }
+        file_list <- bed_list[search_res] %>% append(file_list, .)
+    }
+    for(file in file_list) {
+        peakRes = read.table(file, header = FALSE, fill = TRUE)
+        mPeak = GRanges(seqnames = peakRes$V1, IRanges(start = peakRes$V2, end = peakRes$V3), strand = "*") %>% append(mPeak, .)
+        file_count = file_count + 1
     }
-    file_list <- bed_list[search_res] %>% append(file_list, .)
-}
-for(file in file_list) {
-    peakRes = read.table(file, header = FALSE, fill = TRUE)
-    mPeak = GRanges(seqnames = peakRes$V1, IRanges(start = peakRes$V2, end = peakRes$V3), strand = "*") %>% append(mPeak, .)
-    file_count = file_count + 1
-}
 
 
 
-# Create replicate counts and names
-group_count = length(groups)
-rep_count = file_count / group_count
-reps = paste0("rep", 1:rep_count)
-expected_rep_str = paste0("_R", 1:rep_count)
+    # Create replicate counts and names
+    group_count = length(groups)
+    rep_count = file_count / group_count
+    reps = paste0("rep", 1:rep_count)
+    expected_rep_str = paste0("_R", 1:rep_count)
+    condition = factor(rep(groups, each = length(reps)))
 
-# Create peak table and count matrix
-masterPeak = reduce(mPeak)
-countMat = matrix(NA, length(masterPeak), file_count)
-colnames(countMat) = paste(rep(groups, rep_count), rep(reps, each = group_count, sep = "_"))
+    # Create peak table and count matrix
+    masterPeak = reduce(mPeak)
+    countMat = matrix(NA, length(masterPeak), file_count)
+    colnames(countMat) = paste(rep(groups, rep_count), rep(reps, each = group_count, sep = "_"))
 
-# Read in bam files that match the control or treatment group
-for(i in seq_along(groups)){
-    search_res <-  str_detect(bam_list, groups[i])
-    if (!any(search_res)) {
-        stop(paste("group", i, "was not found amongst bam files"))
-    }
-    file_list <- bam_list[search_res]
+    # Read in bam files that match the control or treatment group
+    for(i in seq_along(groups)){
+        search_res <-  str_detect(bam_list, groups[i])
+        if (!any(search_res)) {
+            stop(paste("group", i, "was not found amongst bam files"))
+        }
+        file_list <- bam_list[search_res]
 
-    for(j in seq_along(file_list)) {
-        rep_search <- str_detect(file_list, expected_rep_str[j])
-        file_now <- file_list[rep_search]
-        fragment_counts <- getCounts(file_now, masterPeak, paired = TRUE, by_rg = FALSE, format = "bam")
-        countMat[, ((j*group_count) - (group_count - i))] = counts(fragment_counts)[,1]
+        for(j in seq_along(file_list)) {
+            rep_search <- str_detect(file_list, expected_rep_str[j])
+            file_now <- file_list[rep_search]
+            fragment_counts <- getCounts(file_now, masterPeak, paired = TRUE, by_rg = FALSE, format = "bam")
+            countMat[, ((j*group_count) - (group_count - i))] = counts(fragment_counts)[,1]
+        }
     }
 }
 
@@ -166,7 +188,6 @@ setwd(opt$outdir)
 ## Create index list for peak count filter
 selectR = which(rowSums(countMat) > opt$count_thresh)
 dataS = countMat[selectR,] ## Select data from filter
-condition = factor(rep(groups, each = length(reps)))
 
 samples.vec <- sort(colnames(countMat))
 #groups      <- sub("_[^_]+$", "", samples.vec)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import csv
+import time
+import errno
+import socket
+import hashlib
+import argparse
+import http.client
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = '.part'
+
+
+def parse_args(args=None):
+    Description = "Download FastQ files in parallel with resumable transfers and md5sums computed while the data is streamed to disk."
+    Epilog = 'Example usage: python fastq_download.py <FILE_IN> <OUTDIR>'
+
+    parser = argparse.ArgumentParser(description=Description, epilog=Epilog)
+    parser.add_argument('FILE_IN', help="Either the tab-delimited samplesheet created by 'sra_runinfo_to_ftp.py' or a tab-delimited file without a header containing three columns i.e. url\tmd5\tfile_name.")
+    parser.add_argument('OUTDIR', help="Output directory for downloaded FastQ files and their md5 files.")
+    parser.add_argument('-t', '--threads', type=int, dest="THREADS", default=4, help="Maximum number of files downloaded concurrently (default: 4).")
+    parser.add_argument('-r', '--retries', type=int, dest="RETRIES", default=5, help="Number of times a failed transfer is resumed before giving up (default: 5).")
+    parser.add_argument('-to', '--timeout', type=int, dest="TIMEOUT", default=60, help="Socket timeout in seconds for each request (default: 60).")
+    parser.add_argument('-mt', '--max_time', type=int, dest="MAX_TIME", default=0, help="Maximum time in seconds for each transfer attempt, as curl's '--max-time', after which it is resumed as a retry. 0 means no limit (default: 0).")
+    parser.add_argument('-p', '--protocol', type=str, dest="PROTOCOL", default='https', help="Protocol prepended to urls that do not specify one e.g. the 'fastq_ftp' links from ENA (default: 'https').")
+    return parser.parse_args(args)
+
+
+def make_dir(path):
+    if not len(path) == 0:
+        try:
+            os.makedirs(path)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise
+
+
+def parse_download_list(file_in):
+    """
+    Return a list of (url, md5, file_name) tuples. The samplesheet written by 'sra_runinfo_to_ftp.py'
+    is detected by its header and named in the same way as the 'SRA_FASTQ_FTP' module i.e.
+    <id>.fastq.gz for single-end and <id>_1.fastq.gz, <id>_2.fastq.gz for paired-end data.
+    """
+    download_list = []
+    with open(file_in, "r") as fin:
+        lines = [x for x in fin.read().splitlines() if x.strip()]
+
+    if lines and 'fastq_1' in lines[0].split('\t'):
+        for row in csv.DictReader(lines, delimiter='\t'):
+            if not row['fastq_1']:
+                continue
+            if row['single_end'].lower() == 'true':
+                download_list.append((row['fastq_1'], row['md5_1'], "{}.fastq.gz".format(row['id'])))
+            else:
+                download_list.append((row['fastq_1'], row['md5_1'], "{}_1.fastq.gz".format(row['id'])))
+                download_list.append((row['fastq_2'], row['md5_2'], "{}_2.fastq.gz".format(row['id'])))
+    else:
+        for line in lines:
+            lspl = [x.strip() for x in line.split('\t')]
+            if len(lspl) != 3:
+                print("ERROR: Please check download list -> Invalid number of columns (expected = 3)!\nLine: '{}'".format(line))
+                sys.exit(1)
+            download_list.append(tuple(lspl))
+    return download_list
+
+
+def add_protocol(url, protocol):
+    if '://' in url:
+        return url
+    return "{}://{}".format(protocol, url)
+
+
+def hash_file(path, md5=None):
+    if md5 is None:
+        md5 = hashlib.md5()
+    with open(path, 'rb') as fin:
+        for chunk in iter(lambda: fin.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5
+
+
+def write_md5(file_out, md5sum):
+    ## Same format as 'md5sum' so the file can still be checked with 'md5sum -c'
+    with open(file_out + '.md5', 'w') as fout:
+        fout.write("{}  {}\n".format(md5sum, os.path.basename(file_out)))
+
+
+def fetch(url, file_part, timeout, max_time=0):
+    """
+    Stream a url to 'file_part', resuming from the end of any existing partial download.
+    The md5 is updated as each chunk arrives so the file never has to be read twice.
+    If max_time is set the transfer stops with a timeout once it has run that many seconds.
+    """
+    deadline = time.monotonic() + max_time if max_time > 0 else None
+    md5 = hashlib.md5()
+    offset = 0
+    if os.path.exists(file_part):
+        offset = os.path.getsize(file_part)
+        if offset > 0:
+            hash_file(file_part, md5)
+
+    request = urllib.request.Request(url)
+    if offset > 0:
+        request.add_header('Range', 'bytes={}-'.format(offset))
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        ## The partial file already holds every byte
+        if e.code == 416 and offset > 0:
+            return md5
+        raise
+
+    with response:
+        mode = 'ab'
+        if offset > 0 and getattr(response, 'status', None) != 206:
+            ## Server ignored the range request so start again from the beginning
+            md5 = hashlib.md5()
+            mode = 'wb'
+        with open(file_part, mode) as fout:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                md5.update(chunk)
+                fout.write(chunk)
+                if deadline is not None and time.monotonic() > deadline:
+                    raise socket.timeout("Transfer exceeded {} seconds".format(max_time))
+    return md5
+
+
+def download_file(url, md5_expected, file_out, retries=5, timeout=60, max_time=0):
+    """
+    Download a single file, retrying with resume on failure. The file is only moved into place
+    once it is complete and its md5 matches, so an interrupted run never leaves a truncated FastQ.
+    """
+    md5_expected = md5_expected.strip().lower()
+    if os.path.exists(file_out) and os.path.exists(file_out + '.md5'):
+        with open(file_out + '.md5', 'r') as fin:
+            md5_existing = fin.read().split()
+        if md5_existing and (not md5_expected or md5_existing[0] == md5_expected):
+            return "Skipping '{}' -> already downloaded and verified.".format(file_out)
+
+    file_part = file_out + PART_SUFFIX
+    for attempt in range(retries + 1):
+        try:
+            md5sum = fetch(url, file_part, timeout, max_time).hexdigest()
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+            if attempt == retries:
+                raise IOError("Failed to download '{}' after {} attempts: {}".format(url, retries + 1, e))
+            time.sleep(min(2 ** attempt, 60))
+            continue
+
+        if md5_expected and md5sum != md5_expected:
+            ## A corrupt partial file cannot be resumed from so discard it
+            os.remove(file_part)
+            if attempt == retries:
+                raise IOError("md5sum mismatch for '{}': expected {}, got {}".format(file_out, md5_expected, md5sum))
+            continue
+
+        os.replace(file_part, file_out)
+        write_md5(file_out, md5sum)
+        return "Downloaded '{}' -> md5sum {}".format(file_out, md5sum)
+
+
+def fastq_download(file_in, outdir, threads=4, retries=5, timeout=60, protocol='https', max_time=0):
+    make_dir(outdir)
+    download_list = parse_download_list(file_in)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        futures = []
+        for url, md5, file_name in download_list:
+            file_out = os.path.join(outdir, file_name)
+            futures.append((url, executor.submit(download_file, add_protocol(url, protocol), md5, file_out, retries, timeout, max_time)))
+
+        for url, future in futures:
+            try:
+                print(future.result())
+            except IOError as e:
+                print("ERROR: {}".format(e))
+                failed.append(url)
+
+    if failed:
+        print("ERROR: {} of {} files could not be downloaded!".format(len(failed), len(download_list)))
+        sys.exit(1)
+
+
+def main(args=None):
+    args = parse_args(args)
+    fastq_download(args.FILE_IN, args.OUTDIR, args.THREADS, args.RETRIES, args.TIMEOUT, args.PROTOCOL, args.MAX_TIME)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
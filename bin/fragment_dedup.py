@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import errno
+import argparse
+
+from lib.fragments import dedup_fragments
+
+
+def parse_args(args=None):
+    Description = "Mark or remove fragment-level duplicates in a paired-end BAM file and write Picard MarkDuplicates style metrics."
+    Epilog = "Example usage: python fragment_dedup.py <BAM_IN> <METRICS_OUT> --output <BAM_OUT> --remove_duplicates"
+
+    parser = argparse.ArgumentParser(description=Description, epilog=Epilog)
+    parser.add_argument("BAM_IN", help="Input BAM file.")
+    parser.add_argument("METRICS_OUT", help="Output duplication metrics file.")
+    parser.add_argument("-o", "--output", type=str, dest="OUTPUT", default=None, help="Write a BAM file with duplicates marked, or removed with --remove_duplicates.")
+    parser.add_argument("-r", "--remove_duplicates", dest="REMOVE_DUPLICATES", help="Remove duplicate reads from the output BAM file rather than marking them.", action="store_true")
+    parser.add_argument("-l", "--library", type=str, dest="LIBRARY", default="Unknown Library", help="Library name reported in the metrics file.")
+    return parser.parse_args(args)
+
+
+def make_dir(path):
+    if len(path) > 0:
+        try:
+            os.makedirs(path)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise exception
+
+
+def main(args=None):
+    command = " ".join(["fragment_dedup.py"] + (sys.argv[1:] if args is None else args))
+    args = parse_args(args)
+
+    if not os.path.exists(args.BAM_IN):
+        print("ERROR: Please check input BAM file -> {}".format(args.BAM_IN))
+        sys.exit(1)
+
+    make_dir(os.path.dirname(args.METRICS_OUT))
+    if args.OUTPUT:
+        make_dir(os.path.dirname(args.OUTPUT))
+
+    metrics = dedup_fragments(args.BAM_IN, args.METRICS_OUT, args.OUTPUT, args.REMOVE_DUPLICATES, args.LIBRARY, command)
+    print("Read pairs examined: {}, duplicates: {} ({:.2%})".format(metrics["READ_PAIRS_EXAMINED"], metrics["READ_PAIR_DUPLICATES"], metrics["PERCENT_DUPLICATION"]))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import errno
+import argparse
+
+from lib.coverage import read_chrom_sizes
+from lib.fragment_file import FragmentFile
+from lib.tracks import SIZE_CLASSES, NORMALISATIONS, write_tracks, bigwig_available
+
+
+def parse_args(args=None):
+    Description = "Write coverage tracks for several fragment length classes and normalisations from a single pass over a fragments file."
+    Epilog = "Example usage: python fragment_tracks.py <FRAGMENTS_IN> <PREFIX> --chrom_sizes genome.sizes --classes all subnucleosomal --normalisations spikein cpm"
+
+    parser = argparse.ArgumentParser(description=Description, epilog=Epilog)
+    parser.add_argument("FRAGMENTS_IN", help="Input fragments file, as written by reporting.py gen_fragments.")
+    parser.add_argument("PREFIX", help="Output prefix, tracks are named <PREFIX>.<class>.<normalisation>.bedGraph or .bigWig.")
+    parser.add_argument("-c", "--chrom_sizes", type=str, dest="CHROM_SIZES", default=None, help="Chromosome sizes file, e.g. from GET_CHROM_SIZES. Intervals are clipped to the chromosome ends when given.")
+    parser.add_argument("-l", "--classes", type=str, dest="CLASSES", nargs="+", default=["all"], choices=list(SIZE_CLASSES.keys()), help="Fragment length classes: all, subnucleosomal (< 120 bp), mononucleosomal (120-250 bp) and polynucleosomal (>= 250 bp).")
+    parser.add_argument("-n", "--normalisations", type=str, dest="NORMALISATIONS", nargs="+", default=["spikein"], choices=NORMALISATIONS, help="Normalisations applied to every class.")
+    parser.add_argument("-s", "--scale", type=float, dest="SCALE", default=1.0, help="Spike-in scale factor for the spikein normalisation.")
+    parser.add_argument("-b", "--bigwig", dest="BIGWIG", action="store_true", help="Write bigWig files, which needs pyBigWig and --chrom_sizes, in place of bedGraph files.")
+    return parser.parse_args(args)
+
+
+def make_dir(path):
+    if len(path) > 0:
+        try:
+            os.makedirs(path)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise exception
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    for path in [args.FRAGMENTS_IN, args.CHROM_SIZES]:
+        if path is not None and not os.path.exists(path):
+            print("ERROR: Please check input file -> {}".format(path))
+            sys.exit(1)
+
+    bigwig = args.BIGWIG
+    if bigwig and args.CHROM_SIZES is None:
+        print("ERROR: --bigwig needs --chrom_sizes")
+        sys.exit(1)
+    if bigwig and not bigwig_available():
+        print("WARNING: pyBigWig is not installed, writing bedGraph files instead")
+        bigwig = False
+
+    make_dir(os.path.dirname(args.PREFIX))
+    chrom_sizes = read_chrom_sizes(args.CHROM_SIZES) if args.CHROM_SIZES is not None else None
+    paths = write_tracks(FragmentFile(args.FRAGMENTS_IN), args.PREFIX, args.CLASSES, args.NORMALISATIONS, args.SCALE, chrom_sizes, bigwig)
+    print("Wrote {} tracks from {}".format(len(paths), args.FRAGMENTS_IN))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
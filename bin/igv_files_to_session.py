@@ -8,7 +8,9 @@
 
 import os
 import errno
+import shutil
 import argparse
+import subprocess
 
 ############################################
 ############################################
@@ -16,7 +18,7 @@ import argparse
 ############################################
 ############################################
 
-Description = 'Create IGV session file from a list of files and associated colours - ".bed", ".bw", ".bigwig", ".tdf", ".gtf" files currently supported.'
+Description = 'Create IGV session file from a list of files and associated colours - ".bed", ".bedGraph", ".bw", ".bigwig", ".bb", ".tdf", ".gtf" files currently supported.'
 Epilog = """Example usage: python igv_files_to_session.py <XML_OUT> <LIST_FILE> <GENOME>"""
 
 argParser = argparse.ArgumentParser(description=Description, epilog=Epilog)
@@ -28,6 +30,8 @@ argParser.add_argument('GENOME', help="Full path to genome fasta file or shortha
 
 ## OPTIONAL PARAMETERS
 argParser.add_argument('-pp', '--path_prefix', type=str, dest="PATH_PREFIX", default='', help="Path prefix to be added at beginning of all files in input list file.")
+argParser.add_argument('-it', '--index_tracks', type=str, dest="INDEX_TRACKS", default='none', choices=['none', 'tabix', 'bigbed'], help="Index BED/bedGraph tracks so IGV only loads the region in view. 'tabix' writes bgzip-compressed files with a tabix index (requires pysam or bgzip/tabix), 'bigbed' converts BED to bigBed and bedGraph to bigWig (requires bedToBigBed/bedGraphToBigWig and --chrom_sizes). Indexed tracks are written as '<file>.gz', '<file>.bb' or '<file>.bigWig' and existing files are never overwritten.")
+argParser.add_argument('-cs', '--chrom_sizes', type=str, dest="CHROM_SIZES", default='', help="Chromosome sizes file required by '--index_tracks bigbed'.")
 args = argParser.parse_args()
 
 ############################################
@@ -36,6 +40,10 @@ args = argParser.parse_args()
 ############################################
 ############################################
 
+BED_EXTENSIONS = ['.bed', '.broadpeak', '.narrowpeak']
+BEDGRAPH_EXTENSIONS = ['.bedgraph', '.bdg']
+WIG_EXTENSIONS = ['.bw', '.bigwig', '.tdf']
+
 def makedir(path):
 
     if not len(path) == 0:
@@ -45,68 +53,140 @@ def makedir(path):
             if exception.errno != errno.EEXIST:
                 raise
 
+def track_extension(ifile):
+    ## Type is decided on the uncompressed extension so indexed 'x.bed.gz' is still treated as a bed file
+    root, extension = os.path.splitext(ifile)
+    if extension.lower() == '.gz':
+        extension = os.path.splitext(root)[1]
+    return extension.lower()
+
+def sort_bed(ifile, ofile):
+    ## Tabix and bigBed both need coordinate sorted input; header and track lines are dropped
+    with open(ifile, 'r') as fin:
+        records = [line.rstrip('\n').split('\t') for line in fin if line.strip() and not line.startswith(('#', 'track', 'browser'))]
+    records.sort(key=lambda x: (x[0], int(x[1]), int(x[2])))
+    with open(ofile, 'w') as fout:
+        for record in records:
+            fout.write('\t'.join(record) + '\n')
+    return records
+
+def check_output(ofile):
+    ## Indexed copies are written next to the input tracks, so never replace a file that is already there
+    if os.path.exists(ofile):
+        raise IOError("Refusing to overwrite existing file '%s' when indexing tracks." % (ofile))
+    return ofile
+
+def tabix_index(ifile):
+    gz_file = check_output(ifile + '.gz')
+    sorted_file = ifile + '.sorted'
+    sort_bed(ifile, sorted_file)
+    try:
+        import pysam
+        pysam.tabix_compress(sorted_file, gz_file, force=True)
+        pysam.tabix_index(gz_file, preset='bed', force=True)
+    except ImportError:
+        with open(gz_file, 'wb') as fout:
+            subprocess.check_call(['bgzip', '-c', sorted_file], stdout=fout)
+        subprocess.check_call(['tabix', '-f', '-p', 'bed', gz_file])
+    os.remove(sorted_file)
+    return gz_file
+
+def bigbed_index(ifile, chrom_sizes, bedgraph=False):
+    ## The full input name is kept so a converted 'x.bedGraph' cannot replace a bigWig track 'x.bigWig'
+    big_file = check_output(ifile + ('.bigWig' if bedgraph else '.bb'))
+    tool = 'bedGraphToBigWig' if bedgraph else 'bedToBigBed'
+    if shutil.which(tool) is None:
+        raise OSError("'%s' was not found on the PATH; it is needed by '--index_tracks bigbed'." % (tool))
+    sorted_file = ifile + '.sorted'
+    records = sort_bed(ifile, sorted_file)
+    if bedgraph:
+        subprocess.check_call(['bedGraphToBigWig', sorted_file, chrom_sizes, big_file])
+    else:
+        ## Only the interval columns are kept as non-standard bed columns such as SEACR signal values are not valid bigBed fields
+        with open(sorted_file, 'w') as fout:
+            for record in records:
+                fout.write('\t'.join(record[:3]) + '\n')
+        subprocess.check_call(['bedToBigBed', '-type=bed3', sorted_file, chrom_sizes, big_file])
+    os.remove(sorted_file)
+    return big_file
+
+def index_track(ifile, mode, chrom_sizes=''):
+    extension = track_extension(ifile)
+    if mode == 'none' or ifile.endswith('.gz') or not os.path.isfile(ifile):
+        return ifile
+    if extension not in BED_EXTENSIONS + BEDGRAPH_EXTENSIONS:
+        return ifile
+    if mode == 'tabix':
+        return tabix_index(ifile)
+    if mode == 'bigbed':
+        if not chrom_sizes:
+            raise ValueError("A chromosome sizes file must be provided with '--chrom_sizes' to create bigBed files.")
+        return bigbed_index(ifile, chrom_sizes, bedgraph=extension in BEDGRAPH_EXTENSIONS)
+    return ifile
+
+def track_xml(ifile, colour):
+    extension = track_extension(ifile)
+    name = os.path.basename(ifile)
+    if extension in BED_EXTENSIONS + ['.bb', '.bigbed']:
+        return ('\t\t<Track altColor="0,0,178" autoScale="false" clazz="org.broad.igv.track.FeatureTrack" color="%s" ' % (colour) +
+                'displayMode="SQUISHED" featureVisibilityWindow="-1" fontSize="12" height="20" ' +
+                'id="%s" name="%s" renderer="BASIC_FEATURE" sortable="false" visible="true" windowFunction="count"/>\n' % (ifile,name))
+    elif extension in WIG_EXTENSIONS + BEDGRAPH_EXTENSIONS:
+        return ('\t\t<Track altColor="0,0,178" autoScale="true" clazz="org.broad.igv.track.DataSourceTrack" color="%s" ' % (colour) +
+                'displayMode="COLLAPSED" featureVisibilityWindow="-1" fontSize="12" height="100" ' +
+                'id="%s" name="%s" normalize="false" renderer="BAR_CHART" sortable="true" visible="true" windowFunction="mean">\n' % (ifile,name) +
+                '\t\t\t<DataRange baseline="0.0" drawBaseline="true" flipAxis="false" maximum="10" minimum="0.0" type="LINEAR"/>\n' +
+                '\t\t</Track>\n')
+    elif extension in ['.gtf']:
+        return ('\t\t<Track altColor="0,0,178" autoScale="false" clazz="org.broad.igv.track.FeatureTrack" color="%s" ' % (colour) +
+                'displayMode="COLLAPSED" featureVisibilityWindow="-1" fontSize="12" ' +
+                'id="%s" name="%s" renderer="BASIC_FEATURE" sortable="false" visible="true" windowFunction="count"/>\n' % (ifile,name))
+    elif extension in ['.bam']:
+        return ''
+    else:
+        return ('\t\t<Track altColor="0,0,178" autoScale="false" clazz="org.broad.igv.track.FeatureTrack" color="%s" ' % (colour) +
+                'displayMode="SQUISHED" featureVisibilityWindow="-1" fontSize="10" height="20" ' +
+                'id="%s" name="%s" renderer="BASIC_FEATURE" sortable="false" visible="true" windowFunction="count"/>\n' % (ifile,name))
+
 ############################################
 ############################################
 ## MAIN FUNCTION
 ############################################
 ############################################
 
-def igv_files_to_session(XMLOut,ListFile,Genome,PathPrefix=''):
+def igv_files_to_session(XMLOut,ListFile,Genome,PathPrefix='',IndexTracks='none',ChromSizes=''):
 
     makedir(os.path.dirname(XMLOut))
 
     fileList = []
-    fin = open(ListFile,'r')
-    while True:
-        line = fin.readline()
-        if line:
-            ifile,colour = line.strip().split('\t')
+    with open(ListFile,'r') as fin:
+        for line in fin:
+            if not line.strip():
+                continue
+            ifile,colour = line.rstrip('\n').split('\t')
             if len(colour.strip()) == 0:
                 colour = '0,0,178'
+            ifile = index_track(ifile.strip(), IndexTracks, ChromSizes)
             fileList.append((PathPrefix.strip()+ifile,colour))
-        else:
-            break
-            fout.close()
-
-    ## ADD RESOURCES SECTION
-    XMLStr =  '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
-    XMLStr += '<Session genome="%s" hasGeneTrack="true" hasSequenceTrack="true" locus="All" version="8">\n' % (Genome)
-    XMLStr += '\t<Resources>\n'
-    for ifile,colour in fileList:
-        XMLStr += '\t\t<Resource path="%s"/>\n' % (ifile)
-    XMLStr += '\t</Resources>\n'
-
-    ## ADD PANEL SECTION
-    XMLStr += '\t<Panel height="1160" name="DataPanel" width="1897">\n'
-    for ifile,colour in fileList:
-        extension = os.path.splitext(ifile)[1].lower()
-        if extension in ['.bed','.broadpeak','.narrowpeak']:
-            XMLStr += '\t\t<Track altColor="0,0,178" autoScale="false" clazz="org.broad.igv.track.FeatureTrack" color="%s" ' % (colour)
-            XMLStr += 'displayMode="SQUISHED" featureVisibilityWindow="-1" fontSize="12" height="20" '
-            XMLStr += 'id="%s" name="%s" renderer="BASIC_FEATURE" sortable="false" visible="true" windowFunction="count"/>\n' % (ifile,os.path.basename(ifile))
-        elif extension in ['.bw', '.bigwig', '.tdf']:
-            XMLStr += '\t\t<Track altColor="0,0,178" autoScale="true" clazz="org.broad.igv.track.DataSourceTrack" color="%s" ' % (colour)
-            XMLStr += 'displayMode="COLLAPSED" featureVisibilityWindow="-1" fontSize="12" height="100" '
-            XMLStr += 'id="%s" name="%s" normalize="false" renderer="BAR_CHART" sortable="true" visible="true" windowFunction="mean">\n' % (ifile,os.path.basename(ifile))
-            XMLStr += '\t\t\t<DataRange baseline="0.0" drawBaseline="true" flipAxis="false" maximum="10" minimum="0.0" type="LINEAR"/>\n'
-            XMLStr += '\t\t</Track>\n'
-        elif extension in ['.gtf']:
-            XMLStr += '\t\t<Track altColor="0,0,178" autoScale="false" clazz="org.broad.igv.track.FeatureTrack" color="%s" ' % (colour)
-            XMLStr += 'displayMode="COLLAPSED" featureVisibilityWindow="-1" fontSize="12" '
-            XMLStr += 'id="%s" name="%s" renderer="BASIC_FEATURE" sortable="false" visible="true" windowFunction="count"/>\n' % (ifile,os.path.basename(ifile))
-        elif extension in ['.bam']:
-            pass
-        else:
-            XMLStr += '\t\t<Track altColor="0,0,178" autoScale="false" clazz="org.broad.igv.track.FeatureTrack" color="%s" ' % (colour)
-            XMLStr += 'displayMode="SQUISHED" featureVisibilityWindow="-1" fontSize="10" height="20" '
-            XMLStr += 'id="%s" name="%s" renderer="BASIC_FEATURE" sortable="false" visible="true" windowFunction="count"/>\n' % (ifile,os.path.basename(ifile))
-
-    XMLStr += '\t</Panel>\n'
-    #XMLStr += '\t<HiddenAttributes>\n\t\t<Attribute name="DATA FILE"/>\n\t\t<Attribute name="DATA TYPE"/>\n\t\t<Attribute name="NAME"/>\n\t</HiddenAttributes>\n'
-    XMLStr += '</Session>'
-    XMLOut = open(XMLOut,'w')
-    XMLOut.write(XMLStr)
-    XMLOut.close()
+
+    ## Each section is written as it is generated so the session is built in a single linear pass
+    with open(XMLOut,'w') as fout:
+
+        ## ADD RESOURCES SECTION
+        fout.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+        fout.write('<Session genome="%s" hasGeneTrack="true" hasSequenceTrack="true" locus="All" version="8">\n' % (Genome))
+        fout.write('\t<Resources>\n')
+        for ifile,colour in fileList:
+            fout.write('\t\t<Resource path="%s"/>\n' % (ifile))
+        fout.write('\t</Resources>\n')
+
+        ## ADD PANEL SECTION
+        fout.write('\t<Panel height="1160" name="DataPanel" width="1897">\n')
+        for ifile,colour in fileList:
+            fout.write(track_xml(ifile,colour))
+        fout.write('\t</Panel>\n')
+        #fout.write('\t<HiddenAttributes>\n\t\t<Attribute name="DATA FILE"/>\n\t\t<Attribute name="DATA TYPE"/>\n\t\t<Attribute name="NAME"/>\n\t</HiddenAttributes>\n')
+        fout.write('</Session>')
 
 ############################################
 ############################################
@@ -114,7 +194,7 @@ def igv_files_to_session(XMLOut,ListFile,Genome,PathPrefix=''):
 ############################################
 ############################################
 
-igv_files_to_session(XMLOut=args.XML_OUT,ListFile=args.LIST_FILE,Genome=args.GENOME,PathPrefix=args.PATH_PREFIX)
+igv_files_to_session(XMLOut=args.XML_OUT,ListFile=args.LIST_FILE,Genome=args.GENOME,PathPrefix=args.PATH_PREFIX,IndexTracks=args.INDEX_TRACKS,ChromSizes=args.CHROM_SIZES)
 
 ############################################
 ############################################
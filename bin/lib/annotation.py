@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+from lib.intervals import IntervalIndex
+from lib.matrix import read_regions
+
+# Peaks within this distance of a TSS are promoter peaks
+PROMOTER_DISTANCE = 1000
+ANNOTATION_CLASSES = ['promoter', 'genic', 'intergenic']
+
+#*
+#========================================================================================
+# GENE INDEX
+#========================================================================================
+#*/
+
+class GeneIndex:
+    """
+    Sorted TSS positions per chromosome with the gene each belongs to, and an IntervalIndex of the
+    gene bodies. Built once, it annotates any number of peaks with a binary search per chromosome.
+    """
+
+    def __init__(self, genes):
+        self.genes = genes.reset_index(drop=True)
+        self.bodies = IntervalIndex(genes['chrom'].values, genes['start'].values, genes['end'].values)
+        tss = np.where(genes['strand'].values == '-', genes['end'].values - 1, genes['start'].values)
+        self.tss = dict()
+        for chrom, idx in self.genes.groupby('chrom', sort=False).indices.items():
+            order = np.argsort(tss[idx], kind='stable')
+            self.tss[chrom] = (tss[idx][order], idx[order])
+
+    @classmethod
+    def from_bed(cls, path):
+        return cls(read_regions(path))
+
+    def nearest_tss(self, chroms, starts, ends):
+        """
+        Return the index of the gene with the nearest TSS to each half-open interval, or -1 for
+        chromosomes without genes, and the signed distance from that TSS to the interval: zero if the
+        interval contains it, negative if the interval lies upstream of it on the gene's strand.
+        """
+        chroms = np.asarray(chroms).astype(str)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        gene = np.full(len(chroms), -1, dtype=np.int64)
+        distance = np.zeros(len(chroms), dtype=np.int64)
+
+        # group the queries by chromosome once, as IntervalIndex.overlaps does
+        codes, uniques = pd.factorize(chroms)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.append(0, np.cumsum(np.bincount(codes, minlength=len(uniques))))
+
+        for c, chrom in enumerate(uniques):
+            if chrom not in self.tss:
+                continue
+            tss, genes = self.tss[chrom]
+            sel = order[bounds[c]:bounds[c + 1]]
+            # the nearest TSS is the last one before the interval end or the first one after it
+            i = np.searchsorted(tss, ends[sel] - 1, side='right')
+            left = np.clip(i - 1, 0, len(tss) - 1)
+            right = np.clip(i, 0, len(tss) - 1)
+            dist_left = np.where(i > 0, np.maximum(starts[sel] - tss[left], 0), np.iinfo(np.int64).max)
+            dist_right = np.where(i < len(tss), tss[right] - (ends[sel] - 1), np.iinfo(np.int64).max)
+            nearest = np.where(dist_left <= dist_right, left, right)
+            gene[sel] = genes[nearest]
+            # position of the interval relative to the TSS, flipped for minus strand genes
+            offset = np.where(dist_left <= dist_right, dist_left, -dist_right)
+            distance[sel] = np.where(self.genes['strand'].values[genes[nearest]] == '-', -offset, offset)
+        return gene, distance
+
+    def annotate(self, chroms, starts, ends, promoter_distance=PROMOTER_DISTANCE):
+        """
+        Assign each peak its nearest gene, the distance to its TSS and a class: promoter within
+        promoter_distance of a TSS, genic within a gene body, or intergenic.
+        """
+        gene, distance = self.nearest_tss(chroms, starts, ends)
+        has_gene = gene >= 0
+        promoter = has_gene & (np.abs(distance) <= promoter_distance)
+        genic = self.bodies.overlaps(chroms, starts, ends)
+        return pd.DataFrame({
+            'nearest_gene': np.where(has_gene, self.genes['name'].values[np.maximum(gene, 0)], None),
+            'distance_to_tss': np.where(has_gene, distance, np.nan),
+            'annotation': np.select([promoter, genic], ANNOTATION_CLASSES[:2], ANNOTATION_CLASSES[2])
+        })
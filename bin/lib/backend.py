@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from concurrent.futures import ProcessPoolExecutor
+
+# Execution backends for partitioned report loading; dask is optional and only imported when used
+BACKENDS = ['local', 'process', 'dask']
+
+#*
+#========================================================================================
+# BACKENDS
+#========================================================================================
+#*/
+
+class LocalBackend:
+    """
+    Run tasks one after another in this process, e.g. for testing the partitioned code paths.
+    """
+
+    def map(self, fn, *iterables):
+        return [fn(*x) for x in zip(*iterables)]
+
+    def close(self):
+        pass
+
+class ProcessBackend:
+    """
+    Run tasks across a pool of worker processes on this node.
+    """
+
+    def __init__(self, workers):
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def map(self, fn, *iterables):
+        return list(self.executor.map(fn, *iterables))
+
+    def close(self):
+        self.executor.shutdown()
+
+class DaskBackend:
+    """
+    Run tasks on a dask.distributed cluster, either an existing scheduler given by its address or
+    a local cluster of worker processes. With a single worker and no address the scheduler runs
+    in this process, which is convenient for testing.
+    """
+
+    def __init__(self, workers, scheduler=None):
+        try:
+            from dask.distributed import Client, LocalCluster
+        except ImportError:
+            raise ImportError('The dask backend requires dask[distributed] to be installed')
+        if scheduler is not None:
+            self.client = Client(scheduler)
+        elif workers <= 1:
+            self.client = Client(processes=False)
+        else:
+            self.client = Client(LocalCluster(n_workers=workers, threads_per_worker=1))
+
+    def map(self, fn, *iterables):
+        # pure=False as tasks are cheap to name but their inputs are paths, not content
+        return self.client.gather(self.client.map(fn, *iterables, pure=False))
+
+    def close(self):
+        self.client.close()
+
+def get_backend(name, workers=1, scheduler=None):
+    if name == 'local':
+        return LocalBackend()
+    if name == 'process':
+        return ProcessBackend(workers)
+    if name == 'dask':
+        return DaskBackend(workers, scheduler)
+    raise ValueError('Unknown backend: ' + str(name) + ', must be one of ' + ', '.join(BACKENDS))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+from lib.regions import RegionSet, count_regions
+from lib.stats import sample_id_from_path, split_sample_id
+
+CONSENSUS_NAME = 'consensus_peaks'
+
+#*
+#========================================================================================
+# READERS
+#========================================================================================
+#*/
+
+def read_peaks(path):
+    return pd.read_csv(path, sep='\t', header=None, usecols=[0,1,2], names=['chrom','start','end'], dtype={'chrom': str}, comment='#')
+
+#*
+#========================================================================================
+# CONSENSUS PEAKS
+#========================================================================================
+#*/
+
+def consensus_peaks(peak_paths, min_replicates=1):
+    """
+    Merge the peaks of all samples into a consensus peak set with a sweep over the peaks of each
+    chromosome sorted by start: a new consensus peak opens wherever a peak starts beyond every end
+    seen so far. A consensus peak is kept if at least min_replicates replicates of any one group
+    have a peak within it. Returns the consensus peaks with the number of samples supporting each.
+    """
+    frames = list()
+    for path in peak_paths:
+        peaks = read_peaks(path)
+        peaks['sample'] = sample_id_from_path(path)
+        frames.append(peaks)
+    peaks = pd.concat(frames, ignore_index=True)
+    peaks['group'] = [split_sample_id(x)[0] for x in peaks['sample']]
+    peaks = peaks.sort_values(['chrom', 'start'], kind='mergesort').reset_index(drop=True)
+
+    starts = peaks['start'].values
+    ends = peaks['end'].values
+    chrom_codes = pd.factorize(peaks['chrom'])[0]
+    new_chrom = np.ones(len(peaks), dtype=np.bool_)
+    new_chrom[1:] = chrom_codes[1:] != chrom_codes[:-1]
+
+    # running maximum of the ends, restarted on each chromosome
+    run_ends = ends.copy()
+    for lo, hi in zip(np.flatnonzero(new_chrom), np.append(np.flatnonzero(new_chrom)[1:], len(peaks))):
+        run_ends[lo:hi] = np.maximum.accumulate(ends[lo:hi])
+    new_peak = new_chrom.copy()
+    new_peak[1:] |= starts[1:] > run_ends[:-1]
+    peaks['peak'] = np.cumsum(new_peak) - 1
+
+    # replicates supporting each consensus peak, counted per group
+    support = peaks.drop_duplicates(['peak', 'sample'])
+    group_support = support.groupby(['peak', 'group']).size().groupby(level=0).max()
+    consensus = peaks.groupby('peak').agg(chrom=('chrom', 'first'), start=('start', 'min'), end=('end', 'max'))
+    consensus['support'] = support.groupby('peak').size()
+    consensus = consensus[group_support.reindex(consensus.index).values >= min_replicates].reset_index(drop=True)
+    consensus['name'] = consensus['chrom'] + ':' + consensus['start'].astype(str) + '-' + consensus['end'].astype(str)
+    return consensus[['chrom', 'start', 'end', 'name', 'support']]
+
+#*
+#========================================================================================
+# COUNT MATRIX
+#========================================================================================
+#*/
+
+def sample_order(sample_id):
+    # by group, then by replicate number so that R2 comes before R10
+    group, rep = split_sample_id(sample_id)
+    digits = ''.join([x for x in rep if x.isdigit()])
+    return group, int(digits) if digits else 0, rep
+
+def consensus_count_matrix(peak_paths, sample_paths, min_replicates=1, threads=1, keep_duplicates=False):
+    """
+    Build the consensus peak set and count the fragments of every sample in each consensus peak,
+    counting samples in parallel across threads worker processes. Only samples with peaks are
+    counted, and their columns are ordered by group and replicate. Duplicates are left out unless
+    keep_duplicates is set.
+    """
+    consensus = consensus_peaks(peak_paths, min_replicates)
+    peak_samples = set([sample_id_from_path(x) for x in peak_paths])
+    sample_paths = [x for x in sample_paths if sample_id_from_path(x) in peak_samples]
+    region_set = RegionSet(CONSENSUS_NAME, consensus['chrom'], consensus['start'], consensus['end'], consensus['name'])
+    matrices, _ = count_regions([region_set], sample_paths, threads, keep_duplicates)
+    matrix = matrices[CONSENSUS_NAME]
+
+    samples = [x for x in matrix.columns if x not in ['chrom', 'start', 'end', 'name']]
+    samples = sorted(samples, key=sample_order)
+    return consensus, matrix[['chrom', 'start', 'end', 'name'] + samples]
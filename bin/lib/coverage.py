@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import struct
+import numpy as np
+import pandas as pd
+
+COVERAGE_SUFFIX = '.coverage.bin'
+COVERAGE_MAGIC = b'CUTCOV01'
+COVERAGE_ALIGN = 64
+
+#*
+#========================================================================================
+# READERS
+#========================================================================================
+#*/
+
+def read_chrom_sizes(path):
+    """
+    Read a chrom sizes file (e.g. from GET_CHROM_SIZES) into an ordered dict of chromosome lengths.
+    """
+    sizes = pd.read_csv(path, sep='\t', header=None, usecols=[0,1], names=['chrom','size'], dtype={'chrom': str})
+    return dict(zip(sizes['chrom'], sizes['size'].astype(np.int64)))
+
+def fill_intervals(arr, starts, ends, values):
+    """
+    Write values over the non-overlapping intervals [starts, ends) of a coverage array.
+    """
+    lens = ends - starts
+    if lens.sum() == 0:
+        return
+    offsets = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens)
+    arr[np.repeat(starts, lens) + offsets] = np.repeat(values, lens)
+
+def read_bedgraph(path, chrom_sizes, chunk_size=1000000):
+    """
+    Read a bedGraph into a dict of float32 coverage arrays, one per chromosome in chrom_sizes, with
+    zero wherever the bedGraph has no interval. Intervals are clipped to the chromosome ends.
+    """
+    coverage = dict([(x, np.zeros(y, dtype=np.float32)) for x, y in chrom_sizes.items()])
+    reader = pd.read_csv(path, sep='\t', header=None, usecols=[0,1,2,3], names=['chrom','start','end','value'],
+        dtype={'chrom': str}, comment='#', chunksize=chunk_size)
+    for df in reader:
+        df = df[~df['chrom'].str.startswith(('track', 'browser'))]
+        for chrom, df_chrom in df.groupby('chrom', sort=False):
+            if chrom not in coverage:
+                continue
+            size = coverage[chrom].shape[0]
+            starts = np.clip(df_chrom['start'].values.astype(np.int64), 0, size)
+            ends = np.clip(df_chrom['end'].values.astype(np.int64), 0, size)
+            fill_intervals(coverage[chrom], starts, ends, df_chrom['value'].values.astype(np.float32))
+    return coverage
+
+#*
+#========================================================================================
+# COVERAGE STORE
+#========================================================================================
+#*/
+
+def coverage_header(chrom_sizes, dtype):
+    """
+    Build the store header: the chromosome sizes in order with the offset of each chromosome in
+    the array that follows, so any chromosome is a slice of one flat array.
+    """
+    offsets = np.append(0, np.cumsum(list(chrom_sizes.values())))
+    chroms = [[x, int(y), int(z)] for x, y, z in zip(chrom_sizes.keys(), chrom_sizes.values(), offsets[:-1])]
+    return {'dtype': np.dtype(dtype).str, 'chroms': chroms, 'length': int(offsets[-1])}
+
+def write_coverage_store(path, bedgraph, chrom_sizes, dtype=np.float32, chunk_size=1000000):
+    """
+    Write a bedGraph to a coverage store: a magic string and json header holding the chromosome
+    sizes, padded so the data is aligned, followed by one flat array of per-base coverage with every
+    chromosome at a fixed offset. The array is filled in place through a memory map, chunk by chunk.
+    """
+    header = json.dumps(coverage_header(chrom_sizes, dtype)).encode()
+    offset = len(COVERAGE_MAGIC) + 8 + len(header)
+    offset += -offset % COVERAGE_ALIGN
+    with open(path, 'wb') as fout:
+        fout.write(COVERAGE_MAGIC + struct.pack('<Q', offset) + header)
+        fout.write(b' ' * (offset - fout.tell()))
+
+    store = CoverageStore(path, mode='r+', init=True)
+    reader = pd.read_csv(bedgraph, sep='\t', header=None, usecols=[0,1,2,3], names=['chrom','start','end','value'],
+        dtype={'chrom': str}, comment='#', chunksize=chunk_size)
+    for df in reader:
+        df = df[~df['chrom'].str.startswith(('track', 'browser'))]
+        for chrom, df_chrom in df.groupby('chrom', sort=False):
+            if chrom not in store:
+                continue
+            arr = store[chrom]
+            starts = np.clip(df_chrom['start'].values.astype(np.int64), 0, arr.shape[0])
+            ends = np.clip(df_chrom['end'].values.astype(np.int64), 0, arr.shape[0])
+            fill_intervals(arr, starts, ends, df_chrom['value'].values.astype(arr.dtype))
+    store.flush()
+    return store
+
+class CoverageStore:
+    """
+    Memory-mapped view of a coverage store, read-only by default. Indexing by chromosome returns a zero-copy
+    slice of the mapped array, so lookups cost no decompression and processes reading the same
+    store share its pages through the page cache. It can be passed anywhere a dict of per-chromosome
+    coverage arrays is expected.
+    """
+
+    def __init__(self, path, mode='r', init=False):
+        self.path = path
+        with open(path, 'rb') as fin:
+            magic = fin.read(len(COVERAGE_MAGIC))
+            if magic != COVERAGE_MAGIC:
+                raise ValueError('Not a coverage store: ' + path)
+            offset = struct.unpack('<Q', fin.read(8))[0]
+            header = json.loads(fin.read(offset - len(COVERAGE_MAGIC) - 8).decode().rstrip())
+        self.chroms = dict([(x[0], (x[1], x[2])) for x in header['chroms']])
+        if init:
+            # size the file for the array before mapping it for writing
+            with open(path, 'ab') as fout:
+                fout.truncate(offset + header['length'] * np.dtype(header['dtype']).itemsize)
+        self.data = np.memmap(path, dtype=np.dtype(header['dtype']), mode=mode, offset=offset, shape=(header['length'],))
+
+    @property
+    def chrom_sizes(self):
+        return dict([(x, y[0]) for x, y in self.chroms.items()])
+
+    def keys(self):
+        return self.chroms.keys()
+
+    def __contains__(self, chrom):
+        return chrom in self.chroms
+
+    def __getitem__(self, chrom):
+        size, offset = self.chroms[chrom]
+        return self.data[offset:offset + size]
+
+    def fetch(self, chrom, start, end):
+        return self[chrom][max(start, 0):end]
+
+    def flush(self):
+        self.data.flush()
+
+def load_coverage(path, chrom_sizes=None):
+    """
+    Open a coverage store as a memory map, or read a bedGraph into memory.
+    """
+    if path.endswith(COVERAGE_SUFFIX):
+        return CoverageStore(path)
+    return read_bedgraph(path, chrom_sizes)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import json
+import warnings
+import pandas as pd
+
+from lib.options import DATA_FORMATS
+
+# Report datasets that scale with the number of fragments, bins or peaks
+BULK_DATASETS = ['frag_violin', 'replicate_heatmap', 'peak_widths', 'peak_genes']
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+#*
+#========================================================================================
+# TYPES
+#========================================================================================
+#*/
+
+def optimise_dtypes(df, max_category_ratio=0.5):
+    """
+    Return a copy of df with compact column types. Repetitive string columns such as group and
+    replicate become categoricals, which parquet and feather store dictionary-encoded, and
+    integer columns are downcast to the smallest type that holds their range.
+    """
+    df = df.reset_index(drop=True).infer_objects()
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object:
+            numeric = pd.to_numeric(series, errors='coerce')
+            if numeric.notna().sum() == series.notna().sum():
+                df[col] = numeric
+                series = numeric
+            elif series.nunique(dropna=True) <= max(1, len(series) * max_category_ratio):
+                df[col] = series.astype('category')
+                continue
+            else:
+                df[col] = series.astype(str)
+                continue
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast='integer')
+    return df
+
+def column_schema(df):
+    schema = []
+    for col in df.columns:
+        entry = {'name': str(col), 'dtype': str(df[col].dtype)}
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            entry['dtype'] = 'category'
+            entry['categories'] = int(len(df[col].cat.categories))
+        schema.append(entry)
+    return schema
+
+#*
+#========================================================================================
+# WRITERS
+#========================================================================================
+#*/
+
+def columnar_available():
+    try:
+        import pyarrow
+        return True
+    except ImportError:
+        return False
+
+def write_table(df, path_base, data_format, compression='zstd'):
+    """
+    Write a table in the requested format and return the file name that was written.
+    """
+    if data_format == 'parquet':
+        path = path_base + '.parquet'
+        df.to_parquet(path, engine='pyarrow', compression=compression, index=False)
+    elif data_format == 'feather':
+        path = path_base + '.feather'
+        df.reset_index(drop=True).to_feather(path, compression=compression)
+    else:
+        path = path_base + '.csv'
+        df.to_csv(path, index=False)
+    return os.path.basename(path)
+
+def export_data(data, output_path, data_format='csv', logger=None):
+    """
+    Write the report datasets to output_path. Bulky datasets are written in a compressed columnar
+    format with typed columns, while the small summary tables stay as csv for MultiQC and
+    spreadsheet use. A manifest describing every file and its schema is written alongside.
+    With data_format 'auto' the columnar format is used only if pyarrow is installed.
+    """
+    if data_format not in DATA_FORMATS:
+        raise ValueError('Unknown data format: ' + data_format)
+
+    manifest = {'version': MANIFEST_VERSION, 'datasets': dict()}
+    if data_format == 'auto':
+        manifest['requested_format'] = data_format
+        data_format = 'parquet' if columnar_available() else 'csv'
+    elif data_format != 'csv' and not columnar_available():
+        # the fallback is recorded in the manifest too, as the log of a pipeline task is easily missed
+        message = 'pyarrow is not installed, so the report data requested as ' + data_format + ' is written as csv'
+        if logger is not None:
+            logger.warning(message)
+        else:
+            warnings.warn(message)
+        manifest['requested_format'] = data_format
+        manifest['warnings'] = [message]
+        data_format = 'csv'
+
+    for key in data:
+        fmt = data_format if key in BULK_DATASETS else 'csv'
+        df = data[key]
+        if fmt != 'csv':
+            df = optimise_dtypes(df)
+
+        file_name = write_table(df, os.path.join(output_path, key), fmt)
+        manifest['datasets'][key] = {
+            'file': file_name,
+            'format': fmt,
+            'rows': int(df.shape[0]),
+            'columns': column_schema(df)
+        }
+
+    with open(os.path.join(output_path, MANIFEST_NAME), 'w') as fout:
+        json.dump(manifest, fout, indent=4)
+
+    return manifest
+
+def load_dataset(output_path, key):
+    """
+    Load a dataset written by export_data using the manifest to find its file and format.
+    """
+    with open(os.path.join(output_path, MANIFEST_NAME), 'r') as fin:
+        manifest = json.load(fin)
+
+    entry = manifest['datasets'][key]
+    path = os.path.join(output_path, entry['file'])
+    if entry['format'] == 'parquet':
+        return pd.read_parquet(path)
+    elif entry['format'] == 'feather':
+        return pd.read_feather(path)
+    return pd.read_csv(path)
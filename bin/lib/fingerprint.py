@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+# Points at which each fingerprint curve is reported and on which the JS distance is integrated
+FINGERPRINT_POINTS = 1000
+JSD_POINTS = 100000
+
+# The fraction of signal is reported for this top fraction of bins
+TOP_BIN_FRACTION = 0.01
+
+#*
+#========================================================================================
+# FINGERPRINTS
+#========================================================================================
+#*/
+
+def fingerprint_curves(counts, n_points=FINGERPRINT_POINTS):
+    """
+    Fingerprint curves in the style of deeptools plotFingerprint from a bin x sample count matrix:
+    the cumulative fraction of each sample's signal against the fraction of bins, with bins sorted
+    by count. All samples are sorted and summed at once. Returns the fraction of bins at n_points
+    evenly spaced ranks and the matching sample x n_points array of signal fractions.
+    """
+    n_bins = counts.shape[0]
+    cum = np.cumsum(np.sort(counts, axis=0), axis=0, dtype=np.float64)
+    totals = cum[-1] if n_bins > 0 else np.zeros(counts.shape[1])
+    ranks = np.unique(np.linspace(0, n_bins, n_points + 1).astype(np.int64))
+    signal = np.vstack([np.zeros((1, counts.shape[1])), cum])[ranks]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        signal = signal / totals
+    return ranks / max(n_bins, 1), signal.T
+
+def signal_distribution(hist, n_points=JSD_POINTS):
+    """
+    Distribution of signal over evenly spaced quantiles of bins, from a histogram of bin counts: the
+    derivative of the fingerprint curve, as compared by deeptools for the synthetic JS distance.
+    """
+    bin_frac = np.cumsum(hist) / hist.sum()
+    signal = hist * np.arange(hist.shape[0])
+    signal_frac = np.cumsum(signal) / signal.sum()
+    curve = np.interp(np.linspace(0, 1, n_points + 1), np.append(0, bin_frac), np.append(0, signal_frac))
+    return np.diff(curve)
+
+def poisson_hist(total, n_bins, size):
+    # expected histogram of bin counts if the signal were spread uniformly at random
+    lam = total / n_bins
+    k = np.arange(size)
+    log_factorial = np.append(0, np.cumsum(np.log(np.arange(1, size))))
+    return n_bins * np.exp(k * np.log(lam) - lam - log_factorial)
+
+def js_distance(p, q):
+    p = p / p.sum()
+    q = q / q.sum()
+    m = (p + q) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kl_p = np.nansum(np.where(p > 0, p * np.log2(p / m), 0))
+        kl_q = np.nansum(np.where(q > 0, q * np.log2(q / m), 0))
+    return np.sqrt(max((kl_p + kl_q) / 2, 0))
+
+def synthetic_jsd(counts):
+    """
+    Jensen-Shannon distance between the signal distribution of one sample's bin counts and that of
+    a Poisson sample of the same depth, which is 0 for signal without enrichment.
+    """
+    counts = np.rint(counts).astype(np.int64)
+    if counts.shape[0] == 0 or counts.sum() == 0:
+        return np.nan
+    hist = np.bincount(counts)
+    size = max(hist.shape[0], int(counts.mean() * 10) + 10)
+    hist = np.append(hist, np.zeros(size - hist.shape[0]))
+    return js_distance(signal_distribution(hist), signal_distribution(poisson_hist(counts.sum(), counts.shape[0], size)))
+
+def fingerprint_metrics(counts, top_fraction=TOP_BIN_FRACTION):
+    """
+    Enrichment metrics per sample from a bin x sample count matrix: the fraction of bins without
+    signal, the area under the fingerprint curve, the elbow point where the curve is furthest below
+    the diagonal, the fraction of signal in the top bins and the synthetic JS distance.
+    """
+    bin_frac, signal = fingerprint_curves(counts, counts.shape[0])
+    n_top = max(int(np.ceil(counts.shape[0] * top_fraction)), 1)
+    return pd.DataFrame({
+        'zero_bins': (counts == 0).mean(axis=0),
+        'auc': ((signal[:, 1:] + signal[:, :-1]) / 2 * np.diff(bin_frac)).sum(axis=1),
+        'elbow': bin_frac[np.argmax(bin_frac[None, :] - np.nan_to_num(signal), axis=1)],
+        'top_bins_signal': 1 - signal[:, -(n_top + 1)],
+        'synthetic_jsd': [synthetic_jsd(counts[:, i]) for i in range(counts.shape[1])]
+    })
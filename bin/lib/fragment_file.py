@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pysam
+
+from lib.fragments import bam_to_fragments, sample_counts
+
+FRAGMENT_SUFFIX = '.fragments.tsv.gz'
+FRAGMENT_COLS = ['chrom', 'start', 'end', 'name', 'count']
+FRAGMENT_DTYPES = {'chrom': str, 'start': np.int64, 'end': np.int64, 'name': str, 'count': np.int64}
+
+# Only fragments shorter than this are binned, as in the bedtools/awk fragment steps the bins replace
+BIN_MAX_FRAG_LEN = 1000
+
+#*
+#========================================================================================
+# WRITER
+#========================================================================================
+#*/
+
+def collapse_fragments(chroms, starts, ends, references=None):
+    """
+    Sort fragments by chromosome, start and end and collapse identical fragments into a count.
+    Chromosomes are ordered as in references (e.g. the BAM header) when given.
+    """
+    df = pd.DataFrame({'chrom': chroms, 'start': starts, 'end': ends})
+    if references is not None:
+        df['chrom'] = pd.Categorical(df['chrom'], categories=list(references), ordered=True)
+    df = df.groupby(['chrom', 'start', 'end'], sort=True, observed=True).size().reset_index(name='count')
+    df['chrom'] = df['chrom'].astype(str)
+    return df
+
+def write_fragment_file(path, df, name, chunk_size=1000000):
+    """
+    Write collapsed fragments as a bgzip-compressed, tabix-indexed tsv of chrom, start, end, name, count
+    with zero-based, half-open coordinates.
+    """
+    with pysam.BGZFile(path, 'wb') as fout:
+        for i in range(0, df.shape[0], chunk_size):
+            chunk = df.iloc[i:i + chunk_size].assign(name=name)[FRAGMENT_COLS]
+            fout.write(chunk.to_csv(sep='\t', header=False, index=False).encode())
+    pysam.tabix_index(path, preset='bed', force=True)
+    return path
+
+def bam_to_fragment_file(bam_path, path, name, threads=1, skip_duplicates=False):
+    """
+    Write the fragments of a BAM file to a fragments file. Reads flagged as duplicates are kept by
+    default, like the bedtools and samtools fragment steps the file replaces.
+    """
+    chroms, starts, ends = bam_to_fragments(bam_path, threads, skip_duplicates=skip_duplicates)
+    bamfile = pysam.AlignmentFile(bam_path, "rb")
+    references = bamfile.references
+    bamfile.close()
+
+    # fragment ends are inclusive in memory and half-open on disk
+    df = collapse_fragments(chroms, starts, ends + 1, references)
+    write_fragment_file(path, df, name)
+    return df
+
+#*
+#========================================================================================
+# READER
+#========================================================================================
+#*/
+
+class FragmentFile:
+    """
+    Reader for a fragments file with random access to regions through its tabix index and
+    sequential iteration over the whole file in chunks. Both parse the text records, through
+    pysam for regions and pandas for chunks, into numpy arrays.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def contigs(self):
+        with pysam.TabixFile(self.path) as tbx:
+            return list(tbx.contigs)
+
+    def fetch(self, chrom, start=None, end=None):
+        """
+        Return the fragments overlapping a region as a dict of numpy arrays.
+        """
+        with pysam.TabixFile(self.path) as tbx:
+            if chrom not in tbx.contigs:
+                rows = []
+            else:
+                rows = [x.split('\t') for x in tbx.fetch(chrom, start, end)]
+        df = pd.DataFrame(rows, columns=FRAGMENT_COLS).astype(FRAGMENT_DTYPES)
+        return self.to_arrays(df)
+
+    def iter_chunks(self, chunk_size=1000000):
+        """
+        Yield the whole file as dicts of numpy arrays holding at most chunk_size fragments each.
+        """
+        reader = pd.read_csv(self.path, sep='\t', header=None, names=FRAGMENT_COLS, dtype=FRAGMENT_DTYPES, compression='gzip', chunksize=chunk_size)
+        for df in reader:
+            yield self.to_arrays(df)
+
+    def iter_chroms(self, chunk_size=1000000):
+        """
+        Yield (chrom, fragments) for each chromosome in file order from one sequential pass,
+        holding back the tail of each chunk until its chromosome is complete.
+        """
+        pending = list()
+        for chunk in self.iter_chunks(chunk_size):
+            chroms = chunk['chrom']
+            breaks = np.flatnonzero(chroms[1:] != chroms[:-1]) + 1
+            for start, end in zip(np.append(0, breaks), np.append(breaks, len(chroms))):
+                part = dict([(x, y[start:end]) for x, y in chunk.items()])
+                if len(pending) > 0 and pending[0]['chrom'][0] != part['chrom'][0]:
+                    yield self.chrom_frags(pending)
+                    pending = list()
+                pending.append(part)
+        if len(pending) > 0:
+            yield self.chrom_frags(pending)
+
+    @staticmethod
+    def chrom_frags(parts):
+        frags = dict([(x, np.concatenate([c[x] for c in parts])) for x in parts[0]])
+        return frags['chrom'][0], frags
+
+    def read(self):
+        chunks = list(self.iter_chunks())
+        if len(chunks) == 0:
+            return self.to_arrays(pd.DataFrame(columns=FRAGMENT_COLS).astype(FRAGMENT_DTYPES))
+        return dict([(x, np.concatenate([c[x] for c in chunks])) for x in chunks[0]])
+
+    @staticmethod
+    def to_arrays(df):
+        return {
+            'chrom': df['chrom'].values,
+            'start': df['start'].values,
+            'end': df['end'].values,
+            'count': df['count'].values
+        }
+
+    def to_bam_df(self, fraction=1.0, seed=0, unique=False):
+        """
+        Expand the fragments to one row each in the frame layout of pe_bam_to_df, optionally thinned
+        to a fraction of fragments. With unique set each distinct fragment is expanded once.
+        """
+        return frags_to_bam_df(self.read(), fraction, seed, unique)
+
+#*
+#========================================================================================
+# SUMMARIES
+#========================================================================================
+#*/
+
+def frags_to_bam_df(frags, fraction=1.0, seed=0, unique=False):
+    # frame ends are inclusive, as for fragments paired from a BAM file
+    counts = sample_counts(np.minimum(frags['count'], 1) if unique else frags['count'], fraction, seed)
+    return pd.DataFrame({
+        "Chromosome" : np.repeat(frags['chrom'], counts),
+        "Start" : np.repeat(frags['start'], counts),
+        "End" : np.repeat(frags['end'] - 1, counts)
+    })
+
+def frags_length_hist(frags):
+    df = pd.DataFrame({'Size': frags['end'] - frags['start'], 'Occurrences': frags['count']})
+    return df.groupby('Size', sort=False)['Occurrences'].sum()
+
+def frags_bin_counts(frags, width, max_length=BIN_MAX_FRAG_LEN):
+    keep = (frags['end'] - frags['start']) < max_length if max_length is not None else slice(None)
+    bin_pos = (frags['start'][keep] + frags['end'][keep]) // (2 * width) * width + width // 2
+    df = pd.DataFrame({'chrom': frags['chrom'][keep], 'bin': bin_pos, 'count': frags['count'][keep]})
+    return df.groupby(['chrom', 'bin'], sort=False)['count'].sum()
+
+def merge_length_hists(hists):
+    """
+    Sum partial fragment length histograms, e.g. from chunks or chromosomes of a file.
+    """
+    if len(hists) == 0:
+        return pd.DataFrame({'Size': np.zeros(0, dtype=np.int64), 'Occurrences': np.zeros(0, dtype=np.int64)})
+    return pd.concat(hists).groupby(level=0).sum().sort_index().reset_index()
+
+def merge_bin_counts(bins):
+    """
+    Sum partial bin counts, keeping bins in the order they were first seen.
+    """
+    if len(bins) == 0:
+        return pd.DataFrame({'chrom': np.zeros(0, dtype=str), 'bin': np.zeros(0, dtype=np.int64), 'count': np.zeros(0, dtype=np.int64)})
+    return pd.concat(bins).groupby(level=[0, 1], sort=False).sum().reset_index()
+
+def fragment_length_hist(frag_file):
+    """
+    Histogram of fragment lengths, as reported in the TLEN field, accumulated over the file in chunks.
+    """
+    return merge_length_hists([frags_length_hist(x) for x in frag_file.iter_chunks()])
+
+def fragment_bin_counts(frag_file, width, max_length=BIN_MAX_FRAG_LEN):
+    """
+    Fragment counts in fixed width bins labelled with their midpoint, assigning each fragment by its
+    own midpoint, accumulated over the file in chunks. Only fragments shorter than max_length are counted.
+    """
+    return merge_bin_counts([frags_bin_counts(x, width, max_length) for x in frag_file.iter_chunks()])
@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import heapq
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+import pysam
+
+#*
+#========================================================================================
+# BAM TO FRAGMENTS
+#========================================================================================
+#*/
+
+# Unmatched mates held while pairing, beyond this the oldest are resolved from their mate fields
+MATE_BUFFER_SIZE = 1000000
+
+def is_fragment_read(read, skip_duplicates=True):
+    return read.is_paired and not read.is_unmapped and not read.mate_is_unmapped and not (skip_duplicates and read.is_duplicate) \
+        and not read.is_secondary and not read.is_supplementary and read.reference_id == read.next_reference_id
+
+def pair_fragments(reads, mode='pair', max_buffer=MATE_BUFFER_SIZE, coordinate_sorted=False, fraction=None, skip_duplicates=True):
+    """
+    Build fragments from the reads of paired-end templates, returning reference id, start and end arrays.
+
+    In 'pair' mode reads wait in a buffer keyed by query name until their mate arrives, which works for
+    name-grouped or coordinate-sorted reads. A template only yields a fragment if both of its reads pass
+    the filters; reads whose mate never arrives, e.g. because it was flagged as a duplicate, are dropped.
+    For coordinate-sorted input a buffered read is dropped as soon as the reads have passed its mate
+    position, so the buffer only holds templates spanning the current position. If it still grows past
+    max_buffer the oldest read is resolved from its mate position and template length and only its
+    name is kept; the fragment is kept when its mate arrives and dropped if it never does, so the result
+    does not depend on max_buffer. In 'read1' mode each fragment is built from read 1 alone using the
+    mate fields, which needs no buffer at all. If fraction is set only templates selected by in_sample
+    are kept. Reads flagged as duplicates are dropped unless skip_duplicates is False.
+    """
+    tids = array('l')
+    starts = array('q')
+    ends = array('q')
+    buffer = dict()
+    # fragments resolved from mate fields when their read left the buffer, by query name
+    resolved = dict()
+    orphans = list()
+    # mate positions of buffered reads, to find the ones whose mate was filtered out
+    pending = list()
+
+    def add_from_mate_fields(tid, ref_start, next_start, tlen):
+        # TLEN spans the leftmost to the rightmost mapped base of the pair
+        start = min(ref_start, next_start)
+        tids.append(tid)
+        starts.append(start)
+        ends.append(start + abs(tlen) - 1)
+
+    def drop_unpaired(name):
+        if buffer.pop(name, None) is None and name in resolved:
+            orphans.append(resolved.pop(name))
+
+    for read in reads:
+        if not is_fragment_read(read, skip_duplicates):
+            continue
+        if fraction is not None and not in_sample(read.query_name, fraction):
+            continue
+
+        if mode == 'read1':
+            if read.is_read1 and read.template_length != 0:
+                add_from_mate_fields(read.reference_id, read.reference_start, read.next_reference_start, read.template_length)
+            continue
+
+        if coordinate_sorted:
+            while pending and (pending[0][0] < read.reference_id or (pending[0][0] == read.reference_id and pending[0][1] < read.reference_start)):
+                drop_unpaired(heapq.heappop(pending)[2])
+
+        mate = buffer.pop(read.query_name, None)
+        if mate is None and resolved.pop(read.query_name, None) is not None:
+            # the mate was resolved when it left the buffer
+            continue
+        if mate is None and coordinate_sorted and read.next_reference_start < read.reference_start:
+            # the mate came first but did not pass the filters
+            continue
+        if mate is None:
+            buffer[read.query_name] = (read.reference_id, read.reference_start, read.reference_end, read.next_reference_start, read.template_length)
+            if coordinate_sorted:
+                heapq.heappush(pending, (read.reference_id, read.next_reference_start, read.query_name))
+            if len(buffer) > max_buffer:
+                name = next(iter(buffer))
+                oldest = buffer.pop(name)
+                resolved[name] = len(starts)
+                add_from_mate_fields(oldest[0], oldest[1], oldest[3], oldest[4])
+            continue
+
+        tids.append(read.reference_id)
+        starts.append(min(read.reference_start, mate[1]))
+        ends.append(max(read.reference_end, mate[2]) - 1)
+
+    # fragments resolved early whose mate never arrived
+    orphans.extend(resolved.values())
+    keep = np.ones(len(starts), dtype=bool)
+    keep[orphans] = False
+    return np.array(tids, dtype=np.int32)[keep], np.array(starts, dtype=np.int64)[keep], np.array(ends, dtype=np.int64)[keep]
+
+def contig_fragments(bam_path, contig, mode='pair', max_buffer=MATE_BUFFER_SIZE, fraction=None, skip_duplicates=True):
+    bamfile = pysam.AlignmentFile(bam_path, "rb")
+    fragments = pair_fragments(bamfile.fetch(contig), mode, max_buffer, True, fraction, skip_duplicates)
+    bamfile.close()
+    return fragments
+
+def bam_to_fragments(bam_path, threads=1, mode='pair', max_buffer=MATE_BUFFER_SIZE, fraction=None, skip_duplicates=True):
+    """
+    Extract fragments from a paired-end BAM file in any sort order. Indexed BAM files are processed
+    contig by contig, in parallel across threads worker processes; otherwise the file is read in one pass.
+    """
+    bamfile = pysam.AlignmentFile(bam_path, "rb")
+    references = np.array(bamfile.references)
+    contigs = None
+    if bamfile.has_index():
+        contigs = [x.contig for x in bamfile.get_index_statistics() if x.mapped > 0]
+    else:
+        coordinate_sorted = bamfile.header.to_dict().get('HD', {}).get('SO') == 'coordinate'
+        results = [pair_fragments(bamfile, mode, max_buffer, coordinate_sorted, fraction, skip_duplicates)]
+    bamfile.close()
+
+    if contigs is not None and threads > 1 and len(contigs) > 1:
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(contig_fragments, repeat(bam_path), contigs, repeat(mode), repeat(max_buffer), repeat(fraction), repeat(skip_duplicates)))
+    elif contigs is not None:
+        results = [contig_fragments(bam_path, x, mode, max_buffer, fraction, skip_duplicates) for x in contigs]
+
+    tids = np.concatenate([x[0] for x in results]) if results else np.zeros(0, dtype=np.int32)
+    starts = np.concatenate([x[1] for x in results]) if results else np.zeros(0, dtype=np.int64)
+    ends = np.concatenate([x[2] for x in results]) if results else np.zeros(0, dtype=np.int64)
+    return references[tids], starts, ends
+
+def pe_bam_to_df(bam_path, threads=1, mode='pair'):
+    chrom_arr, start_arr, end_arr = bam_to_fragments(bam_path, threads, mode)
+
+    # create dataframe
+    bam_df = pd.DataFrame({ "Chromosome" : chrom_arr, "Start" : start_arr, "End" : end_arr })
+    return(bam_df)
+
+#*
+#========================================================================================
+# PREVIEW SAMPLING
+#========================================================================================
+#*/
+
+def in_sample(query_name, fraction):
+    # a hash of the read name selects both mates of a template, in every process and on every run
+    return zlib.crc32(query_name.encode()) < fraction * 4294967296
+
+def preview_fraction(total, preview):
+    if preview is None:
+        return 1.0
+    if preview <= 1:
+        return preview
+    return min(1.0, preview / total) if total > 0 else 1.0
+
+def sample_bam_to_df(bam_path, preview, threads=1, mode='pair', seed=0):
+    """
+    Extract a uniform sample of the fragments in a BAM file and return it with the sampled fraction.
+    For indexed BAM files a requested number of fragments is converted to a fraction from the index
+    statistics so only the sampled templates are paired; otherwise all fragments are read and
+    a reservoir-style random subset of the requested size is kept.
+    """
+    fraction = preview if preview <= 1 else None
+    if fraction is None:
+        bamfile = pysam.AlignmentFile(bam_path, "rb")
+        if bamfile.has_index():
+            fraction = preview_fraction(sum([x.mapped for x in bamfile.get_index_statistics()]) / 2, preview)
+        bamfile.close()
+
+    if fraction is not None:
+        chrom_arr, start_arr, end_arr = bam_to_fragments(bam_path, threads, mode, fraction=fraction)
+    else:
+        chrom_arr, start_arr, end_arr = bam_to_fragments(bam_path, threads, mode)
+        fraction = preview_fraction(len(start_arr), preview)
+        if fraction < 1:
+            keep = np.sort(np.random.default_rng(seed).choice(len(start_arr), int(preview), replace=False))
+            chrom_arr, start_arr, end_arr = chrom_arr[keep], start_arr[keep], end_arr[keep]
+
+    bam_df = pd.DataFrame({ "Chromosome" : chrom_arr, "Start" : start_arr, "End" : end_arr })
+    return bam_df, fraction
+
+def sample_counts(counts, fraction, seed=0):
+    """
+    Thin histogram counts to a fraction of their observations.
+    """
+    if fraction >= 1:
+        return counts
+    return np.random.default_rng(seed).binomial(counts, fraction)
+
+def frag_len_counts(bam_df):
+    # histogram of fragment lengths for a single sample; frame ends are inclusive, so this matches TLEN
+    widths = (bam_df['End'] - bam_df['Start']).abs() + 1
+    return np.unique(widths, return_counts=True)
+
+#*
+#========================================================================================
+# FRAGMENT DE-DUPLICATION
+#========================================================================================
+#*/
+
+# Picard DuplicationMetrics columns, written so MultiQC and collect_meta.py read both tools alike
+DEDUP_METRICS_COLS = ['LIBRARY', 'UNPAIRED_READS_EXAMINED', 'READ_PAIRS_EXAMINED', 'SECONDARY_OR_SUPPLEMENTARY_RDS',
+    'UNMAPPED_READS', 'UNPAIRED_READ_DUPLICATES', 'READ_PAIR_DUPLICATES', 'READ_PAIR_OPTICAL_DUPLICATES',
+    'PERCENT_DUPLICATION', 'ESTIMATED_LIBRARY_SIZE']
+
+def fragment_key(read):
+    """
+    Return the (paired, chrom, mate_chrom, start, end, strand) key of the fragment a primary mapped read
+    belongs to. Pairs are keyed on read 1 so that each template contributes exactly one key, unpaired reads
+    are keyed on their 5' end.
+    """
+    if read.is_paired and not read.mate_is_unmapped:
+        strand = read.is_reverse if read.is_read1 else read.mate_is_reverse
+        if read.reference_id == read.next_reference_id and read.template_length != 0:
+            start = min(read.reference_start, read.next_reference_start)
+            end = start + abs(read.template_length)
+        else:
+            start = read.reference_start if read.is_read1 else read.next_reference_start
+            end = read.next_reference_start if read.is_read1 else read.reference_start
+        return 1, read.reference_id, read.next_reference_id, start, end, strand
+
+    five_prime = read.reference_end if read.is_reverse else read.reference_start
+    return 0, read.reference_id, read.reference_id, five_prime, five_prime, read.is_reverse
+
+def key_reads(bamfile, counts):
+    """
+    Yield the primary mapped reads that key a fragment, one per template, counting the unmapped and
+    secondary or supplementary reads skipped into counts.
+    """
+    for read in bamfile:
+        if read.is_unmapped:
+            counts['unmapped'] += 1
+            continue
+        if read.is_secondary or read.is_supplementary:
+            counts['secondary_or_supplementary'] += 1
+            continue
+        if read.is_paired and not read.mate_is_unmapped and not read.is_read1:
+            continue
+        yield read
+
+def bam_fragment_arrays(bam_path):
+    """
+    Read a coordinate or name sorted BAM in one pass into columnar fragment key arrays. Read counts
+    matching the Picard metrics are returned alongside.
+    """
+    paired, chrom, mate_chrom, start, end, strand = [], [], [], [], [], []
+    counts = {'secondary_or_supplementary': 0, 'unmapped': 0}
+
+    bamfile = pysam.AlignmentFile(bam_path, "rb")
+    for read in key_reads(bamfile, counts):
+        key = fragment_key(read)
+        paired.append(key[0])
+        chrom.append(key[1])
+        mate_chrom.append(key[2])
+        start.append(key[3])
+        end.append(key[4])
+        strand.append(key[5])
+    bamfile.close()
+
+    frags = {
+        'paired': np.array(paired, dtype=np.bool_),
+        'chrom': np.array(chrom, dtype=np.int32),
+        'mate_chrom': np.array(mate_chrom, dtype=np.int32),
+        'start': np.array(start, dtype=np.int64),
+        'end': np.array(end, dtype=np.int64),
+        'strand': np.array(strand, dtype=np.bool_)
+    }
+    return frags, counts
+
+def duplicate_names(bam_path, dup):
+    """
+    Return the read names of the fragments flagged in dup, which follows the order of bam_fragment_arrays.
+    Only the duplicates' names are held, so they are matched exactly without storing every name.
+    """
+    counts = {'secondary_or_supplementary': 0, 'unmapped': 0}
+    bamfile = pysam.AlignmentFile(bam_path, "rb")
+    names = set([read.query_name for read, is_dup in zip(key_reads(bamfile, counts), dup) if is_dup])
+    bamfile.close()
+    return names
+
+def duplicate_mask(*keys):
+    """
+    Flag every occurrence of a key after the first as a duplicate using a stable lexicographic sort,
+    so the copy that appears first in the file is the one retained.
+    """
+    n = len(keys[0])
+    dup = np.zeros(n, dtype=np.bool_)
+    if n == 0:
+        return dup
+
+    order = np.lexsort(keys[::-1])
+    new_key = np.zeros(n - 1, dtype=np.bool_)
+    for key in keys:
+        key_sorted = key[order]
+        new_key |= key_sorted[1:] != key_sorted[:-1]
+    dup[order[1:]] = ~new_key
+    return dup
+
+def estimate_library_size(read_pairs, unique_read_pairs):
+    """
+    Estimate the library size from the Lander-Waterman equation by bisection, as Picard does.
+    Returns None when there are no duplicates to base the estimate on.
+    """
+    read_pair_duplicates = read_pairs - unique_read_pairs
+    if read_pairs <= 0 or read_pair_duplicates <= 0:
+        return None
+
+    def f(x, c, n):
+        return c / x - 1 + np.exp(-n / x)
+
+    m = 1.0
+    M = 100.0
+    if unique_read_pairs >= read_pairs or f(m * unique_read_pairs, unique_read_pairs, read_pairs) < 0:
+        raise ValueError('Invalid values for pairs and unique pairs: ' + str(read_pairs) + ', ' + str(unique_read_pairs))
+
+    while f(M * unique_read_pairs, unique_read_pairs, read_pairs) > 0:
+        M *= 10.0
+
+    for _ in range(40):
+        r = (m + M) / 2.0
+        u = f(r * unique_read_pairs, unique_read_pairs, read_pairs)
+        if u == 0:
+            break
+        elif u > 0:
+            m = r
+        else:
+            M = r
+
+    return int(unique_read_pairs * (m + M) / 2.0)
+
+def dedup_metrics(frags, counts, dup, library='Unknown Library'):
+    pairs = int(frags['paired'].sum())
+    unpaired = int(frags['paired'].shape[0] - pairs)
+    pair_dups = int((dup & frags['paired']).sum())
+    unpaired_dups = int((dup & ~frags['paired']).sum())
+
+    examined = unpaired + pairs * 2
+    percent_dup = (unpaired_dups + pair_dups * 2) / examined if examined > 0 else 0
+    library_size = estimate_library_size(pairs, pairs - pair_dups)
+
+    return {
+        'LIBRARY': library,
+        'UNPAIRED_READS_EXAMINED': unpaired,
+        'READ_PAIRS_EXAMINED': pairs,
+        'SECONDARY_OR_SUPPLEMENTARY_RDS': counts['secondary_or_supplementary'],
+        'UNMAPPED_READS': counts['unmapped'],
+        'UNPAIRED_READ_DUPLICATES': unpaired_dups,
+        'READ_PAIR_DUPLICATES': pair_dups,
+        'READ_PAIR_OPTICAL_DUPLICATES': 0,
+        'PERCENT_DUPLICATION': round(percent_dup, 6),
+        'ESTIMATED_LIBRARY_SIZE': '' if library_size is None else library_size
+    }
+
+def write_dedup_metrics(path, metrics, command=''):
+    with open(path, 'w') as fout:
+        fout.write('## htsjdk.samtools.metrics.StringHeader\n')
+        fout.write('# ' + command + '\n')
+        fout.write('\n')
+        fout.write('## METRICS CLASS\tpicard.sam.DuplicationMetrics\n')
+        fout.write('\t'.join(DEDUP_METRICS_COLS) + '\n')
+        fout.write('\t'.join([str(metrics[x]) for x in DEDUP_METRICS_COLS]) + '\n')
+        fout.write('\n')
+
+def write_dedup_bam(bam_path, output_path, dup_names, remove_duplicates=False):
+    """
+    Copy bam_path to output_path with the duplicate flag set on every mapped read whose name is in
+    dup_names, or with those reads dropped if remove_duplicates is set.
+    """
+    bamfile = pysam.AlignmentFile(bam_path, "rb")
+    outfile = pysam.AlignmentFile(output_path, "wb", template=bamfile)
+    for read in bamfile:
+        is_dup = not read.is_unmapped and read.query_name in dup_names
+        if is_dup and remove_duplicates:
+            continue
+        read.is_duplicate = is_dup
+        outfile.write(read)
+    outfile.close()
+    bamfile.close()
+
+def dedup_fragments(bam_path, metrics_path, output_path=None, remove_duplicates=False, library='Unknown Library', command=''):
+    """
+    Identify fragment-level duplicates, which for CUT&RUN are fully defined by chrom, start, end and
+    strand, write Picard-style duplication metrics and optionally a marked or de-duplicated BAM.
+    """
+    frags, counts = bam_fragment_arrays(bam_path)
+    dup = duplicate_mask(frags['paired'], frags['chrom'], frags['mate_chrom'], frags['start'], frags['end'], frags['strand'])
+
+    metrics = dedup_metrics(frags, counts, dup, library)
+    write_dedup_metrics(metrics_path, metrics, command)
+
+    if output_path is not None:
+        write_dedup_bam(bam_path, output_path, duplicate_names(bam_path, dup), remove_duplicates)
+
+    return metrics
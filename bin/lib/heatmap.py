@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+# Cells are annotated with their value up to this many samples, and labelled up to the second limit
+HEATMAP_ANNOT_MAX = 25
+HEATMAP_LABEL_MAX = 100
+
+# Larger matrices are also exported as pages of this many rows against every sample
+HEATMAP_PAGE_SIZE = 50
+
+#*
+#========================================================================================
+# ORDERING
+#========================================================================================
+#*/
+
+def cluster_order(corr):
+    """
+    Leaf order of an average-linkage hierarchical clustering of the samples on 1 - correlation,
+    with missing correlations treated as none. Each merge updates the distance matrix in place, so
+    hundreds of samples cluster in well under a second.
+    """
+    n = corr.shape[0]
+    dist = 1 - np.nan_to_num(np.asarray(corr, dtype=np.float64), nan=0.0)
+    # computed correlations can differ from their transpose in the last bit, which would flip the leaf order of a merge
+    dist = (dist + dist.T) / 2
+    np.fill_diagonal(dist, np.inf)
+    sizes = np.ones(n)
+    leaves = [[i] for i in range(n)]
+    active = np.ones(n, dtype=np.bool_)
+    for _ in range(n - 1):
+        i, j = np.unravel_index(np.argmin(dist), dist.shape)
+        # the merged cluster takes row i, with the size-weighted mean distance of its parts
+        merged = (sizes[i] * dist[i] + sizes[j] * dist[j]) / (sizes[i] + sizes[j])
+        dist[i], dist[:, i] = merged, merged
+        dist[i, i] = np.inf
+        dist[j], dist[:, j] = np.inf, np.inf
+        sizes[i] += sizes[j]
+        leaves[i] = leaves[i] + leaves[j]
+        active[j] = False
+    return np.array(leaves[np.flatnonzero(active)[0]] if n > 0 else [], dtype=np.int64)
+
+def group_correlation(corr, groups):
+    """
+    Mean correlation between the samples of every pair of groups, excluding each sample's
+    correlation with itself.
+    """
+    values = np.asarray(corr, dtype=np.float64).copy()
+    np.fill_diagonal(values, np.nan)
+    codes, uniques = pd.factorize(np.asarray(groups))
+    # sum every block at once through the sample x group membership matrix
+    member = np.zeros((len(codes), len(uniques)))
+    member[np.arange(len(codes)), codes] = 1
+    finite = np.isfinite(values)
+    totals = member.T @ np.where(finite, values, 0) @ member
+    counts = member.T @ finite.astype(np.float64) @ member
+    with np.errstate(divide='ignore', invalid='ignore'):
+        summary = np.where(counts > 0, totals / counts, np.nan)
+    return pd.DataFrame(summary, index=uniques, columns=uniques)
+
+#*
+#========================================================================================
+# PLOTTING
+#========================================================================================
+#*/
+
+def draw_heatmap(ax, matrix, row_labels, col_labels, vmin=None, vmax=None, cmap='rocket', annot_max=HEATMAP_ANNOT_MAX, label_max=HEATMAP_LABEL_MAX):
+    """
+    Draw a matrix as a single rasterised image, whose render time and file size do not grow with the
+    number of cells. Values are written in the cells and ticks labelled only while they stay legible.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    image = ax.imshow(matrix, aspect='auto', interpolation='nearest', cmap=cmap, vmin=vmin, vmax=vmax, rasterized=True)
+    ax.grid(False)
+    ax.figure.colorbar(image, ax=ax, fraction=0.046, pad=0.04)
+
+    if len(row_labels) <= label_max:
+        ax.set_yticks(range(len(row_labels)))
+        ax.set_yticklabels(row_labels, fontsize='x-small')
+    else:
+        ax.set_yticks([])
+    if len(col_labels) <= label_max:
+        ax.set_xticks(range(len(col_labels)))
+        ax.set_xticklabels(col_labels, fontsize='x-small', rotation=90)
+    else:
+        ax.set_xticks([])
+
+    if max(matrix.shape) <= annot_max:
+        low = np.nanmin(matrix) if vmin is None else vmin
+        high = np.nanmax(matrix) if vmax is None else vmax
+        mid = (low + high) / 2
+        for (r, c), value in np.ndenumerate(matrix):
+            if np.isfinite(value):
+                ax.text(c, r, '%.2g' % value, ha='center', va='center', fontsize='x-small', color='black' if value > mid else 'white')
+    return image
+
+def heatmap_pages(corr, page_size=HEATMAP_PAGE_SIZE):
+    """
+    Split the rows of an ordered correlation matrix into pages of page_size samples, each against
+    every sample.
+    """
+    return [corr.iloc[i:i + page_size] for i in range(0, corr.shape[0], page_size)]
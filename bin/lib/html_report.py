@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import json
+import html
+import warnings
+import numpy as np
+import pandas as pd
+
+from lib.export import BULK_DATASETS, MANIFEST_NAME
+
+HTML_NAME = 'report.html'
+# plotly.js is inlined from the plotly python package, the CDN is only used when that is not installed
+PLOTLY_JS = 'https://cdn.plot.ly/plotly-2.27.0.min.js'
+
+# Lines are downsampled to this many points per sample, and values kept to this many significant digits
+LINE_POINTS = 200
+SIGNIFICANT_DIGITS = 4
+
+# Leading rows of every dataset embedded in the page as its preview
+PREVIEW_ROWS = 50
+
+#*
+#========================================================================================
+# DOWNSAMPLING
+#========================================================================================
+#*/
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling: return the indices of n_out points of the line
+    (x, y) that keep its visual shape. The first and last points are kept, and from each bucket of
+    the points in between the one forming the largest triangle with the point kept before it and
+    the mean of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bounds = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64) + 1
+    bounds[-1] = n - 1
+
+    keep = np.zeros(n_out, dtype=np.int64)
+    keep[-1] = n - 1
+    for b in range(n_out - 2):
+        lo, hi = bounds[b], bounds[b + 1]
+        next_lo, next_hi = hi, bounds[b + 2] if b + 2 < len(bounds) else n
+        x_c, y_c = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        x_a, y_a = x[keep[b]], y[keep[b]]
+        area = np.abs((x_a - x_c) * (y[lo:hi] - y_a) - (x_a - x[lo:hi]) * (y_c - y_a))
+        keep[b + 1] = lo + np.argmax(area)
+    return keep
+
+def downsample_lines(df, series, x, y, n_out=LINE_POINTS):
+    parts = list()
+    for _, df_series in df.groupby(series, sort=False):
+        df_series = df_series.sort_values(x)
+        parts.append(df_series.iloc[lttb(df_series[x].values, df_series[y].values, n_out)])
+    return pd.concat(parts) if parts else df
+
+#*
+#========================================================================================
+# SUMMARIES
+#========================================================================================
+#*/
+
+def weighted_box_stats(values, weights=None):
+    """
+    Box plot statistics of values, optionally weighted (e.g. a histogram), with whiskers at the most
+    extreme values within 1.5 IQR of the quartiles as plotted by seaborn.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+    order = np.argsort(values, kind='stable')
+    values, weights = values[order], weights[order]
+    cum = np.cumsum(weights)
+    q1, median, q3 = values[np.searchsorted(cum, cum[-1] * np.array([0.25, 0.5, 0.75]))]
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr) & (weights > 0)]
+    return {'q1': q1, 'median': median, 'q3': q3, 'lowerfence': inside.min(), 'upperfence': inside.max(),
+        'mean': (values * weights).sum() / cum[-1]}
+
+def sample_box_stats(df, value, weight=None, series=('group', 'replicate')):
+    rows = list()
+    for key, df_series in df.groupby(list(series), sort=True):
+        stats = weighted_box_stats(df_series[value].values, None if weight is None else df_series[weight].values)
+        stats['sample'] = '_'.join([str(x) for x in key])
+        rows.append(stats)
+    return pd.DataFrame(rows)
+
+def compact(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        return [None if np.isnan(x) else float('%.*g' % (SIGNIFICANT_DIGITS, x)) for x in values]
+    if values.dtype.kind in 'iub':
+        return values.tolist()
+    return [str(x) for x in values]
+
+#*
+#========================================================================================
+# FIGURES
+#========================================================================================
+#*/
+
+def figure(title, traces, xlabel=None, ylabel=None, **layout):
+    layout.update({'title': {'text': title}, 'xaxis': {'title': {'text': xlabel}}, 'yaxis': {'title': {'text': ylabel}}})
+    return {'data': traces, 'layout': layout}
+
+def group_box_figure(df, y, title, ylabel):
+    # one box per group with every sample as a point, the tables are one row per sample
+    traces = [{'type': 'box', 'name': str(group), 'y': compact(df_group[y].values), 'text': compact(df_group.iloc[:, 0].values),
+        'boxpoints': 'all', 'jitter': 0.3} for group, df_group in df.groupby('group', sort=True)]
+    return figure(title, traces, 'group', ylabel, showlegend=False)
+
+def sample_box_figure(stats, title, ylabel):
+    trace = {'type': 'box', 'x': compact(stats['sample'].values), 'boxpoints': False}
+    for key in ['q1', 'median', 'q3', 'lowerfence', 'upperfence', 'mean']:
+        trace[key] = compact(stats[key].values)
+    return figure(title, [trace], 'sample', ylabel)
+
+def line_figure(df, series, x, y, title, xlabel, ylabel, n_out=LINE_POINTS):
+    df = downsample_lines(df, series, x, y, n_out)
+    traces = [{'type': 'scattergl', 'mode': 'lines', 'name': str(name), 'x': compact(df_series[x].values), 'y': compact(df_series[y].values)}
+        for name, df_series in df.groupby(series, sort=True)]
+    return figure(title, traces, xlabel, ylabel)
+
+def heatmap_figure(matrix, title):
+    trace = {'type': 'heatmap', 'z': [compact(x) for x in matrix.values], 'x': compact(matrix.columns.values),
+        'y': compact(matrix.index.values), 'colorscale': 'Viridis'}
+    return figure(title, [trace])
+
+def stacked_bar_figure(df, x, columns, title, ylabel):
+    traces = [{'type': 'bar', 'name': str(col), 'x': compact(df[x].values), 'y': compact(df[col].values)} for col in columns]
+    return figure(title, traces, x, ylabel, barmode='stack')
+
+def preview_tables(data, n_rows=PREVIEW_ROWS):
+    # the first rows of each table, so previews need neither the side-car files nor a server
+    tables = dict()
+    for key, df in data.items():
+        df = df.head(n_rows)
+        columns = [compact(df[x].values) for x in df.columns]
+        tables[key] = {'columns': [str(x) for x in df.columns], 'rows': [list(x) for x in zip(*columns)]}
+    return tables
+
+def sample_names(df):
+    return df['group'].astype(str) + '_' + df['replicate'].astype(str)
+
+def report_figures(data):
+    """
+    Build plotly figure specs for the report datasets that are present, embedding only compact
+    summaries: per-sample tables as they are, box statistics in place of raw values, correlation
+    matrices in place of bin counts and lines downsampled with LTTB.
+    """
+    figures = dict()
+    if 'alignment_summary' in data:
+        figures['alignment_summary'] = group_box_figure(data['alignment_summary'], 'target_alignment_rate', 'Alignment Summary', 'Target alignment rate (%)')
+    if 'duplication_summary' in data:
+        figures['duplication_summary'] = group_box_figure(data['duplication_summary'], 'dedup_percent_duplication', 'Duplication Summary', 'Duplication rate (%)')
+    if 'saturation_summary' in data:
+        figures['saturation_summary'] = line_figure(data['saturation_summary'], 'id', 'depth', 'unique_frags', 'Library Saturation', 'Sequenced fragments', 'Unique fragments')
+    if 'frag_hist' in data:
+        frag_hist = data['frag_hist'].assign(sample=sample_names(data['frag_hist']))
+        figures['frag_violin'] = sample_box_figure(sample_box_stats(frag_hist, 'Size', 'Occurrences'), 'Fragment Length Distribution', 'Fragment length (bp)')
+        figures['frag_hist'] = line_figure(frag_hist, 'sample', 'Size', 'Occurrences', 'Fragment Length Histogram', 'Fragment length (bp)', 'Fragments')
+    if 'replicate_correlation' in data:
+        figures['replicate_heatmap'] = heatmap_figure(data['replicate_correlation'].set_index('sample'), 'Replicate Reproducibility')
+    elif 'replicate_heatmap' in data:
+        bins = data['replicate_heatmap']
+        figures['replicate_heatmap'] = heatmap_figure(bins[bins.columns[2:]].corr(method='pearson'), 'Replicate Reproducibility')
+    if 'fingerprint' in data:
+        figures['fingerprint'] = line_figure(data['fingerprint'], 'sample', 'bin_fraction', 'signal_fraction', 'Fingerprint', 'Fraction of bins', 'Fraction of signal')
+    if 'scale_factor_summary' in data:
+        figures['scale_factor_summary'] = group_box_figure(data['scale_factor_summary'], 'scale_factor', 'Scale Factor', 'Scale factor')
+    if 'no_of_peaks' in data:
+        figures['no_of_peaks'] = group_box_figure(data['no_of_peaks'].assign(sample=sample_names(data['no_of_peaks']))[['sample', 'group', 'all_peaks']], 'all_peaks', 'Total Peaks', 'No. of peaks')
+    if 'peak_widths' in data:
+        figures['peak_widths'] = sample_box_figure(sample_box_stats(data['peak_widths'], 'peak_width'), 'Peak Widths', 'Peak width (bp)')
+    if 'peak_annotation' in data:
+        annotation = data['peak_annotation'].assign(sample=sample_names(data['peak_annotation']))
+        figures['peak_annotation'] = stacked_bar_figure(annotation, 'sample', [x for x in annotation.columns if x not in ['group', 'replicate', 'sample']], 'Peak Genomic Distribution', 'Percentage of peaks')
+    if 'reproduced_peaks' in data:
+        figures['reproduced_peaks'] = group_box_figure(data['reproduced_peaks'].assign(sample=sample_names(data['reproduced_peaks']))[['sample', 'group', 'peak_reproduced_rate']], 'peak_reproduced_rate', 'Peak Reproducibility', 'Peaks reproduced (%)')
+    if 'frags_in_peaks' in data:
+        figures['frags_in_peaks'] = group_box_figure(data['frags_in_peaks'].assign(sample=sample_names(data['frags_in_peaks']))[['sample', 'group', 'percentage_frags_in_peaks']], 'percentage_frags_in_peaks', 'Fragments in Peaks', 'Fragments in peaks (%)')
+    return figures
+
+#*
+#========================================================================================
+# HTML
+#========================================================================================
+#*/
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{plotly}
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+.plot {{ height: 450px; margin-bottom: 2em; }}
+table {{ border-collapse: collapse; font-size: small; }}
+td, th {{ border: 1px solid #ccc; padding: 2px 6px; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<div id="plots"></div>
+<h2>Data</h2>
+<p>Every dataset is written next to this report; the first {preview_rows} rows of each can be previewed here.</p>
+<table>
+<tr><th>Dataset</th><th>File</th><th>Rows</th><th></th></tr>
+{datasets}
+</table>
+<div id="preview"></div>
+<script id="figures" type="application/json">{figures}</script>
+<script id="previews" type="application/json">{previews}</script>
+<script>
+var figures = JSON.parse(document.getElementById('figures').textContent);
+var container = document.getElementById('plots');
+// plots are drawn as they scroll into view so large cohorts open without drawing every plot at once
+var observer = new IntersectionObserver(function(entries) {{
+    entries.forEach(function(entry) {{
+        if (!entry.isIntersecting) return;
+        observer.unobserve(entry.target);
+        var fig = figures[entry.target.id];
+        if (typeof Plotly === 'undefined') {{
+            entry.target.textContent = 'Plots need plotly.js, which could not be loaded.';
+        }} else {{
+            Plotly.newPlot(entry.target, fig.data, fig.layout, {{responsive: true}});
+        }}
+    }});
+}});
+Object.keys(figures).forEach(function(key) {{
+    var div = document.createElement('div');
+    div.id = key;
+    div.className = 'plot';
+    container.appendChild(div);
+    observer.observe(div);
+}});
+var previews = JSON.parse(document.getElementById('previews').textContent);
+function preview(key) {{
+    var table = document.createElement('table');
+    [previews[key].columns].concat(previews[key].rows).forEach(function(row, i) {{
+        var tr = table.insertRow();
+        row.forEach(function(value) {{
+            var cell = document.createElement(i == 0 ? 'th' : 'td');
+            cell.textContent = value === null ? '' : value;
+            tr.appendChild(cell);
+        }});
+    }});
+    var div = document.getElementById('preview');
+    div.innerHTML = '';
+    var heading = document.createElement('h3');
+    heading.textContent = key;
+    div.appendChild(heading);
+    div.appendChild(table);
+}}
+</script>
+</body>
+</html>
+"""
+
+def dataset_rows(manifest, previews):
+    rows = list()
+    for key, entry in manifest['datasets'].items():
+        file_name = html.escape(entry['file'])
+        action = "<a href=\"#preview\" onclick=\"preview('{0}')\">preview</a>".format(html.escape(key)) if key in previews else ''
+        rows.append('<tr><td>{0}</td><td><a href="{1}">{1}</a></td><td>{2}</td><td>{3}</td></tr>'.format(
+            html.escape(key) + (' (bulk)' if key in BULK_DATASETS else ''), file_name, entry['rows'], action))
+    return '\n'.join(rows)
+
+def plotly_bundle():
+    # the minified plotly.js shipped inside the plotly python package
+    try:
+        import plotly
+    except ImportError:
+        return None
+    path = os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as fin:
+        return fin.read()
+
+def plotly_script():
+    bundle = plotly_bundle()
+    if bundle is None:
+        warnings.warn('The plotly package is not installed, so report.html loads plotly.js from ' + PLOTLY_JS + ' and needs a network connection')
+        return '<script src="{0}"></script>'.format(PLOTLY_JS)
+    return '<script type="text/javascript">' + bundle.replace('</script', '<\\/script') + '</script>'
+
+def to_json(obj):
+    return json.dumps(obj, separators=(',', ':')).replace('</', '<\\/')
+
+def write_html_report(output_path, data, manifest=None, title='CUT&RUN Report'):
+    """
+    Write a single-file interactive report embedding only compact summaries of the report data and
+    the first rows of each table, with the full tables left as side-car files listed in the manifest.
+    plotly.js is inlined so the report opens offline.
+    """
+    if manifest is None:
+        with open(os.path.join(output_path, MANIFEST_NAME), 'r') as fin:
+            manifest = json.load(fin)
+    previews = preview_tables(data)
+    page = HTML_TEMPLATE.format(title=html.escape(title), plotly=plotly_script(), datasets=dataset_rows(manifest, previews),
+        figures=to_json(report_figures(data)), previews=to_json(previews), preview_rows=PREVIEW_ROWS)
+    path = os.path.join(output_path, HTML_NAME)
+    with open(path, 'w') as fout:
+        fout.write(page)
+    return path
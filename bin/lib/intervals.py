@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+#*
+#========================================================================================
+# INTERVAL INDEX
+#========================================================================================
+#*/
+
+class IntervalIndex:
+    """
+    Sorted, merged intervals per chromosome held as numpy arrays. Because merged intervals do not
+    overlap, their ends are sorted as well as their starts, so any batch of query intervals can be
+    tested against the index with a single binary search per chromosome.
+    """
+
+    def __init__(self, chroms, starts, ends):
+        self.index = dict()
+        df = pd.DataFrame({'chrom': np.asarray(chroms).astype(str), 'start': np.asarray(starts, dtype=np.int64), 'end': np.asarray(ends, dtype=np.int64)})
+        for chrom, df_chrom in df.groupby('chrom', sort=False):
+            self.index[chrom] = self.merge(df_chrom['start'].values, df_chrom['end'].values)
+
+    @classmethod
+    def from_bed(cls, path):
+        bed = pd.read_csv(path, sep='\t', header=None, usecols=[0,1,2], names=['chrom','start','end'], dtype={'chrom': str}, comment='#')
+        return cls(bed['chrom'].values, bed['start'].values, bed['end'].values)
+
+    @staticmethod
+    def merge(starts, ends):
+        order = np.argsort(starts, kind='stable')
+        starts = starts[order]
+        ends = np.maximum.accumulate(ends[order])
+
+        # a new interval begins wherever a start lies beyond every end seen so far
+        new_interval = np.ones(len(starts), dtype=np.bool_)
+        new_interval[1:] = starts[1:] > ends[:-1]
+        first = np.flatnonzero(new_interval)
+        last = np.append(first[1:] - 1, len(starts) - 1)
+        return starts[first], ends[last]
+
+    def __len__(self):
+        return sum([len(x[0]) for x in self.index.values()])
+
+    def overlaps(self, chroms, starts, ends):
+        """
+        Return a boolean mask flagging the half-open query intervals that overlap any indexed interval.
+        """
+        chroms = np.asarray(chroms).astype(str)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        mask = np.zeros(len(chroms), dtype=np.bool_)
+
+        # group the queries by chromosome once rather than scanning the array for each chromosome
+        codes, uniques = pd.factorize(chroms)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.append(0, np.cumsum(np.bincount(codes, minlength=len(uniques))))
+
+        for c, chrom in enumerate(uniques):
+            if chrom not in self.index:
+                continue
+            idx_starts, idx_ends = self.index[chrom]
+            sel = order[bounds[c]:bounds[c + 1]]
+            # first indexed interval ending after each query start
+            i = np.searchsorted(idx_ends, starts[sel], side='right')
+            hit = i < len(idx_starts)
+            hit[hit] = idx_starts[i[hit]] < ends[sel][hit]
+            mask[sel] = hit
+        return mask
+
+    def filter_frame(self, df, chrom_col, start_col, end_col):
+        """
+        Return the rows of df that do not overlap the index.
+        """
+        if df.shape[0] == 0:
+            return df
+        mask = self.overlaps(df[chrom_col].values, df[start_col].values, df[end_col].values)
+        return df[~mask]
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import gzip
+import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from lib.coverage import load_coverage
+
+MATRIX_SUFFIX = '.computeMatrix.mat.gz'
+REGION_COLS = ['chrom', 'start', 'end', 'name', 'score', 'strand']
+
+#*
+#========================================================================================
+# REGIONS
+#========================================================================================
+#*/
+
+def read_regions(path):
+    """
+    Read the first six columns of a BED file, filling in a name, score and strand where missing.
+    """
+    bed = pd.read_csv(path, sep='\t', header=None, comment='#', dtype={0: str})
+    bed = bed[~bed[0].str.startswith(('track', 'browser'))]
+    regions = pd.DataFrame({'chrom': bed[0].values, 'start': bed[1].values.astype(np.int64), 'end': bed[2].values.astype(np.int64)})
+    regions['name'] = bed[3].astype(str).values if bed.shape[1] > 3 else regions['chrom'] + ':' + regions['start'].astype(str) + '-' + regions['end'].astype(str)
+    regions['score'] = bed[4].astype(str).values if bed.shape[1] > 4 else '.'
+    regions['strand'] = bed[5].astype(str).values if bed.shape[1] > 5 else '.'
+    return regions
+
+def bin_edges(regions, mode, upstream, downstream, body, bin_size, ref_point='TSS'):
+    """
+    Return a region x (bins + 1) array of bin edges in genome coordinates, running 5' to 3' so
+    minus strand regions have decreasing edges and need no reversal afterwards.
+    """
+    starts = regions['start'].values
+    ends = regions['end'].values
+    direction = np.where(regions['strand'].values == '-', -1, 1)
+    five = np.where(direction < 0, ends, starts)
+    three = np.where(direction < 0, starts, ends)
+
+    if mode == 'reference-point':
+        if ref_point == 'center':
+            five = three = starts + (ends - starts) // 2
+        elif ref_point == 'TES':
+            five = three
+        else:
+            three = five
+        body_steps = np.zeros((len(regions), 0), dtype=np.int64)
+    else:
+        # each region body is scaled to the same number of bins
+        frac = np.arange(1, body // bin_size + 1) / (body // bin_size)
+        body_steps = np.round((ends - starts)[:, None] * frac[None, :]).astype(np.int64)
+
+    up_steps = bin_size * np.arange(-(upstream // bin_size), 1)
+    down_steps = bin_size * np.arange(1, downstream // bin_size + 1)
+    return np.hstack([
+        five[:, None] + direction[:, None] * up_steps[None, :],
+        five[:, None] + direction[:, None] * body_steps,
+        three[:, None] + direction[:, None] * down_steps[None, :]
+    ])
+
+#*
+#========================================================================================
+# MATRIX
+#========================================================================================
+#*/
+
+def binned_means(values, lo, hi):
+    """
+    Mean of the non-zero values of one chromosome's coverage array in each bin [lo, hi). Like a
+    bigWig written from a bedGraph, zero coverage counts as missing data, so a bin without coverage
+    is nan. Bins reaching beyond the chromosome ends are nan. Only the bases inside some bin are
+    read, so the cost follows the regions rather than the chromosome length.
+    """
+    size = values.shape[0]
+    outside = (lo < 0) | (hi > size) | (hi <= lo)
+    lo = np.clip(lo, 0, size)
+    hi = np.clip(hi, 0, size)
+    if (~outside).sum() == 0:
+        return np.full(lo.shape, np.nan)
+
+    # merge the bins into the disjoint spans they cover
+    order = np.argsort(lo[~outside], kind='stable')
+    bin_lo, bin_hi = lo[~outside][order], hi[~outside][order]
+    run_hi = np.maximum.accumulate(bin_hi)
+    new_span = np.append(True, bin_lo[1:] > run_hi[:-1])
+    span_starts = bin_lo[new_span]
+    span_ends = np.append(run_hi[np.flatnonzero(new_span)[1:] - 1], run_hi[-1])
+
+    # cumulative sums over the spans laid end to end, in the manner of fill_intervals
+    lens = span_ends - span_starts
+    span_offsets = np.cumsum(lens) - lens
+    span_values = values[np.repeat(span_starts - span_offsets, lens) + np.arange(lens.sum())]
+    cum_sums = np.append(0, np.cumsum(span_values, dtype=np.float64))
+    cum_covered = np.append(0, np.cumsum(span_values != 0, dtype=np.int64))
+
+    def span_position(x):
+        k = np.clip(np.searchsorted(span_starts, x, side='right') - 1, 0, len(span_starts) - 1)
+        return np.clip(span_offsets[k] + x - span_starts[k], 0, lens.sum())
+
+    i_lo, i_hi = span_position(lo), span_position(hi)
+    sums = cum_sums[i_hi] - cum_sums[i_lo]
+    covered = cum_covered[i_hi] - cum_covered[i_lo]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / covered
+    means[(covered == 0) | outside] = np.nan
+    return means
+
+def compute_matrix(coverage, regions, mode, upstream, downstream, body=0, bin_size=10, ref_point='TSS', skip_zeros=False):
+    """
+    Compute the region x bin matrix of mean coverage over each region in the layout of deeptools
+    computeMatrix, from a dict of per-chromosome coverage arrays that may be memory-mapped.
+    Regions on chromosomes without coverage are dropped, as are regions with only zero or
+    missing values if skip_zeros is set. Returns the kept regions and their matrix.
+    """
+    regions = regions[regions['chrom'].isin(list(coverage.keys()))].reset_index(drop=True)
+    edges = bin_edges(regions, mode, upstream, downstream, body, bin_size, ref_point)
+    lo = np.minimum(edges[:, :-1], edges[:, 1:])
+    hi = np.maximum(edges[:, :-1], edges[:, 1:])
+
+    matrix = np.full(lo.shape, np.nan)
+    for chrom, idx in regions.groupby('chrom', sort=False).indices.items():
+        matrix[idx] = binned_means(coverage[chrom], lo[idx], hi[idx])
+
+    if skip_zeros:
+        keep = np.nan_to_num(matrix).any(axis=1)
+        regions, matrix = regions[keep].reset_index(drop=True), matrix[keep]
+    return regions, matrix
+
+def summary_profile(matrix, upstream, bin_size):
+    """
+    Mean and standard error of the signal in each bin across regions, positioned by the bin
+    start relative to the reference point or region start.
+    """
+    with np.errstate(invalid='ignore'):
+        mean = np.nanmean(matrix, axis=0) if matrix.shape[0] else np.full(matrix.shape[1], np.nan)
+        n = (~np.isnan(matrix)).sum(axis=0)
+        sem = np.nanstd(matrix, axis=0) / np.sqrt(n) if matrix.shape[0] else mean
+    return pd.DataFrame({'position': np.arange(matrix.shape[1]) * bin_size - upstream, 'mean': mean, 'sem': sem})
+
+#*
+#========================================================================================
+# DEEPTOOLS MATRIX FILES
+#========================================================================================
+#*/
+
+def matrix_header(mode, upstream, downstream, body, bin_size, ref_point, skip_zeros, n_regions, n_bins, sample_label, group_label, threads=1):
+    return {
+        'upstream': [upstream], 'downstream': [downstream], 'body': [body], 'bin size': [bin_size],
+        'ref point': [ref_point if mode == 'reference-point' else None],
+        'verbose': False, 'bin avg type': 'mean', 'missing data as zero': False,
+        'min threshold': None, 'max threshold': None, 'scale': 1, 'skip zeros': skip_zeros,
+        'nan after end': False, 'proc number': threads, 'sort regions': 'keep', 'sort using': 'mean',
+        'unscaled 5 prime': [0], 'unscaled 3 prime': [0],
+        'group_labels': [group_label], 'group_boundaries': [0, n_regions],
+        'sample_labels': [sample_label], 'sample_boundaries': [0, n_bins]
+    }
+
+def write_matrix(path, regions, matrix, header):
+    """
+    Write a matrix as a deeptools computeMatrix .mat.gz, readable by plotHeatmap and plotProfile.
+    """
+    values = pd.DataFrame(matrix)
+    with gzip.open(path, 'wt') as fout:
+        fout.write('@' + json.dumps(header, separators=(',', ':')) + '\n')
+        pd.concat([regions[REGION_COLS].reset_index(drop=True), values], axis=1).to_csv(fout, sep='\t', header=False, index=False, na_rep='nan', float_format='%g')
+    return path
+
+def read_matrix(path):
+    """
+    Read a deeptools .mat.gz into its header, regions and matrix.
+    """
+    with gzip.open(path, 'rt') as fin:
+        header = json.loads(fin.readline()[1:])
+        df = pd.read_csv(fin, sep='\t', header=None, dtype={0: str, 3: str, 4: str, 5: str})
+    regions = df.iloc[:, :6].copy()
+    regions.columns = REGION_COLS
+    return header, regions, df.iloc[:, 6:].values.astype(np.float64)
+
+def profile_from_matrix(path):
+    """
+    Summary profile of a deeptools .mat.gz for the reports, labelled with its sample.
+    """
+    header, _, matrix = read_matrix(path)
+    profile = summary_profile(matrix, header['upstream'][0], header['bin size'][0])
+    profile['sample'] = header['sample_labels'][0]
+    return profile
+
+#*
+#========================================================================================
+# SAMPLES
+#========================================================================================
+#*/
+
+def sample_matrix(coverage_path, regions, chrom_sizes, output, mode, upstream, downstream, body, bin_size, ref_point, skip_zeros, group_label):
+    coverage = load_coverage(coverage_path, chrom_sizes)
+    kept, matrix = compute_matrix(coverage, regions, mode, upstream, downstream, body, bin_size, ref_point, skip_zeros)
+    sample_label = os.path.basename(coverage_path).split('.')[0]
+    header = matrix_header(mode, upstream, downstream, body, bin_size, ref_point, skip_zeros, kept.shape[0], matrix.shape[1], sample_label, group_label)
+    write_matrix(output, kept, matrix, header)
+    return output, kept.shape[0]
+
+def sample_matrices(coverage_paths, regions_path, chrom_sizes, outputs, mode, upstream, downstream, body=0, bin_size=10, ref_point='TSS', skip_zeros=False, threads=1):
+    """
+    Write a matrix per sample over the same regions, computing samples in parallel across threads
+    worker processes. Returns the output paths with the number of regions kept in each.
+    """
+    regions = read_regions(regions_path)
+    group_label = os.path.basename(regions_path)
+    args = [regions, chrom_sizes]
+    rest = [mode, upstream, downstream, body, bin_size, ref_point, skip_zeros, group_label]
+    if threads > 1 and len(coverage_paths) > 1:
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            return list(executor.map(sample_matrix, coverage_paths, *[repeat(x) for x in args], outputs, *[repeat(x) for x in rest]))
+    return [sample_matrix(x, *args, y, *rest) for x, y in zip(coverage_paths, outputs)]
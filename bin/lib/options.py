@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Command-line option types and defaults shared by the reporting subcommands. This module is
+# imported before any subcommand runs, so it must only use the standard library.
+
+# Report inputs that can be filtered against the blacklist
+BLACKLIST_TARGETS = ['frags', 'bins', 'peaks']
+
+# Formats of the exported report tables, 'auto' writes parquet where pyarrow is installed and csv otherwise
+DATA_FORMATS = ['auto', 'csv', 'parquet', 'feather']
+
+def parse_preview(value):
+    """
+    Parse a preview size given either as a fraction of fragments in (0, 1] or as a whole number of fragments.
+    """
+    preview = float(value)
+    if preview <= 0:
+        raise ValueError('Preview size must be positive: ' + str(value))
+    if preview > 1 and not preview.is_integer():
+        raise ValueError('Preview sizes above 1 are numbers of fragments and must be whole: ' + str(value))
+    return int(preview) if preview > 1 else preview
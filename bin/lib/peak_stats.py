@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+from lib.intervals import IntervalIndex
+
+# Quantiles reported for each per-peak measure
+PEAK_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+PEAK_MEASURES = ['peak_width', 'total_signal', 'max_signal', 'summit_offset']
+
+#*
+#========================================================================================
+# PEAK STATS
+#========================================================================================
+#*/
+
+class PeakStats:
+    """
+    The peaks of every sample sorted by sample, chromosome and start once and partitioned by sample,
+    so a sample's peaks are a slice rather than a mask over all peaks and every statistic is one
+    grouped pass. Samples are the product of groups and replicates in order of first appearance, as
+    in the report tables, and samples without peaks have empty partitions.
+    """
+
+    def __init__(self, peaks):
+        group_codes, self.groups = pd.factorize(peaks['group'].values)
+        rep_codes, self.replicates = pd.factorize(peaks['replicate'].values)
+        sample = group_codes * len(self.replicates) + rep_codes
+        chrom_codes = pd.factorize(peaks['chrom'].values)[0]
+        order = np.lexsort((peaks['start'].values, chrom_codes, sample))
+
+        self.peaks = peaks.iloc[order].reset_index(drop=True)
+        self.peaks['peak_width'] = (self.peaks['end'] - self.peaks['start']).abs()
+        if 'summit' in self.peaks.columns:
+            # summit position relative to the peak centre
+            self.peaks['summit_offset'] = self.peaks['summit'] - (self.peaks['start'] + self.peaks['end']) // 2
+        self.sample = sample[order]
+        self.samples = pd.DataFrame({'group': np.repeat(self.groups, len(self.replicates)), 'replicate': np.tile(self.replicates, len(self.groups))})
+        self.bounds = np.append(0, np.cumsum(np.bincount(self.sample, minlength=self.samples.shape[0])))
+        self.indexes = dict()
+
+    def sample_index(self, group, replicate):
+        groups, replicates = list(self.groups), list(self.replicates)
+        if group not in groups or replicate not in replicates:
+            return None
+        return groups.index(group) * len(replicates) + replicates.index(replicate)
+
+    def partition(self, i):
+        return self.peaks.iloc[self.bounds[i]:self.bounds[i + 1]]
+
+    def sample_peaks(self, group, replicate):
+        i = self.sample_index(group, replicate)
+        return self.peaks.iloc[0:0] if i is None else self.partition(i)
+
+    def interval_index(self, i):
+        if i not in self.indexes:
+            peaks = self.partition(i)
+            self.indexes[i] = IntervalIndex(peaks['chrom'].values, peaks['start'].values, peaks['end'].values)
+        return self.indexes[i]
+
+    def peak_counts(self):
+        return self.samples.assign(all_peaks=np.diff(self.bounds))
+
+    def quantiles(self, measures=PEAK_MEASURES, q=PEAK_QUANTILES):
+        """
+        Quantiles of each per-peak measure for every sample from one grouped pass, one column per
+        measure and quantile, e.g. peak_width_q50.
+        """
+        measures = [x for x in measures if x in self.peaks.columns]
+        df = self.peaks[measures].groupby(self.sample).quantile(q).unstack()
+        df.columns = [m + '_q' + str(int(round(x * 100))) for m, x in df.columns]
+        return pd.concat([self.samples, df.reindex(range(self.samples.shape[0]))], axis=1)
+
+    def chrom_distribution(self):
+        """
+        Number and percentage of each sample's peaks on every chromosome.
+        """
+        counts = self.peaks.groupby([self.sample, self.peaks['chrom'].values], sort=False).size()
+        samples = counts.index.get_level_values(0).values
+        df = self.samples.iloc[samples].reset_index(drop=True)
+        df['chrom'] = counts.index.get_level_values(1).values
+        df['peaks'] = counts.values
+        df['percentage'] = counts.values / np.diff(self.bounds)[samples] * 100
+        return df
+
+    def reproducibility(self):
+        """
+        Peaks of each sample overlapping a peak in every other replicate of its group. Each sample's
+        peaks are indexed once and tested in one batch against the index of each other replicate.
+        Replicates without peaks in a group, e.g. a third replicate only other groups have, are skipped.
+        """
+        reproduced = np.zeros(self.samples.shape[0], dtype=np.int64)
+        n_reps = len(self.replicates)
+        for g in range(len(self.groups)):
+            for r in range(n_reps):
+                i = g * n_reps + r
+                peaks = self.partition(i)
+                mask = np.ones(peaks.shape[0], dtype=np.bool_)
+                for j in range(g * n_reps, (g + 1) * n_reps):
+                    if j == i or self.bounds[j] == self.bounds[j + 1] or not mask.any():
+                        continue
+                    mask &= self.interval_index(j).overlaps(peaks['chrom'].values, peaks['start'].values, peaks['end'].values)
+                reproduced[i] = mask.sum()
+        df = self.peak_counts()
+        df['no_peaks_reproduced'] = reproduced
+        df['peak_reproduced_rate'] = df['no_peaks_reproduced'] / df['all_peaks'] * 100
+        return df
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from lib.fragments import bam_to_fragments
+from lib.fragment_file import FragmentFile, FRAGMENT_SUFFIX
+from lib.intervals import IntervalIndex
+
+REGION_COLS = ['chrom', 'start', 'end', 'name']
+
+#*
+#========================================================================================
+# REGION SETS
+#========================================================================================
+#*/
+
+class RegionSet:
+    """
+    A named set of half-open regions, sorted once by chromosome and start on construction. Unlike
+    an IntervalIndex the regions are kept as given, so overlapping regions are each counted.
+    """
+
+    def __init__(self, name, chroms, starts, ends, names=None):
+        self.name = name
+        df = pd.DataFrame({'chrom': np.asarray(chroms).astype(str), 'start': np.asarray(starts, dtype=np.int64), 'end': np.asarray(ends, dtype=np.int64)})
+        if names is None:
+            names = df['chrom'] + ':' + df['start'].astype(str) + '-' + df['end'].astype(str)
+        df['name'] = np.asarray(names).astype(str)
+        self.regions = df.sort_values(['chrom', 'start', 'end'], kind='mergesort').reset_index(drop=True)
+
+        # row ranges of each chromosome in the sorted regions
+        chrom_codes, chrom_names = pd.factorize(self.regions['chrom'])
+        bounds = np.append(0, np.cumsum(np.bincount(chrom_codes, minlength=len(chrom_names))))
+        self.chrom_bounds = dict([(x, (bounds[i], bounds[i + 1])) for i, x in enumerate(chrom_names)])
+        self.index = IntervalIndex(self.regions['chrom'].values, self.regions['start'].values, self.regions['end'].values)
+
+    @classmethod
+    def from_bed(cls, path, name=None):
+        bed = pd.read_csv(path, sep='\t', header=None, comment='#', dtype={0: str})
+        if name is None:
+            name = os.path.basename(path).split('.')[0]
+        names = bed[3].values if bed.shape[1] > 3 else None
+        return cls(name, bed[0].values, bed[1].values, bed[2].values, names)
+
+    def __len__(self):
+        return self.regions.shape[0]
+
+#*
+#========================================================================================
+# SAMPLE FRAGMENTS
+#========================================================================================
+#*/
+
+class SampleFragments:
+    """
+    The fragments of one sample held per chromosome as sorted starts and sorted ends with cumulative
+    fragment counts, so the fragments overlapping any batch of regions can be counted with two binary
+    searches per region: those starting before the region end less those ending before its start.
+    """
+
+    def __init__(self, name, chroms, starts, ends, counts=None):
+        self.name = name
+        chroms = np.asarray(chroms).astype(str)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        counts = np.ones(len(starts), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        self.chroms, self.starts, self.ends, self.counts = chroms, starts, ends, counts
+        self.total = int(counts.sum())
+
+        self.index = dict()
+        codes, uniques = pd.factorize(chroms)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.append(0, np.cumsum(np.bincount(codes, minlength=len(uniques))))
+        for c, chrom in enumerate(uniques):
+            sel = order[bounds[c]:bounds[c + 1]]
+            start_order = np.argsort(starts[sel], kind='stable')
+            end_order = np.argsort(ends[sel], kind='stable')
+            self.index[chrom] = (
+                starts[sel][start_order], np.append(0, np.cumsum(counts[sel][start_order])),
+                ends[sel][end_order], np.append(0, np.cumsum(counts[sel][end_order]))
+            )
+
+    @classmethod
+    def from_path(cls, path, threads=1, keep_duplicates=False):
+        """
+        Load a sample from a fragments file or a paired-end BAM file. Duplicates are left out of both
+        unless keep_duplicates is set: reads flagged as duplicates in a BAM file are skipped, and each
+        distinct fragment of a fragments file is counted once.
+        """
+        name = os.path.basename(path).split('.')[0]
+        if path.endswith(FRAGMENT_SUFFIX):
+            frags = FragmentFile(path).read()
+            counts = frags['count'] if keep_duplicates else np.minimum(frags['count'], 1)
+            return cls(name, frags['chrom'], frags['start'], frags['end'], counts)
+        chroms, starts, ends = bam_to_fragments(path, threads, skip_duplicates=not keep_duplicates)
+        return cls(name, chroms, starts, ends + 1)
+
+    def count(self, region_set):
+        """
+        Return the number of fragments overlapping each region of a RegionSet, in its sorted order.
+        """
+        counts = np.zeros(len(region_set), dtype=np.int64)
+        for chrom, (lo, hi) in region_set.chrom_bounds.items():
+            if chrom not in self.index:
+                continue
+            starts, start_cum, ends, end_cum = self.index[chrom]
+            region_starts = region_set.regions['start'].values[lo:hi]
+            region_ends = region_set.regions['end'].values[lo:hi]
+            counts[lo:hi] = start_cum[np.searchsorted(starts, region_ends, side='left')] - end_cum[np.searchsorted(ends, region_starts, side='right')]
+        return counts
+
+    def fraction_in(self, region_set):
+        """
+        Return the fraction of fragments overlapping any region of a RegionSet.
+        """
+        if self.total == 0:
+            return np.nan
+        mask = region_set.index.overlaps(self.chroms, self.starts, self.ends)
+        return self.counts[mask].sum() / self.total
+
+#*
+#========================================================================================
+# COUNTING
+#========================================================================================
+#*/
+
+def count_sample(sample, region_sets):
+    """
+    Count one sample over every region set in a single pass over its fragments.
+    """
+    return [sample.count(x) for x in region_sets], [sample.fraction_in(x) for x in region_sets]
+
+def count_sample_path(path, region_sets, keep_duplicates=False):
+    sample = SampleFragments.from_path(path, keep_duplicates=keep_duplicates)
+    return (sample.name,) + count_sample(sample, region_sets)
+
+def count_regions(region_sets, sample_paths, threads=1, keep_duplicates=False):
+    """
+    Count the fragments of many samples over many region sets. Samples are loaded and counted in
+    parallel across threads worker processes, leaving out duplicates unless keep_duplicates is set.
+    Returns a dict of region x sample count frames keyed by region set name, and a region set x sample
+    frame of the fraction of fragments in each set.
+    """
+    if threads > 1 and len(sample_paths) > 1:
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(count_sample_path, sample_paths, repeat(region_sets), repeat(keep_duplicates)))
+    else:
+        results = [count_sample_path(x, region_sets, keep_duplicates) for x in sample_paths]
+
+    sample_names = [x[0] for x in results]
+    matrices = dict()
+    for i, region_set in enumerate(region_sets):
+        counts = pd.DataFrame(np.column_stack([x[1][i] for x in results]) if results else np.zeros((len(region_set), 0), dtype=np.int64), columns=sample_names)
+        matrices[region_set.name] = pd.concat([region_set.regions[REGION_COLS], counts], axis=1)
+    fractions = pd.DataFrame([x[2] for x in results], index=sample_names, columns=[x.name for x in region_sets]).T
+    fractions.index.name = 'region_set'
+    return matrices, fractions
@@ -3,36 +3,53 @@
 
 import os
 import glob
-import re
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-from matplotlib.ticker import FuncFormatter
-import seaborn as sns
-import pyranges as pr
-import pysam
 import time
 
+from lib.export import export_data
+from lib.html_report import write_html_report
+from lib.fragments import pe_bam_to_df, sample_bam_to_df, frag_len_counts, preview_fraction, sample_counts
+from lib.intervals import IntervalIndex
+from lib.stats import sample_id_from_path, split_sample_id, read_frag_len, read_bin_frag, read_seacr_bed, count_frags_in_peaks, read_shard, peaks_from_shard, wilson_interval
+from lib.stats import compute_sample_stats, partitioned_sample_stats
+from lib.stats import blacklist_frags, blacklist_bins, blacklist_peaks
+from lib.options import BLACKLIST_TARGETS
+from lib.saturation import saturation_curve, frame_multiplicity_hist
+from lib.annotation import GeneIndex, ANNOTATION_CLASSES
+from lib.peak_stats import PeakStats
+from lib.fingerprint import fingerprint_curves, fingerprint_metrics
+from lib.heatmap import HEATMAP_PAGE_SIZE, cluster_order, group_correlation, draw_heatmap, heatmap_pages
+from lib.summary import SUMMARY_SUFFIX, build_summary, write_summary, read_summary, merge_summaries
+
 class Reports:
     data_table = None
     frag_hist = None
     frag_violin = None
     frag_bin500 = None
+    frag_bin500_counts = None
     seacr_beds = None
+    peak_stats = None
     bams = None
+    stats_list = None
+    dup_hists = None
 
-    def __init__(self, logger, meta, raw_frags, bin_frag, seacr_bed, bams):
+    def __init__(self, logger, meta, raw_frags, bin_frag, seacr_bed, bams, stats=None, blacklist=None, blacklist_filter=BLACKLIST_TARGETS, preview=None, fragments=None, backend=None, summaries=None, genes=None):
         self.logger = logger
         self.meta_path = meta
         self.raw_frag_path = raw_frags
         self.bin_frag_path = bin_frag
         self.seacr_bed_path = seacr_bed
         self.bam_path = bams
-
-        sns.set()
-        sns.set_theme()
-        sns.set_context("paper")
+        self.stats_path = stats
+        self.blacklist_path = blacklist
+        self.blacklist_filter = blacklist_filter
+        self.blacklist = None
+        self.preview = preview
+        self.fragments_path = fragments
+        self.backend = backend
+        self.summaries_path = summaries
+        self.genes_path = genes
 
     #*
     #========================================================================================
@@ -56,26 +73,195 @@ class Reports:
 
     def load_data(self):
         # ---------- Data - data_table --------- #
-        self.data_table = pd.read_csv(self.meta_path, sep=',')
+        # a cohort of summaries carries its own meta data
+        if self.summaries_path is not None:
+            self.load_summary_data()
+        else:
+            self.data_table = pd.read_csv(self.meta_path, sep=',')
         self.duplicate_info = False
         if 'dedup_percent_duplication' in self.data_table.columns:
             self.duplicate_info = True
 
+        # Build the blacklist index once and share it across samples
+        if self.blacklist_path is not None:
+            self.blacklist = IntervalIndex.from_bed(self.blacklist_path)
+            self.logger.info('Filtering ' + ', '.join(self.blacklist_filter) + ' against ' + str(len(self.blacklist)) + ' blacklist regions')
+
+        # Per-sample data comes either from the raw files or from pre-computed stats shards
+        if self.summaries_path is not None:
+            self.load_stats_list(self.stats_list)
+        elif self.stats_path is not None:
+            self.load_stats_data()
+        elif self.backend is not None:
+            self.load_partitioned_data()
+        elif self.fragments_path is not None:
+            self.load_fragment_data()
+        else:
+            self.load_raw_data()
+
+        self.calc_peak_stats()
+
+    def is_blacklisted(self, target):
+        return self.blacklist is not None and target in self.blacklist_filter
+
+    def load_raw_data(self):
         # ---------- Data - Raw frag histogram --------- #
         # Create list of deeptools raw fragment files
         dt_frag_list = glob.glob(self.raw_frag_path)
+        hist_list = list()
 
-        for i in list(range(len(dt_frag_list))):
+        for dt_frag_path in dt_frag_list:
             # create dataframe from csv file for each file and save to a list
-            dt_frag_i = pd.read_csv(dt_frag_list[i], sep='\t', header=None, names=['Size','Occurrences'])
-            frag_base_i = os.path.basename(dt_frag_list[i])
-            sample_id = frag_base_i.split(".")[0]
-            sample_id_split = sample_id.split("_")
-            rep_i = sample_id_split[len(sample_id_split)-1]
-            group_i ="_".join(sample_id_split[0:(len(sample_id_split)-1)])
-
-            # create long forms of fragment histograms
-            dt_frag_i_long = np.repeat(dt_frag_i['Size'].values, dt_frag_i['Occurrences'].values)
+            group_i, rep_i = split_sample_id(sample_id_from_path(dt_frag_path))
+            hist_list.append((group_i, rep_i, read_frag_len(dt_frag_path)))
+
+        self.set_frag_hist(hist_list)
+
+        # ---------- Data - Binned frags --------- #
+        # create full join data frame for count data
+        # start by creating list of bin500 files
+        dt_bin_frag_list = glob.glob(self.bin_frag_path)
+        bin_list = list()
+        for dt_bin_frag_path in dt_bin_frag_list:
+            dt_bin_frag_i_read = read_bin_frag(dt_bin_frag_path)
+            sample_name = dt_bin_frag_i_read['sample'].iloc[0].split(".")[0]
+            if self.is_blacklisted('bins'):
+                dt_bin_frag_i_read = blacklist_bins(dt_bin_frag_i_read, self.blacklist)
+            bin_list.append((sample_name, dt_bin_frag_i_read[['chrom','bin','count']]))
+
+        self.set_frag_bin500(bin_list)
+
+        # ---------- Data - Peaks --------- #
+        # create dataframe for seacr peaks
+        seacr_bed_list = glob.glob(self.seacr_bed_path)
+        peak_list = list()
+
+        # combine all seacr bed files into one df including group and replicate info
+        for seacr_bed_path in seacr_bed_list:
+            group_i, rep_i = split_sample_id(sample_id_from_path(seacr_bed_path))
+            seacr_bed_i = read_seacr_bed(seacr_bed_path)
+            if self.is_blacklisted('peaks'):
+                seacr_bed_i = blacklist_peaks(seacr_bed_i, self.blacklist)
+            peak_list.append((group_i, rep_i, seacr_bed_i))
+
+        self.set_seacr_beds(peak_list)
+
+        # ---------- Data - target histone mark bams --------- #
+        bam_list = glob.glob(self.bam_path)
+        self.bam_df_list = list()
+        self.dup_hists = dict()
+        frag_list = list()
+
+        for bam in bam_list:
+            sample_fraction = 1.0
+            if self.preview is not None:
+                bam_now, sample_fraction = sample_bam_to_df(bam, self.preview)
+            else:
+                bam_now = pe_bam_to_df(bam)
+            if self.is_blacklisted('frags'):
+                bam_now = blacklist_frags(bam_now, self.blacklist)
+            self.bam_df_list.append(bam_now)
+            group_now, rep_now = split_sample_id(sample_id_from_path(bam))
+            frag_lens, frag_counts = frag_len_counts(bam_now)
+
+            # ---------- Data - Percentage of fragments in peaks --------- #
+            seacr_bed_i = self.peak_stats.sample_peaks(group_now, rep_now)
+            frags_in_peaks = count_frags_in_peaks(bam_now, seacr_bed_i)
+            frag_list.append((group_now, rep_now, frag_lens, frag_counts, bam_now.shape[0], frags_in_peaks, sample_fraction))
+            self.dup_hists[sample_id_from_path(bam)] = (frame_multiplicity_hist(bam_now), sample_fraction)
+
+        self.set_frag_series_frip(frag_list)
+
+    def load_stats_data(self):
+        # ---------- Data - Stats shards --------- #
+        # each shard holds the pre-computed data for one sample
+        stats_list = [read_shard(x) for x in sorted(glob.glob(self.stats_path))]
+        self.load_stats_list(stats_list)
+
+    def load_fragment_data(self):
+        # ---------- Data - Fragment files --------- #
+        # summarise each sample's fragments file, with its peaks if it has any
+        seacr_beds = dict([(sample_id_from_path(x), x) for x in glob.glob(self.seacr_bed_path)])
+        stats_list = list()
+        for fragments in sorted(glob.glob(self.fragments_path)):
+            sample_id = sample_id_from_path(fragments)
+            stats_list.append(compute_sample_stats(sample_id, seacr_bed=seacr_beds.get(sample_id), blacklist=self.blacklist,
+                blacklist_filter=self.blacklist_filter, preview=self.preview, fragments=fragments))
+        self.load_stats_list(stats_list)
+
+    def load_partitioned_data(self):
+        # ---------- Data - Partitioned samples --------- #
+        # split each sample by chromosome across the backend, from fragments files or the raw files
+        if self.fragments_path is not None:
+            inputs = {'fragments': self.fragments_path, 'seacr_bed': self.seacr_bed_path}
+        else:
+            inputs = {'raw_frag': self.raw_frag_path, 'bin_frag': self.bin_frag_path, 'seacr_bed': self.seacr_bed_path, 'bam': self.bam_path}
+        samples = dict()
+        for key, pattern in inputs.items():
+            for path in glob.glob(pattern):
+                sample_id = sample_id_from_path(path)
+                samples.setdefault(sample_id, {'sample_id': sample_id})[key] = path
+        samples = [samples[x] for x in sorted(samples)]
+
+        start = time.time()
+        stats_list = partitioned_sample_stats(self.backend, samples, self.blacklist, self.blacklist_filter, self.preview)
+        self.logger.info('Computed stats for ' + str(len(samples)) + ' samples in ' + str(round(time.time() - start, 2)) + 's')
+        self.load_stats_list(stats_list)
+
+    def load_summary_data(self):
+        # ---------- Data - Cohort summaries --------- #
+        # merge the summaries of any number of runs without reading their raw data
+        summaries = [read_summary(x) for x in sorted(glob.glob(self.summaries_path))]
+        self.data_table, self.stats_list = merge_summaries(summaries)
+        runs = set([x['run'] for x in summaries])
+        self.logger.info('Aggregating ' + str(len(summaries)) + ' sample summaries from ' + str(len(runs)) + ' runs')
+
+    def load_stats_list(self, stats_list):
+        self.stats_list = stats_list
+        self.bam_df_list = list()
+        self.dup_hists = dict()
+
+        hist_list = list()
+        bin_list = list()
+        peak_list = list()
+        frag_list = list()
+        for stats in stats_list:
+            group_i = stats['group']
+            rep_i = stats['replicate']
+            if 'raw_frag' in stats['inputs']:
+                hist_list.append((group_i, rep_i, pd.DataFrame({'Size': stats['hist_size'], 'Occurrences': stats['hist_count']})))
+            if 'bin_frag' in stats['inputs']:
+                bins_i = pd.DataFrame({'chrom': stats['bin_chrom'], 'bin': stats['bin_pos'], 'count': stats['bin_count']})
+                if self.is_blacklisted('bins') and 'bins' not in stats['blacklisted']:
+                    bins_i = blacklist_bins(bins_i, self.blacklist)
+                bin_list.append((stats['sample_id'], bins_i))
+            if 'seacr_bed' in stats['inputs']:
+                peaks_i = peaks_from_shard(stats)
+                if self.is_blacklisted('peaks') and 'peaks' not in stats['blacklisted']:
+                    peaks_i = blacklist_peaks(peaks_i, self.blacklist)
+                peak_list.append((group_i, rep_i, peaks_i))
+            if self.is_blacklisted('frags') and 'frags' not in stats['blacklisted']:
+                self.logger.warning('Fragments for ' + stats['sample_id'] + ' were not blacklist filtered when its stats were computed')
+            if 'bam' in stats['inputs']:
+                frag_list.append((group_i, rep_i, stats['frag_len'], stats['frag_len_count'], stats['mapped_frags'], stats['frags_in_peaks'], stats.get('sample_fraction', 1.0)))
+            if 'dup_hist' in stats:
+                self.dup_hists[stats['sample_id']] = (stats['dup_hist'], stats.get('sample_fraction', 1.0))
+
+        self.set_frag_hist(hist_list)
+        self.set_frag_bin500(bin_list)
+        self.set_seacr_beds(peak_list)
+        self.set_frag_series_frip(frag_list)
+
+    def set_frag_hist(self, hist_list):
+        # hist_list: [(group, replicate, DataFrame[Size, Occurrences])]
+        for i in list(range(len(hist_list))):
+            group_i, rep_i, dt_frag_i = hist_list[i]
+
+            # create long forms of fragment histograms, thinned to the preview sample if requested
+            occurrences = dt_frag_i['Occurrences'].values
+            if self.preview is not None:
+                occurrences = sample_counts(occurrences, preview_fraction(occurrences.sum(), self.preview), seed=i)
+            dt_frag_i_long = np.repeat(dt_frag_i['Size'].values, occurrences)
             dt_group_i_long = np.repeat(group_i, len(dt_frag_i_long))
             dt_rep_i_long = np.repeat(rep_i, len(dt_frag_i_long))
 
@@ -97,20 +283,17 @@ class Reports:
 
                 group_short = np.append(group_short, dt_group_i_short)
                 rep_short = np.append(rep_short, dt_rep_i_short)
-                self.frag_hist = self.frag_hist.append(dt_frag_i)
+                self.frag_hist = pd.concat([self.frag_hist, dt_frag_i])
 
         self.frag_hist['group'] = group_short
         self.frag_hist['replicate'] = rep_short
         self.frag_violin = pd.DataFrame( { "fragment_size" : frags_arr, "group" : group_arr , "replicate": rep_arr} ) #, index = np.arange(len(frags_arr)))
 
-        # ---------- Data - Binned frags --------- #
-        # create full join data frame for count data
-        # start by creating list of bin500 files
-        dt_bin_frag_list = glob.glob(self.bin_frag_path)
-        for i in list(range(len(dt_bin_frag_list))):
-            dt_bin_frag_i_read = pd.read_csv(dt_bin_frag_list[i], sep='\t', header=None, names=['chrom','bin','count','sample'])
-            sample_name = dt_bin_frag_i_read['sample'].iloc[0].split(".")[0]
-            dt_bin_frag_i = dt_bin_frag_i_read[['chrom','bin','count']]
+    def set_frag_bin500(self, bin_list):
+        # bin_list: [(sample_name, DataFrame[chrom, bin, count])]
+        for i in list(range(len(bin_list))):
+            sample_name, dt_bin_frag_i = bin_list[i]
+            dt_bin_frag_i = dt_bin_frag_i.copy()
             dt_bin_frag_i.columns = ['chrom','bin',sample_name]
 
             if i==0:
@@ -119,23 +302,18 @@ class Reports:
             else:
                 self.frag_bin500 = pd.merge(self.frag_bin500, dt_bin_frag_i, on=['chrom','bin'], how='outer')
 
+        # keep the raw counts for the fingerprint, bins missing from a sample have none
+        self.frag_bin500_counts = self.frag_bin500.fillna({x: 0 for x in self.frag_bin500.columns[2:]})
+
         # add log2 transformed count data column
-        log2_counts = self.frag_bin500[self.frag_bin500.columns[-(len(dt_bin_frag_list)):]].transform(lambda x: np.log2(x))
+        log2_counts = self.frag_bin500[self.frag_bin500.columns[-(len(bin_list)):]].transform(lambda x: np.log2(x))
         chrom_bin_cols = self.frag_bin500[['chrom','bin']]
         self.frag_bin500 = pd.concat([chrom_bin_cols,log2_counts], axis=1)
 
-        # ---------- Data - Peaks --------- #
-        # create dataframe for seacr peaks
-        seacr_bed_list = glob.glob(self.seacr_bed_path)
-
-        # combine all seacr bed files into one df including group and replicate info
-        for i in list(range(len(seacr_bed_list))):
-            seacr_bed_i = pd.read_csv(seacr_bed_list[i], sep='\t', header=None, usecols=[0,1,2,3,4], names=['chrom','start','end','total_signal','max_signal'])
-            bed_base_i = os.path.basename(seacr_bed_list[i])
-            sample_id = bed_base_i.split(".")[0]
-            sample_id_split = sample_id.split("_")
-            rep_i = sample_id_split[len(sample_id_split)-1]
-            group_i ="_".join(sample_id_split[0:(len(sample_id_split)-1)])
+    def set_seacr_beds(self, peak_list):
+        # peak_list: [(group, replicate, DataFrame[chrom, start, end, total_signal, max_signal])]
+        for i in list(range(len(peak_list))):
+            group_i, rep_i, seacr_bed_i = peak_list[i]
             seacr_bed_i['group'] = np.repeat(group_i, seacr_bed_i.shape[0])
             seacr_bed_i['replicate'] = np.repeat(rep_i, seacr_bed_i.shape[0])
 
@@ -143,91 +321,36 @@ class Reports:
                 self.seacr_beds = seacr_bed_i
 
             else:
-                self.seacr_beds = self.seacr_beds.append(seacr_bed_i)
-
-        # ---------- Data - target histone mark bams --------- #
-        bam_list = glob.glob(self.bam_path)
-        self.bam_df_list = list()
-        self.frip = pd.DataFrame(data=None, index=range(len(bam_list)), columns=['group','replicate','mapped_frags','frags_in_peaks','percentage_frags_in_peaks'])
-        k = 0 #counter
-
-        def pe_bam_to_df(bam_path):
-            bamfile = pysam.AlignmentFile(bam_path, "rb")
-            # Iterate through reads.
-            read1 = None
-            read2 = None
-            k=0 #counter
-
-            # get number of reads in bam
-            count = 0
-            for _ in bamfile:
-                count += 1
-
-            bamfile.close()
-            bamfile = pysam.AlignmentFile(bam_path, "rb")
-
-            # initialise arrays
-            frag_no = round(count/2)
-            start_arr = np.zeros(frag_no, dtype=np.int64)
-            end_arr = np.zeros(frag_no, dtype=np.int64)
-            chrom_arr = np.empty(frag_no, dtype="<U20")
-
-            for read in bamfile:
-
-                if not read.is_paired or read.mate_is_unmapped or read.is_duplicate:
-                    continue
-
-                if read.is_read2:
-                    read2 = read
-                    # print("is read2: " + read.query_name)
-
-                else:
-                    read1 = read
-                    read2 = None
-                    # print("is read1: " + read.query_name)
-
-                if read1 is not None and read2 is not None and read1.query_name == read2.query_name:
-
-                    start_pos = min(read1.reference_start, read2.reference_start)
-                    end_pos = max(read1.reference_end, read2.reference_end) - 1
-                    chrom = read.reference_name
-
-                    start_arr[k] = start_pos
-                    end_arr[k] = end_pos
-                    chrom_arr[k] = chrom
-
-                    k +=1
-
-            bamfile.close()
-
-            # remove zeros and empty elements. The indicies for these are always the same from end_arr and chrom_arr
-            remove_idx = np.where(chrom_arr == '')[0]
-            chrom_arr = np.delete(chrom_arr, remove_idx)
-            start_arr = np.delete(start_arr, remove_idx)
-            end_arr = np.delete(end_arr, remove_idx)
-
-            # create dataframe
-            bam_df = pd.DataFrame({ "Chromosome" : chrom_arr, "Start" : start_arr, "End" : end_arr })
-            return(bam_df)
-
-        for bam in bam_list:
-            bam_now = pe_bam_to_df(bam)
-            self.bam_df_list.append(bam_now)
-            bam_base = os.path.basename(bam)
-            sample_id = bam_base.split(".")[0]
-            [group_now,rep_now] = sample_id.split("_")
-            self.frip.at[k, 'group'] = group_now
-            self.frip.at[k, 'replicate'] = rep_now
-            self.frip.at[k, 'mapped_frags'] = bam_now.shape[0]
-            k=k+1
+                self.seacr_beds = pd.concat([self.seacr_beds, seacr_bed_i])
+
+        # sort and partition the peaks by sample once for every per-sample statistic
+        if self.seacr_beds is not None:
+            self.peak_stats = PeakStats(self.seacr_beds)
+
+    def set_frag_series_frip(self, frag_list):
+        # frag_list: [(group, replicate, frag_lens, frag_counts, mapped_frags, frags_in_peaks, sample_fraction)]
+        self.frip = pd.DataFrame(data=None, index=range(len(frag_list)), columns=['group','replicate','mapped_frags','frags_in_peaks','percentage_frags_in_peaks'])
+        sample_fractions = np.array([x[6] for x in frag_list], dtype=np.float64)
+        self.frip_sampled = bool((sample_fractions < 1).any())
+        if self.frip_sampled:
+            sampled_frags = np.array([x[4] for x in frag_list], dtype=np.float64)
+            sampled_in_peaks = np.array([x[5] for x in frag_list], dtype=np.float64)
+            ci_low, ci_high = wilson_interval(sampled_in_peaks, sampled_frags)
 
         # ---------- Data - New frag_hist --------- #
-        for i in list(range(len(self.bam_df_list))):
-            df_i = self.bam_df_list[i]
-            widths_i = (df_i['End'] - df_i['Start']).abs()
-            unique_i, counts_i = np.unique(widths_i, return_counts=True)
-            group_i = np.repeat(self.frip.at[i, 'group'], len(unique_i))
-            rep_i = np.repeat(self.frip.at[i, 'replicate'], len(unique_i))
+        for i in list(range(len(frag_list))):
+            group_now, rep_now, unique_i, counts_i, mapped_frags, frags_in_peaks, sample_fraction = frag_list[i]
+            if self.frip_sampled:
+                # scale the sampled counts up to estimates for the whole library
+                mapped_frags = int(round(mapped_frags / sample_fraction))
+                frags_in_peaks = int(round(frags_in_peaks / sample_fraction))
+            self.frip.at[i, 'group'] = group_now
+            self.frip.at[i, 'replicate'] = rep_now
+            self.frip.at[i, 'mapped_frags'] = mapped_frags
+            self.frip.at[i, 'frags_in_peaks'] = frags_in_peaks
+
+            group_i = np.repeat(group_now, len(unique_i))
+            rep_i = np.repeat(rep_now, len(unique_i))
 
             if i==0:
                 frag_lens = unique_i
@@ -241,86 +364,27 @@ class Reports:
                 rep_arr = np.append(rep_arr, rep_i)
 
         self.frag_series = pd.DataFrame({'group' : group_arr, 'replicate' : rep_arr, 'frag_len' : frag_lens, 'occurences' : frag_counts})
-
+        self.frip['percentage_frags_in_peaks'] = (self.frip['frags_in_peaks'] / self.frip['mapped_frags'])*100
+        if self.frip_sampled:
+            self.frip['sample_fraction'] = sample_fractions
+            self.frip['sampled_frags'] = sampled_frags.astype(np.int64)
+            self.frip['percentage_frags_in_peaks'] = sampled_in_peaks / sampled_frags * 100
+            self.frip['percentage_ci_low'] = ci_low * 100
+            self.frip['percentage_ci_high'] = ci_high * 100
+
+    def calc_peak_stats(self):
         # ---------- Data - Peak stats --------- #
-        # create number of peaks df
-        unique_groups = self.seacr_beds.group.unique()
-        unique_replicates = self.seacr_beds.replicate.unique()
-        self.df_no_peaks = pd.DataFrame(index=range(0,(len(unique_groups)*len(unique_replicates))), columns=['group','replicate','all_peaks'])
-        k=0 # counter
-
-        for i in list(range(len(unique_groups))):
-            for j in list(range(len(unique_replicates))):
-                self.df_no_peaks.at[k,'all_peaks'] = self.seacr_beds[(self.seacr_beds['group']==unique_groups[i]) & (self.seacr_beds['replicate']==unique_replicates[j])].shape[0]
-                self.df_no_peaks.at[k,'group'] = unique_groups[i]
-                self.df_no_peaks.at[k,'replicate'] = unique_replicates[j]
-                k=k+1
+        # counts, quantiles and chromosome distributions of every sample's peaks from the partitions
+        self.df_no_peaks = self.peak_stats.peak_counts()
+        self.peak_summary = self.peak_stats.quantiles()
+        self.peak_chroms = self.peak_stats.chrom_distribution()
 
         # ---------- Data - Reproducibility of peaks between replicates --------- #
-        # empty dataframe to fill in loop
-        self.reprod_peak_stats = self.df_no_peaks
-        self.reprod_peak_stats = self.reprod_peak_stats.reindex(columns=self.reprod_peak_stats.columns.tolist() + ['no_peaks_reproduced','peak_reproduced_rate'])
-
-        # create permutations list
-        def array_permutate(x):
-            arr_len=len(x)
-            loop_list = x
-            out_list = x
-            for i in range(arr_len-1):
-                i_list = np.roll(loop_list, -1)
-                out_list = np.vstack((out_list, i_list))
-                loop_list = i_list
-            return out_list
-
-        # create pyranges objects and fill df
-        unique_groups = self.seacr_beds.group.unique()
-        unique_replicates = self.seacr_beds.replicate.unique()
-        rep_permutations = array_permutate(range(len(unique_replicates)))
-        self.replicate_number = len(unique_replicates)
-
+        self.replicate_number = len(self.peak_stats.replicates)
         if self.replicate_number > 1:
-            idx_count=0
-            for i in list(range(len(unique_groups))):
-                group_i = unique_groups[i]
-                for k in list(range(len(unique_replicates))):
-                    pyr_query = pr.PyRanges()
-                    rep_perm = rep_permutations[k]
-                    for j in rep_perm:
-                        rep_i = unique_replicates[j]
-                        peaks_i = self.seacr_beds[(self.seacr_beds['group']==group_i) & (self.seacr_beds['replicate']==rep_i)]
-                        pyr_subject = pr.PyRanges(chromosomes=peaks_i['chrom'], starts=peaks_i['start'], ends=peaks_i['end'])
-                        if(len(pyr_query) > 0):
-                            pyr_overlap = pyr_query.join(pyr_subject)
-                            pyr_overlap = pyr_overlap.apply(lambda df: df.drop(['Start_b','End_b'], axis=1))
-                            pyr_query = pyr_overlap
-
-                        else:
-                            pyr_query = pyr_subject
-
-                    pyr_starts = pyr_overlap.values()[0]['Start']
-                    unique_pyr_starts = pyr_starts.unique()
-                    self.reprod_peak_stats.at[idx_count, 'no_peaks_reproduced'] = len(unique_pyr_starts)
-                    idx_count = idx_count + 1
-
-            fill_reprod_rate = (self.reprod_peak_stats['no_peaks_reproduced'] / self.reprod_peak_stats['all_peaks'])*100
-            self.reprod_peak_stats['peak_reproduced_rate'] = fill_reprod_rate
-
-        # ---------- Data - Percentage of fragments in peaks --------- #
-        for i in range(len(self.bam_df_list)):
-            bam_i = self.bam_df_list[i]
-            self.frip.at[i,'mapped_frags'] = bam_i.shape[0]
-            group_i = self.frip.at[i,'group']
-            rep_i = self.frip.at[i,'replicate']
-            seacr_bed_i = self.seacr_beds[(self.seacr_beds['group']==group_i) & (self.seacr_beds['replicate']==rep_i)]
-            pyr_seacr = pr.PyRanges(chromosomes=seacr_bed_i['chrom'], starts=seacr_bed_i['start'], ends=seacr_bed_i['end'])
-            pyr_bam = pr.PyRanges(df=bam_i)
-            sample_id = group_i + "_" + rep_i
-            frag_count_pyr = pyr_bam.count_overlaps(pyr_seacr)
-            frag_counts = np.count_nonzero(frag_count_pyr.NumberOverlaps)
-
-            self.frip.at[i,'frags_in_peaks'] = frag_counts
-
-        self.frip['percentage_frags_in_peaks'] = (self.frip['frags_in_peaks'] / self.frip['mapped_frags'])*100
+            self.reprod_peak_stats = self.peak_stats.reproducibility()
+        else:
+            self.reprod_peak_stats = self.df_no_peaks.reindex(columns=self.df_no_peaks.columns.tolist() + ['no_peaks_reproduced','peak_reproduced_rate'])
 
     def annotate_data_table(self):
         # Make new perctenage alignment columns
@@ -334,6 +398,7 @@ class Reports:
     #*/
 
     def generate_plots(self):
+        import seaborn as sns
         # Init
         plots = dict()
         data = dict()
@@ -342,6 +407,11 @@ class Reports:
         self.load_data()
         self.annotate_data_table()
 
+        # Style plots only once the data has loaded
+        sns.set()
+        sns.set_theme()
+        sns.set_context("paper")
+
         # Plot 1
         plot1, data1 = self.alignment_summary()
         plots["alignment_summary"] = plot1
@@ -368,6 +438,22 @@ class Reports:
             plot5, data5 = self.replicate_heatmap()
             plots["replicate_heatmap"] = plot5
             data["replicate_heatmap"] = data5
+            for i, page in enumerate(self.replicate_heatmap_pages()):
+                plots["replicate_heatmap_page" + str(i + 1)] = page
+            data["replicate_correlation"] = self.replicate_corr.rename_axis('sample').reset_index()
+            data["group_correlation"] = self.group_corr.rename_axis('group').reset_index()
+
+        # Plot 5b
+        plot5b, data5b, metrics5b = self.fingerprint()
+        plots["fingerprint"] = plot5b
+        data["fingerprint"] = data5b
+        data["fingerprint_metrics"] = metrics5b
+
+        # Plot 2b
+        plot2b, data2b = self.saturation_summary()
+        if plot2b is not None:
+            plots["saturation_summary"] = plot2b
+            data["saturation_summary"] = data2b
 
         # Plot 6
         plot6, data6 = self.scale_factor_summary()
@@ -378,12 +464,21 @@ class Reports:
         plot7a, data7a = self.no_of_peaks()
         plots["no_of_peaks"] = plot7a
         data["no_of_peaks"] = data7a
+        data["peak_stats"] = self.peak_summary
+        data["peak_chrom_distribution"] = self.peak_chroms
 
         # Plot 7b
         plot7b, data7b = self.peak_widths()
         plots["peak_widths"] = plot7b
         data["peak_widths"] = data7b
 
+        # Plot 7b2
+        if self.genes_path is not None:
+            plot7b2, data7b2, genes7b2 = self.peak_annotation()
+            plots["peak_annotation"] = plot7b2
+            data["peak_annotation"] = data7b2
+            data["peak_genes"] = genes7b2
+
         # Plot 7c
         if self.replicate_number > 1:
             plot7c, data7c = self.reproduced_peaks()
@@ -397,22 +492,43 @@ class Reports:
 
         return (plots, data)
 
-    def gen_plots_to_folder(self, output_path):
+    def gen_plots_to_folder(self, output_path, data_format='csv', html=False):
         # Init
         abs_path = os.path.abspath(output_path)
 
         # Get plots and supporting data tables
         plots, data = self.generate_plots()
 
-        # Save data to output folder
-        for key in data:
-            data[key].to_csv(os.path.join(abs_path, key + '.csv'), index=False)
+        # Save plots to output folder
+        for key in plots:
             plots[key].savefig(os.path.join(abs_path, key + '.png'))
 
+        # Save data to output folder, bulky tables are written in columnar format if requested
+        manifest = export_data(data, abs_path, data_format, self.logger)
+
+        # Save a single-file interactive report embedding only summaries of the data
+        if html:
+            write_html_report(abs_path, data, manifest)
+
         # Save pdf of the plots
         self.gen_pdf(abs_path, plots)
 
+    def gen_summaries(self, output_path, run=''):
+        # Write a versioned summary per sample that aggregate can combine across runs
+        if self.stats_list is None:
+            self.logger.warning('Summaries are only written for reports from stats shards or fragments files')
+            return list()
+        meta = self.data_table.set_index('id', drop=False)
+        paths = list()
+        for stats in self.stats_list:
+            sample_meta = meta.loc[stats['sample_id']].to_dict() if stats['sample_id'] in meta.index else None
+            path = os.path.join(os.path.abspath(output_path), stats['sample_id'] + SUMMARY_SUFFIX)
+            write_summary(path, build_summary(stats, sample_meta, run))
+            paths.append(path)
+        return paths
+
     def gen_pdf(self, output_path, plots):
+        from matplotlib.backends.backend_pdf import PdfPages
         with PdfPages(os.path.join(output_path, 'report.pdf')) as pdf:
             for key in plots:
                 pdf.savefig(plots[key])
@@ -434,6 +550,8 @@ class Reports:
 
     # ---------- Plot 1 - Alignment Summary --------- #
     def alignment_summary(self):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         sns.color_palette("magma", as_cmap=True)
         sns.set(font_scale=0.6)
         # Subset data
@@ -469,6 +587,9 @@ class Reports:
 
     # ---------- Plot 2 - Duplication Summary --------- #
     def duplication_summary(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.ticker import FuncFormatter
+        import seaborn as sns
         # Init
         k_formatter = FuncFormatter(self.format_thousands)
         m_formatter = FuncFormatter(self.format_millions)
@@ -506,17 +627,58 @@ class Reports:
         return fig, df_data
 
 
+    # ---------- Plot 2b - Saturation Summary --------- #
+    def saturation_summary(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.ticker import FuncFormatter
+        import seaborn as sns
+        # curves come from the multiplicities of identical fragments where they include duplicates, which
+        # previews undersample, and otherwise from the duplication metrics
+        curves = list()
+        for _, row in self.data_table.iterrows():
+            hist, sample_fraction = self.dup_hists.get(row['id'], (None, None))
+            if hist is not None and sample_fraction == 1.0 and hist[2:].sum() > 0:
+                curve = saturation_curve(hist)
+                curve['source'] = 'fragments'
+            elif self.duplicate_info and row['dedup_read_pairs_examined'] > 0:
+                total = int(row['dedup_read_pairs_examined'])
+                curve = saturation_curve(total=total, unique=int(round(total * (1 - row['dedup_percent_duplication']))))
+                curve['source'] = 'duplication_metrics'
+            else:
+                continue
+            curve.insert(0, 'id', row['id'])
+            curve.insert(1, 'group', row['group'])
+            curves.append(curve)
+        if len(curves) == 0:
+            return None, None
+        df_data = pd.concat(curves, ignore_index=True)
+
+        fig, ax = plt.subplots()
+        ax = sns.lineplot(data=df_data, x='depth', y='unique_frags', hue='group', units='id', estimator=None, style='extrapolated')
+        ax.xaxis.set_major_formatter(FuncFormatter(self.format_millions))
+        ax.yaxis.set_major_formatter(FuncFormatter(self.format_millions))
+        ax.set(xlabel='Sequenced fragments', ylabel='Unique fragments')
+        fig.suptitle("Library Saturation")
+
+        return fig, df_data
+
     # ---------- Plot 3 - Fragment Distribution Violin --------- #
     def fraglen_summary_violin(self):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         fig, ax = plt.subplots()
         ax = sns.violinplot(data=self.frag_violin, x="group", y="fragment_size", hue="replicate", palette = "viridis")
         ax.set(ylabel="Fragment Size")
         fig.suptitle("Fragment Length Distribution")
+        if self.preview is not None:
+            ax.set_title("Preview of " + str(self.frag_violin.shape[0]) + " sampled fragments", fontsize="small")
 
         return fig, self.frag_violin
 
     # ---------- Plot 4 - Fragment Distribution Histogram --------- #
     def fraglen_summary_histogram(self):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         fig, ax = plt.subplots()
         # ax = sns.lineplot(data=self.frag_hist, x="Size", y="Occurrences", hue="Sample")
         ax = sns.lineplot(data=self.frag_hist, x="Size", y="Occurrences", hue="group", style="replicate", palette = "magma")
@@ -524,27 +686,76 @@ class Reports:
 
         return fig, self.frag_hist
 
-    def alignment_summary_ex(self):
-        df_data = self.data_table.loc[:, ('id', 'group', 'bt2_total_reads_target', 'bt2_total_aligned_target', 'target_alignment_rate', 'spikein_alignment_rate')]
-
-        ax = px.box(df_data, x="group", y="bt2_total_reads_target", palette = "magma")
-
-        return ax, df_data
-
-
     # ---------- Plot 5 - Replicate Reproducibility Heatmap --------- #
     def replicate_heatmap(self):
-        fig, ax = plt.subplots()
+        import matplotlib.pyplot as plt
+        # correlate and cluster the samples once, the pages and exported matrices reuse the order
         plot_data = self.frag_bin500[self.frag_bin500.columns[-(len(self.frag_bin500.columns)-2):]]
         # plot_data = plot_data.fillna(0)
         corr_mat = plot_data.corr(method='pearson')
-        ax = sns.heatmap(corr_mat, annot=True)
+        order = cluster_order(corr_mat.values)
+        self.replicate_corr = corr_mat.iloc[order, order]
+        self.group_corr = group_correlation(self.replicate_corr.values, [split_sample_id(x)[0] for x in self.replicate_corr.index])
+        vmin = np.nanmin(self.replicate_corr.values) if np.isfinite(self.replicate_corr.values).any() else 0
+
+        fig, ax = plt.subplots(1, 2, figsize=(12, 5), gridspec_kw={'width_ratios': [3, 2]})
+        draw_heatmap(ax[0], self.replicate_corr.values, self.replicate_corr.index, self.replicate_corr.columns, vmin=vmin, vmax=1)
+        ax[0].set_title("Samples", fontsize="small")
+        draw_heatmap(ax[1], self.group_corr.values, self.group_corr.index, self.group_corr.columns, vmin=vmin, vmax=1)
+        ax[1].set_title("Mean correlation between groups", fontsize="small")
         fig.suptitle("Replicate Reproducibility")
+        fig.tight_layout()
 
         return fig, self.frag_bin500
 
+    def replicate_heatmap_pages(self):
+        import matplotlib.pyplot as plt
+        # large cohorts get extra pages of clustered rows against every sample
+        pages = list()
+        if self.replicate_corr.shape[0] <= HEATMAP_PAGE_SIZE:
+            return pages
+        vmin = np.nanmin(self.replicate_corr.values)
+        for i, page in enumerate(heatmap_pages(self.replicate_corr)):
+            fig, ax = plt.subplots(figsize=(12, 8))
+            draw_heatmap(ax, page.values, page.index, self.replicate_corr.columns, vmin=vmin, vmax=1)
+            fig.suptitle("Replicate Reproducibility (samples " + str(i * HEATMAP_PAGE_SIZE + 1) + "-" + str(i * HEATMAP_PAGE_SIZE + page.shape[0]) + ")")
+            pages.append(fig)
+        return pages
+
+    # ---------- Plot 5b - Fingerprint --------- #
+    def fingerprint(self):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        samples = list(self.frag_bin500_counts.columns[2:])
+        counts = self.frag_bin500_counts[samples].values
+        bin_frac, signal = fingerprint_curves(counts)
+
+        curves = pd.DataFrame({
+            'sample': np.repeat(samples, len(bin_frac)),
+            'bin_fraction': np.tile(bin_frac, len(samples)),
+            'signal_fraction': signal.ravel()
+        })
+        curves['group'] = [split_sample_id(x)[0] for x in curves['sample']]
+        metrics = fingerprint_metrics(counts)
+        metrics.insert(0, 'sample', samples)
+        metrics.insert(1, 'group', [split_sample_id(x)[0] for x in samples])
+
+        fig, ax = plt.subplots(1, 2, figsize=(12, 5))
+        sns.lineplot(data=curves, x='bin_fraction', y='signal_fraction', hue='group', units='sample', estimator=None, ax=ax[0])
+        ax[0].plot([0, 1], [0, 1], color='grey', linestyle='--', linewidth=0.8)
+        ax[0].set(xlabel='Fraction of bins', ylabel='Fraction of signal')
+        sns.barplot(data=metrics, x='sample', y='synthetic_jsd', hue='group', dodge=False, ax=ax[1])
+        ax[1].set(ylabel='Synthetic JS distance')
+        ax[1].tick_params(axis='x', rotation=90)
+        fig.suptitle("Fingerprint")
+        fig.tight_layout()
+
+        return fig, curves, metrics
+
     # ---------- Plot 6 - Scale Factor Comparison --------- #
     def scale_factor_summary(self):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         fig, scale_summary = plt.subplots(1,2)
         fig.suptitle("Scaling Factor")
 
@@ -567,6 +778,8 @@ class Reports:
 
     # ---------- Plot 7 - Peak Analysis --------- #
     def no_of_peaks(self):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
     # 7a - Number of peaks
         fig, ax = plt.subplots()
         fig.suptitle("Total Peaks")
@@ -576,23 +789,47 @@ class Reports:
 
         return fig, self.df_no_peaks
 
+    # 7b2 - Genomic distribution of peaks
+    def peak_annotation(self):
+        import matplotlib.pyplot as plt
+        # annotate the peaks of every sample in one pass over a gene index built once
+        genes = GeneIndex.from_bed(self.genes_path)
+        peaks = self.peak_stats.peaks[['chrom', 'start', 'end', 'group', 'replicate']]
+        peaks = pd.concat([peaks, genes.annotate(peaks['chrom'].values, peaks['start'].values, peaks['end'].values)], axis=1)
+
+        df_data = peaks.groupby(['group', 'replicate', 'annotation']).size().unstack(fill_value=0)
+        df_data = df_data.reindex(columns=ANNOTATION_CLASSES, fill_value=0)
+        df_data = df_data.div(df_data.sum(axis=1), axis=0).mul(100).reset_index()
+        df_data.columns.name = None
+
+        fig, ax = plt.subplots()
+        fig.suptitle("Peak Genomic Distribution")
+        plot_data = df_data.assign(sample=df_data['group'] + '_' + df_data['replicate'].astype(str)).set_index('sample')[ANNOTATION_CLASSES]
+        plot_data.plot(kind='bar', stacked=True, ax=ax, colormap='viridis')
+        ax.set_ylabel("Percentage of Peaks")
+        ax.legend(title='annotation', fontsize='small')
+        fig.tight_layout()
+
+        return fig, df_data, peaks
+
     # 7b - Width of peaks
     def peak_widths(self):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         fig, ax = plt.subplots()
 
-        ## add peak width column
-        self.seacr_beds['peak_width'] = self.seacr_beds['end'] - self.seacr_beds['start']
-        self.seacr_beds['peak_width'] = self.seacr_beds['peak_width'].abs()
-
-        ax = sns.violinplot(data=self.seacr_beds, x="group", y="peak_width", hue="replicate", palette = "viridis")
+        # peak widths are computed once with the sample partitions
+        ax = sns.violinplot(data=self.peak_stats.peaks, x="group", y="peak_width", hue="replicate", palette = "viridis")
         ax.set_ylabel("Peak Width")
         fig.suptitle("Peak Width Distribution")
 
-        return fig, self.seacr_beds
+        return fig, self.peak_stats.peaks
 
 
     # 7c - Peaks reproduced
     def reproduced_peaks(self):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         fig, ax = plt.subplots()
 
         # plot
@@ -604,10 +841,23 @@ class Reports:
 
     # 7d - Fragments within peaks
     def frags_in_peaks(self):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         fig, ax = plt.subplots()
 
         ax = sns.boxplot(data=self.frip, x='group', y='percentage_frags_in_peaks', palette = "magma")
         ax.set_ylabel("Fragments within Peaks (%)")
         fig.suptitle("Aligned Fragments within Peaks")
 
+        # Show each sampled estimate with its 95% confidence interval
+        if self.frip_sampled:
+            groups = list(self.frip['group'].unique())
+            replicates = sorted(self.frip['replicate'].unique())
+            offsets = np.linspace(-0.2, 0.2, len(replicates)) if len(replicates) > 1 else [0]
+            x_pos = [groups.index(g) + offsets[replicates.index(r)] for g, r in zip(self.frip['group'], self.frip['replicate'])]
+            y_pos = self.frip['percentage_frags_in_peaks'].values.astype(np.float64)
+            y_err = np.clip([y_pos - self.frip['percentage_ci_low'].values, self.frip['percentage_ci_high'].values - y_pos], 0, None)
+            ax.errorbar(x_pos, y_pos, yerr=y_err, fmt='o', color='black', markersize=3, capsize=3)
+            ax.set_title("Preview estimates with 95% confidence intervals", fontsize="small")
+
         return fig, self.frip
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+from lib.fragments import estimate_library_size
+
+# Saturation curves run to this multiple of the sequenced depth in this many steps
+MAX_FOLD = 10
+SATURATION_POINTS = 100
+
+#*
+#========================================================================================
+# MULTIPLICITIES
+#========================================================================================
+#*/
+
+def multiplicity_hist(counts):
+    """
+    Histogram of the number of times each unique fragment was seen, indexed by multiplicity.
+    """
+    return np.bincount(np.asarray(counts, dtype=np.int64))
+
+def merge_multiplicity_hists(hists):
+    size = max([len(x) for x in hists], default=0)
+    return np.sum([np.pad(x, (0, size - len(x))) for x in hists], axis=0) if hists else np.zeros(0, dtype=np.int64)
+
+def frame_multiplicity_hist(bam_df):
+    # identical fragments in a pe_bam_to_df frame are copies of one molecule
+    return multiplicity_hist(bam_df.groupby(['Chromosome', 'Start', 'End'], sort=False).size().values)
+
+#*
+#========================================================================================
+# SATURATION
+#========================================================================================
+#*/
+
+def expected_unique(hist, fractions):
+    """
+    Expected number of unique fragments when sequencing each fraction of the reads, from the
+    multiplicity histogram. A fragment seen k times is missed by a binomial subsample with probability
+    (1 - f)^k, so every fraction is evaluated at once without resampling.
+    """
+    k = np.arange(hist.shape[0])
+    return ((1 - (1 - np.asarray(fractions)[:, None]) ** k[None, :]) * hist[None, :]).sum(axis=1)
+
+def lander_waterman_unique(depth, library_size):
+    return library_size * (1 - np.exp(-np.asarray(depth, dtype=np.float64) / library_size))
+
+def saturation_curve(hist=None, total=None, unique=None, max_fold=MAX_FOLD, n_points=SATURATION_POINTS):
+    """
+    Unique fragments against depth, up to max_fold times the sequenced depth. Up to the sequenced depth
+    the curve is interpolated from the multiplicity histogram if given; beyond it, or throughout if
+    only the total and unique fragments are known (e.g. from Picard metrics), it follows the
+    Lander-Waterman model for the estimated library size. Without any duplicates every new fragment
+    is unique.
+    """
+    if hist is not None:
+        total = int((np.arange(hist.shape[0]) * hist).sum())
+        unique = int(hist[1:].sum())
+    depth = np.linspace(0, max_fold * total, n_points + 1)[1:]
+    extrapolated = depth > total
+
+    library_size = estimate_library_size(total, unique) if 0 < unique < total else None
+    curve = depth.copy() if library_size is None else lander_waterman_unique(depth, library_size)
+    if hist is not None and total > 0:
+        curve[~extrapolated] = expected_unique(hist, depth[~extrapolated] / total)
+    return pd.DataFrame({'depth': depth, 'unique_frags': curve, 'extrapolated': extrapolated})
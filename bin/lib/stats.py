@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import zlib
+import numpy as np
+import pandas as pd
+
+import pysam
+
+from lib.fragments import pe_bam_to_df, sample_bam_to_df, contig_fragments, frag_len_counts, preview_fraction
+from lib.fragment_file import FragmentFile, fragment_length_hist, fragment_bin_counts
+from lib.fragment_file import frags_to_bam_df, frags_length_hist, frags_bin_counts, merge_length_hists, merge_bin_counts
+from lib.options import BLACKLIST_TARGETS
+from lib.saturation import frame_multiplicity_hist, merge_multiplicity_hists
+
+SHARD_SUFFIX = '.stats.npz'
+
+# Fragment count bins are labelled with their midpoint
+BIN_WIDTH = 500
+
+#*
+#========================================================================================
+# UTIL
+#========================================================================================
+#*/
+
+def sample_id_from_path(path):
+    return os.path.basename(path).split(".")[0]
+
+def split_sample_id(sample_id):
+    # sample ids are <group>_<replicate> where the group may itself contain underscores
+    sample_id_split = sample_id.split("_")
+    rep = sample_id_split[len(sample_id_split)-1]
+    group = "_".join(sample_id_split[0:(len(sample_id_split)-1)])
+    return group, rep
+
+#*
+#========================================================================================
+# READERS
+#========================================================================================
+#*/
+
+def read_frag_len(path):
+    return pd.read_csv(path, sep='\t', header=None, names=['Size','Occurrences'])
+
+def read_bin_frag(path):
+    return pd.read_csv(path, sep='\t', header=None, names=['chrom','bin','count','sample'])
+
+def read_seacr_bed(path):
+    seacr_bed = pd.read_csv(path, sep='\t', header=None, usecols=[0,1,2,3,4,5], names=['chrom','start','end','total_signal','max_signal','max_signal_region'])
+    # the summit is the middle of the region of maximum signal, given as chrom:start-end
+    region = seacr_bed.pop('max_signal_region').str.extract(r':(\d+)-(\d+)$').astype(np.int64)
+    seacr_bed['summit'] = (region[0] + region[1]) // 2
+    return seacr_bed
+
+def wilson_interval(successes, trials, z=1.96):
+    """
+    Return the Wilson score interval for a binomial proportion, vectorised over arrays of counts.
+    """
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = successes / trials
+        denominator = 1 + z**2 / trials
+        centre = (p + z**2 / (2 * trials)) / denominator
+        half_width = z * np.sqrt(p * (1 - p) / trials + z**2 / (4 * trials**2)) / denominator
+    # rounding can put a bound just past p at 0 or 1, so keep the interval around p
+    return np.clip(centre - half_width, 0, p), np.clip(centre + half_width, p, 1)
+
+def count_frags_in_peaks(bam_df, seacr_bed):
+    import pyranges as pr
+    pyr_seacr = pr.PyRanges(chromosomes=seacr_bed['chrom'], starts=seacr_bed['start'], ends=seacr_bed['end'])
+    pyr_bam = pr.PyRanges(df=bam_df)
+    frag_count_pyr = pyr_bam.count_overlaps(pyr_seacr)
+    return np.count_nonzero(frag_count_pyr.NumberOverlaps)
+
+#*
+#========================================================================================
+# BLACKLIST
+#========================================================================================
+#*/
+
+def blacklist_frags(bam_df, blacklist):
+    # fragment ends are inclusive in the frame, while the index tests half-open intervals
+    mask = blacklist.overlaps(bam_df['Chromosome'].values, bam_df['Start'].values, bam_df['End'].values + 1)
+    return bam_df[~mask].reset_index(drop=True)
+
+def blacklist_bins(bins, blacklist):
+    bins = bins.assign(bin_start=bins['bin'] - BIN_WIDTH // 2, bin_end=bins['bin'] + BIN_WIDTH // 2)
+    bins = blacklist.filter_frame(bins, 'chrom', 'bin_start', 'bin_end')
+    return bins.drop(columns=['bin_start', 'bin_end']).reset_index(drop=True)
+
+def blacklist_peaks(peaks, blacklist):
+    return blacklist.filter_frame(peaks, 'chrom', 'start', 'end').reset_index(drop=True)
+
+def fragment_frames(frags, fraction=1.0, blacklist=None, seed=0):
+    """
+    Expand fragments to a frame of every copy, for the duplicate histogram, and a frame of each distinct
+    fragment once, for the remaining stats. The latter matches a BAM file read with duplicates skipped,
+    so a fragments file that keeps duplicates gives the same FRiP and fragment counts as its BAM file.
+    """
+    all_df = frags_to_bam_df(frags, fraction, seed)
+    unique_df = frags_to_bam_df(frags, fraction, seed, unique=True)
+    if blacklist is not None:
+        all_df = blacklist_frags(all_df, blacklist)
+        unique_df = blacklist_frags(unique_df, blacklist)
+    return unique_df, frame_multiplicity_hist(all_df)
+
+#*
+#========================================================================================
+# SAMPLE STATS
+#========================================================================================
+#*/
+
+def compute_sample_stats(sample_id, bam=None, bin_frag=None, seacr_bed=None, raw_frag=None, blacklist=None, blacklist_filter=BLACKLIST_TARGETS, threads=1, preview=None, fragments=None):
+    """
+    Compute the compact per-sample statistics used by the report: the fragment length
+    histograms, binned fragment counts, peaks and the fragments falling within them.
+    Each input is optional so that samples without peaks (e.g. IgG) can still be summarised.
+    If a blacklist IntervalIndex is given, the inputs named in blacklist_filter are
+    filtered against it first. Indexed BAM files are read contig by contig across threads processes,
+    and if preview is set only a sample of their fragments is used. A fragments file can stand in for
+    the BAM file, fragment length histogram and binned counts.
+    """
+    group, rep = split_sample_id(sample_id)
+    stats = {'sample_id': sample_id, 'group': group, 'replicate': rep, 'inputs': [], 'blacklisted': []}
+    if blacklist is not None:
+        stats['blacklisted'] = [x for x in BLACKLIST_TARGETS if x in blacklist_filter]
+
+    frag_file = FragmentFile(fragments) if fragments is not None else None
+
+    if raw_frag is not None or frag_file is not None:
+        frag_len = read_frag_len(raw_frag) if raw_frag is not None else fragment_length_hist(frag_file)
+        set_hist_stats(stats, frag_len)
+
+    if bin_frag is not None or frag_file is not None:
+        bins = read_bin_frag(bin_frag) if bin_frag is not None else fragment_bin_counts(frag_file, BIN_WIDTH)
+        set_bin_stats(stats, bins, blacklist)
+
+    if seacr_bed is not None:
+        peaks = read_seacr_bed(seacr_bed)
+        if 'peaks' in stats['blacklisted']:
+            peaks = blacklist_peaks(peaks, blacklist)
+        stats['peak_chrom'] = peaks['chrom'].values.astype(str)
+        stats['peak_start'] = peaks['start'].values
+        stats['peak_end'] = peaks['end'].values
+        stats['peak_total_signal'] = peaks['total_signal'].values
+        stats['peak_max_signal'] = peaks['max_signal'].values
+        stats['peak_summit'] = peaks['summit'].values
+        stats['inputs'].append('seacr_bed')
+
+    if bam is not None or frag_file is not None:
+        frag_blacklist = blacklist if 'frags' in stats['blacklisted'] else None
+        if frag_file is not None:
+            fraction = preview_fraction(frag_len['Occurrences'].sum(), preview)
+            bam_df, dup_hist = fragment_frames(frag_file.read(), fraction, frag_blacklist)
+            if preview is not None:
+                stats['sample_fraction'] = fraction
+        else:
+            if preview is not None:
+                bam_df, stats['sample_fraction'] = sample_bam_to_df(bam, preview, threads)
+            else:
+                bam_df = pe_bam_to_df(bam, threads)
+            if frag_blacklist is not None:
+                bam_df = blacklist_frags(bam_df, frag_blacklist)
+            dup_hist = frame_multiplicity_hist(bam_df)
+        frag_lens, frag_counts = frag_len_counts(bam_df)
+        frags_in_peaks = 0
+        if seacr_bed is not None and peaks.shape[0] > 0:
+            frags_in_peaks = count_frags_in_peaks(bam_df, peaks)
+        set_frag_stats(stats, frag_lens, frag_counts, bam_df.shape[0], frags_in_peaks, dup_hist)
+
+    return stats
+
+def set_hist_stats(stats, frag_len):
+    stats['hist_size'] = frag_len['Size'].values
+    stats['hist_count'] = frag_len['Occurrences'].values
+    stats['inputs'].append('raw_frag')
+
+def set_bin_stats(stats, bins, blacklist=None):
+    if 'bins' in stats['blacklisted']:
+        bins = blacklist_bins(bins, blacklist)
+    stats['bin_chrom'] = bins['chrom'].values.astype(str)
+    stats['bin_pos'] = bins['bin'].values
+    stats['bin_count'] = bins['count'].values
+    stats['inputs'].append('bin_frag')
+
+def set_frag_stats(stats, frag_lens, frag_counts, mapped_frags, frags_in_peaks, dup_hist):
+    stats['frag_len'] = frag_lens
+    stats['frag_len_count'] = frag_counts
+    stats['mapped_frags'] = mapped_frags
+    stats['frags_in_peaks'] = frags_in_peaks
+    stats['dup_hist'] = dup_hist
+    stats['inputs'].append('bam')
+
+#*
+#========================================================================================
+# PARTITIONED STATS
+#========================================================================================
+#*/
+
+def fragment_partition_summary(fragments, chrom):
+    """
+    Fragment length histogram and binned counts of one chromosome of a fragments file.
+    """
+    frags = FragmentFile(fragments).fetch(chrom)
+    return frags_length_hist(frags), frags_bin_counts(frags, BIN_WIDTH)
+
+def partition_frag_stats(chrom, bam=None, fragments=None, peaks=None, blacklist=None, fraction=1.0):
+    """
+    Fragment length counts, mapped fragments, fragments in peaks and the multiplicity histogram of
+    identical fragments for one chromosome of a BAM or fragments file, thinned to a fraction of fragments.
+    The peaks should be those on the same chromosome, and fragments are filtered against the blacklist
+    if one is given.
+    """
+    if fragments is not None:
+        # seed each chromosome differently so thinning is independent across partitions
+        bam_df, dup_hist = fragment_frames(FragmentFile(fragments).fetch(chrom), fraction, blacklist, seed=[0, zlib.crc32(chrom.encode())])
+    else:
+        _, starts, ends = contig_fragments(bam, chrom, fraction=fraction if fraction < 1 else None)
+        bam_df = pd.DataFrame({"Chromosome" : np.full(len(starts), chrom), "Start" : starts, "End" : ends})
+        if blacklist is not None:
+            bam_df = blacklist_frags(bam_df, blacklist)
+        dup_hist = frame_multiplicity_hist(bam_df)
+    frags_in_peaks = 0
+    if peaks is not None and peaks.shape[0] > 0:
+        frags_in_peaks = count_frags_in_peaks(bam_df, peaks)
+    frag_lens, frag_counts = frag_len_counts(bam_df)
+    return frag_lens, frag_counts, bam_df.shape[0], frags_in_peaks, dup_hist
+
+def sample_partitions(bam=None, fragments=None):
+    """
+    Chromosomes to partition a sample's fragments over, each with its number of mapped reads if known.
+    Returns None for a BAM file without an index, which can only be read in one pass.
+    """
+    if fragments is not None:
+        return [(x, None) for x in FragmentFile(fragments).contigs]
+    if bam is None:
+        return []
+    bamfile = pysam.AlignmentFile(bam, "rb")
+    partitions = None
+    if bamfile.has_index():
+        partitions = [(x.contig, x.mapped) for x in bamfile.get_index_statistics() if x.mapped > 0]
+    bamfile.close()
+    return partitions
+
+def whole_sample_stats(sample, blacklist=None, blacklist_filter=BLACKLIST_TARGETS, preview=None):
+    return compute_sample_stats(sample['sample_id'], bam=sample.get('bam'), bin_frag=sample.get('bin_frag'), seacr_bed=sample.get('seacr_bed'),
+        raw_frag=sample.get('raw_frag'), blacklist=blacklist, blacklist_filter=blacklist_filter, preview=preview, fragments=sample.get('fragments'))
+
+def group_by_sample(tasks, results):
+    """
+    Collect the results of (sample index, ...) tasks into lists keyed by sample index in one pass.
+    """
+    grouped = dict()
+    for task, result in zip(tasks, results):
+        grouped.setdefault(task[0], list()).append(result)
+    return grouped
+
+def partitioned_sample_stats(backend, samples, blacklist=None, blacklist_filter=BLACKLIST_TARGETS, preview=None):
+    """
+    Compute the stats of compute_sample_stats for many samples as one task per sample and chromosome,
+    run on a backend from lib.backend. Each sample is a dict of its sample_id and the inputs of
+    compute_sample_stats, with a fragments file standing in for the fragment length histogram and
+    binned counts. The small per-sample inputs are read here, while the fragments of each chromosome
+    are summarised by the backend and their partial histograms and counts summed per sample.
+    """
+    partitions = [sample_partitions(x.get('bam'), x.get('fragments')) for x in samples]
+
+    # unindexed BAM files can only be read whole
+    whole = [i for i, x in enumerate(partitions) if x is None]
+    stats_list = backend.map(whole_sample_stats, [samples[i] for i in whole], [blacklist] * len(whole),
+        [blacklist_filter] * len(whole), [preview] * len(whole))
+    stats_list = dict(zip(whole, stats_list))
+
+    tasks = list()
+    for i, sample in enumerate(samples):
+        if partitions[i] is None:
+            continue
+        stats_list[i] = compute_sample_stats(sample['sample_id'], bin_frag=sample.get('bin_frag'), seacr_bed=sample.get('seacr_bed'),
+            raw_frag=sample.get('raw_frag'), blacklist=blacklist, blacklist_filter=blacklist_filter)
+        tasks.extend([(i, x, y) for x, y in partitions[i]])
+
+    # fragments files are summarised first, as a preview fraction is taken from their totals
+    frag_tasks = [x for x in tasks if samples[x[0]].get('fragments') is not None]
+    summaries = group_by_sample(frag_tasks, backend.map(fragment_partition_summary, [samples[x[0]]['fragments'] for x in frag_tasks], [x[1] for x in frag_tasks]))
+    fractions = dict()
+    for i, sample in enumerate(samples):
+        if partitions[i] is None or (sample.get('bam') is None and sample.get('fragments') is None):
+            continue
+        if sample.get('fragments') is not None:
+            parts = summaries.get(i, [])
+            set_hist_stats(stats_list[i], merge_length_hists([x[0] for x in parts]))
+            set_bin_stats(stats_list[i], merge_bin_counts([x[1] for x in parts]), blacklist)
+            fractions[i] = preview_fraction(stats_list[i]['hist_count'].sum(), preview)
+        else:
+            fractions[i] = preview_fraction(sum([x[1] for x in partitions[i]]) / 2, preview)
+
+    peaks = dict([(i, peaks_from_shard(x)) for i, x in stats_list.items() if 'seacr_bed' in x['inputs']])
+    args = dict([(x, list()) for x in ['chrom', 'bam', 'fragments', 'peaks', 'blacklist', 'fraction']])
+    for i, chrom, _ in tasks:
+        stats = stats_list[i]
+        args['chrom'].append(chrom)
+        args['bam'].append(samples[i].get('bam'))
+        args['fragments'].append(samples[i].get('fragments'))
+        args['peaks'].append(peaks[i][peaks[i]['chrom'] == chrom] if i in peaks else None)
+        args['blacklist'].append(blacklist if 'frags' in stats['blacklisted'] else None)
+        args['fraction'].append(fractions[i])
+    results = group_by_sample(tasks, backend.map(partition_frag_stats, *args.values()))
+
+    for i, fraction in fractions.items():
+        parts = results.get(i, [])
+        frag_len = merge_length_hists([pd.Series(x[1], index=pd.Index(x[0], name='Size'), name='Occurrences') for x in parts])
+        set_frag_stats(stats_list[i], frag_len['Size'].values, frag_len['Occurrences'].values,
+            sum([x[2] for x in parts]), sum([x[3] for x in parts]), merge_multiplicity_hists([x[4] for x in parts]))
+        if preview is not None:
+            stats_list[i]['sample_fraction'] = fraction
+    return [stats_list[i] for i in range(len(samples))]
+
+#*
+#========================================================================================
+# SHARDS
+#========================================================================================
+#*/
+
+def write_shard(path, stats):
+    arrays = dict()
+    for key, value in stats.items():
+        arrays[key] = np.asarray(value) if key not in ['inputs', 'blacklisted'] else np.array(value, dtype=str)
+    np.savez_compressed(path, **arrays)
+
+def read_shard(path):
+    stats = dict()
+    with np.load(path, allow_pickle=False) as shard:
+        for key in shard.files:
+            value = shard[key]
+            stats[key] = value.item() if value.ndim == 0 else value
+    stats['inputs'] = list(stats['inputs'])
+    stats['blacklisted'] = list(stats.get('blacklisted', []))
+    return stats
+
+def peaks_from_shard(stats):
+    seacr_bed = pd.DataFrame({
+        'chrom': stats['peak_chrom'],
+        'start': stats['peak_start'],
+        'end': stats['peak_end'],
+        'total_signal': stats['peak_total_signal'],
+        'max_signal': stats['peak_max_signal']
+    })
+    if 'peak_summit' in stats:
+        seacr_bed['summit'] = stats['peak_summit']
+    return seacr_bed
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import numpy as np
+import pandas as pd
+
+from lib.stats import write_shard, read_shard, split_sample_id
+
+SUMMARY_SUFFIX = '.summary.npz'
+
+# Bump when the layout changes; readers refuse summaries from a newer version
+SUMMARY_VERSION = 1
+
+# Bins are coarsened to this width, enough to correlate samples at a fraction of the size
+SUMMARY_BIN_WIDTH = 10000
+
+#*
+#========================================================================================
+# SUMMARIES
+#========================================================================================
+#*/
+
+def coarsen_bins(chroms, pos, counts, width):
+    df = pd.DataFrame({'chrom': chroms, 'bin': pos // width * width + width // 2, 'count': counts})
+    df = df.groupby(['chrom', 'bin'], sort=False)['count'].sum().reset_index()
+    return df['chrom'].values.astype(str), df['bin'].values, df['count'].values
+
+def build_summary(stats, meta=None, run='', bin_width=SUMMARY_BIN_WIDTH):
+    """
+    Build a versioned per-sample summary from the stats of compute_sample_stats and the sample's row
+    of the meta table: the fragment length histogram, bin counts coarsened to bin_width, mapped fragments
+    and fragments in peaks, and the peaks themselves. The run names the pipeline run it came from.
+    """
+    summary = dict(stats)
+    summary['summary_version'] = SUMMARY_VERSION
+    summary['run'] = run
+    if 'bin_frag' in stats['inputs']:
+        summary['bin_chrom'], summary['bin_pos'], summary['bin_count'] = coarsen_bins(stats['bin_chrom'], stats['bin_pos'], stats['bin_count'], bin_width)
+        summary['bin_width'] = bin_width
+
+    # round trip through pandas so numpy scalars and missing values serialise
+    meta = dict() if meta is None else json.loads(pd.Series(meta).to_json())
+    summary['meta'] = json.dumps(meta)
+    return summary
+
+def write_summary(path, summary):
+    write_shard(path, summary)
+
+def read_summary(path):
+    summary = read_shard(path)
+    version = summary.get('summary_version')
+    if version is None:
+        raise ValueError('Not a report summary: ' + path)
+    if version > SUMMARY_VERSION:
+        raise ValueError('Summary ' + path + ' has version ' + str(version) + ', newer than the supported version ' + str(SUMMARY_VERSION))
+    summary['meta'] = json.loads(summary['meta'])
+    return summary
+
+#*
+#========================================================================================
+# COHORTS
+#========================================================================================
+#*/
+
+def rename_sample(summary, group):
+    summary['group'] = group
+    summary['sample_id'] = group + '_' + summary['replicate']
+    summary['meta']['id'] = summary['sample_id']
+    summary['meta']['group'] = group
+
+def merge_summaries(summaries):
+    """
+    Combine the summaries of many runs into a cohort, returning its meta table and stats. Samples
+    whose ids clash across runs have their group prefixed with the run name, and bin counts are
+    coarsened to the widest bins of any summary. Raises a ValueError if ids still clash.
+    """
+    for summary in summaries:
+        summary['meta'].setdefault('id', summary['sample_id'])
+        summary['meta'].setdefault('group', summary['group'])
+
+    ids = pd.Series([x['sample_id'] for x in summaries])
+    for i in np.flatnonzero(ids.duplicated(keep=False).values):
+        if summaries[i]['run'] != '':
+            rename_sample(summaries[i], summaries[i]['run'] + '-' + summaries[i]['group'])
+
+    ids = pd.Series([x['sample_id'] for x in summaries])
+    if ids.duplicated().any():
+        raise ValueError('Duplicate sample ids across summaries: ' + ', '.join(sorted(set(ids[ids.duplicated()]))))
+
+    widths = [x['bin_width'] for x in summaries if 'bin_frag' in x['inputs']]
+    for summary in summaries:
+        if 'bin_frag' in summary['inputs'] and summary['bin_width'] < max(widths):
+            summary['bin_chrom'], summary['bin_pos'], summary['bin_count'] = coarsen_bins(summary['bin_chrom'], summary['bin_pos'], summary['bin_count'], max(widths))
+            summary['bin_width'] = max(widths)
+
+    summaries = sorted(summaries, key=lambda x: split_sample_id(x['sample_id']))
+    meta = pd.DataFrame([x['meta'] for x in summaries])
+    return meta, summaries
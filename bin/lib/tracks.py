@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Fragment length classes as half-open ranges in bp, open-ended when the upper bound is None
+SIZE_CLASSES = {
+    'all': (0, None),
+    'subnucleosomal': (0, 120),
+    'mononucleosomal': (120, 250),
+    'polynucleosomal': (250, None)
+}
+
+# raw fragment counts, the spike-in scale factor as applied by bedtools genomecov -scale, or counts per million fragments in the class
+NORMALISATIONS = ['raw', 'spikein', 'cpm']
+CPM_SCALE = 1e6
+
+BEDGRAPH_SUFFIX = '.bedGraph'
+BIGWIG_SUFFIX = '.bigWig'
+
+#*
+#========================================================================================
+# COVERAGE
+#========================================================================================
+#*/
+
+def class_weights(lengths, counts, classes):
+    """
+    Fragment x class matrix holding each fragment's count in the columns of the classes its length falls in.
+    """
+    weights = np.zeros((lengths.shape[0], len(classes)), dtype=np.int64)
+    for i, name in enumerate(classes):
+        low, high = SIZE_CLASSES[name]
+        inside = (lengths >= low) if high is None else (lengths >= low) & (lengths < high)
+        weights[:, i] = np.where(inside, counts, 0)
+    return weights
+
+def coverage_levels(starts, ends, weights):
+    """
+    Coverage of every weight column at once from sparse difference arrays: +weight at each fragment
+    start and -weight at its end, summed at each distinct position and accumulated. Returns the sorted
+    breakpoints and the coverage of each column from each breakpoint to the next, so the events are
+    sorted once however many columns there are.
+    """
+    pos = np.concatenate([starts, ends])
+    delta = np.concatenate([weights, -weights])
+    order = np.argsort(pos, kind='stable')
+    pos, delta = pos[order], delta[order]
+    if pos.shape[0] == 0:
+        return pos, delta
+    first = np.flatnonzero(np.append(True, pos[1:] != pos[:-1]))
+    return pos[first], np.cumsum(np.add.reduceat(delta, first, axis=0), axis=0)
+
+def level_intervals(pos, level):
+    """
+    Collapse one column of coverage levels into bedGraph intervals, merging neighbouring runs of
+    the same value and dropping zero coverage.
+    """
+    if pos.shape[0] == 0:
+        return pos, pos, level
+    change = np.flatnonzero(np.append(True, level[1:] != level[:-1]))
+    starts, values = pos[change], level[change]
+    ends = np.append(starts[1:], pos[-1])
+    keep = values != 0
+    return starts[keep], ends[keep], values[keep]
+
+def clip_intervals(starts, ends, values, size):
+    keep = starts < size
+    return starts[keep], np.minimum(ends[keep], size), values[keep]
+
+#*
+#========================================================================================
+# WRITERS
+#========================================================================================
+#*/
+
+class BedGraphWriter:
+
+    def __init__(self, path, chrom_sizes=None):
+        self.path = path
+        self.fout = open(path, 'w')
+
+    def write(self, chrom, starts, ends, values):
+        pd.DataFrame({'chrom': chrom, 'start': starts, 'end': ends, 'value': values}).to_csv(self.fout, sep='\t', header=False, index=False, float_format='%.6g')
+
+    def close(self):
+        self.fout.close()
+
+class BigWigWriter:
+    """
+    bigWig output through pyBigWig, which needs the chromosome sizes for its header. Entries must
+    follow the header order, so the chromosomes are listed in the order they are written.
+    """
+
+    def __init__(self, path, chrom_sizes, chrom_order):
+        import pyBigWig
+        self.path = path
+        order = [x for x in chrom_order if x in chrom_sizes] + [x for x in chrom_sizes if x not in chrom_order]
+        self.bw = pyBigWig.open(path, 'w')
+        self.bw.addHeader([(x, int(chrom_sizes[x])) for x in order])
+
+    def write(self, chrom, starts, ends, values):
+        if starts.shape[0] > 0:
+            self.bw.addEntries([chrom] * starts.shape[0], starts.tolist(), ends=ends.tolist(), values=values.astype(np.float64).tolist())
+
+    def close(self):
+        self.bw.close()
+
+def bigwig_available():
+    try:
+        import pyBigWig
+        return True
+    except ImportError:
+        return False
+
+#*
+#========================================================================================
+# TRACKS
+#========================================================================================
+#*/
+
+def track_name(size_class, normalisation):
+    return size_class + '.' + normalisation
+
+def track_scales(normalisations, totals, scale):
+    scales = list()
+    for norm in normalisations:
+        if norm == 'raw':
+            scales.append(np.ones(totals.shape[0]))
+        elif norm == 'spikein':
+            scales.append(np.full(totals.shape[0], scale, dtype=np.float64))
+        else:
+            scales.append(CPM_SCALE / np.maximum(totals, 1))
+    return scales
+
+def write_tracks(frag_file, prefix, classes=['all'], normalisations=['spikein'], scale=1.0, chrom_sizes=None, bigwig=False, chunk_size=1000000):
+    """
+    Write a coverage track for every combination of fragment length class and normalisation from one
+    pass over a fragments file. Each chromosome's coverage in every class comes from one sorted set of
+    difference array events, and the normalisations only rescale it. Counts per million need the
+    genome-wide total of each class, so when requested the coverage is held in a temporary directory
+    until the pass is complete. Intervals are clipped to the chromosome sizes when given, and written
+    as bigWig, which needs the sizes, or bedGraph. Returns the paths written.
+    """
+    if bigwig and chrom_sizes is None:
+        raise ValueError('Chromosome sizes are required to write bigWig files')
+
+    totals = np.zeros(len(classes), dtype=np.int64)
+    need_totals = 'cpm' in normalisations
+    chroms = list()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writers = None
+        for chrom, frags in frag_file.iter_chroms(chunk_size):
+            if chrom_sizes is not None and chrom not in chrom_sizes:
+                continue
+            weights = class_weights(frags['end'] - frags['start'], frags['count'], classes)
+            totals += weights.sum(axis=0)
+            pos, levels = coverage_levels(frags['start'], frags['end'], weights)
+            chroms.append(chrom)
+            if need_totals:
+                np.save(os.path.join(tmp_dir, str(len(chroms)) + '.pos.npy'), pos)
+                np.save(os.path.join(tmp_dir, str(len(chroms)) + '.levels.npy'), levels)
+                continue
+            if writers is None:
+                writers = open_writers(prefix, classes, normalisations, chrom_sizes, bigwig, list(frag_file.contigs))
+            write_levels(writers, chrom, pos, levels, track_scales(normalisations, totals, scale), chrom_sizes)
+
+        if need_totals:
+            writers = open_writers(prefix, classes, normalisations, chrom_sizes, bigwig, chroms)
+            scales = track_scales(normalisations, totals, scale)
+            for i, chrom in enumerate(chroms):
+                pos = np.load(os.path.join(tmp_dir, str(i + 1) + '.pos.npy'))
+                levels = np.load(os.path.join(tmp_dir, str(i + 1) + '.levels.npy'))
+                write_levels(writers, chrom, pos, levels, scales, chrom_sizes)
+        elif writers is None:
+            writers = open_writers(prefix, classes, normalisations, chrom_sizes, bigwig, chroms)
+
+    for writer in writers.values():
+        writer.close()
+    return [x.path for x in writers.values()]
+
+def open_writers(prefix, classes, normalisations, chrom_sizes, bigwig, chrom_order):
+    writers = dict()
+    for size_class in classes:
+        for norm in normalisations:
+            path = prefix + '.' + track_name(size_class, norm) + (BIGWIG_SUFFIX if bigwig else BEDGRAPH_SUFFIX)
+            writers[(size_class, norm)] = BigWigWriter(path, chrom_sizes, chrom_order) if bigwig else BedGraphWriter(path)
+    return writers
+
+def write_levels(writers, chrom, pos, levels, scales, chrom_sizes):
+    classes = list(dict.fromkeys([x[0] for x in writers]))
+    normalisations = list(dict.fromkeys([x[1] for x in writers]))
+    for i, size_class in enumerate(classes):
+        starts, ends, counts = level_intervals(pos, levels[:, i])
+        if chrom_sizes is not None:
+            starts, ends, counts = clip_intervals(starts, ends, counts, chrom_sizes[chrom])
+        for norm, scale in zip(normalisations, scales):
+            values = counts if norm == 'raw' else counts * scale[i]
+            writers[(size_class, norm)].write(chrom, starts, ends, values)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import glob
+
+from lib.options import BLACKLIST_TARGETS
+
+# Inputs that are globs over many samples and inputs that are single files
+GLOB_INPUTS = ['raw_frag', 'bin_frag', 'seacr_bed', 'bams', 'stats', 'fragments', 'summaries']
+FILE_INPUTS = ['meta', 'blacklist', 'genes']
+
+#*
+#========================================================================================
+# VALIDATION
+#========================================================================================
+#*/
+
+def check_file(path):
+    if not os.path.isfile(path):
+        return 'file not found'
+    if os.path.getsize(path) == 0:
+        return 'file is empty'
+    return None
+
+def check_glob(pattern):
+    """
+    Return the files matching a glob with an error for the glob or each bad file, if any.
+    """
+    paths = sorted(glob.glob(pattern))
+    if len(paths) == 0:
+        return paths, ['no files match']
+    return paths, [x + ': ' + y for x, y in [(x, check_file(x)) for x in paths] if y is not None]
+
+def sample_ids(paths):
+    return set([os.path.basename(x).split('.')[0] for x in paths])
+
+def validate_inputs(inputs):
+    """
+    Check the report inputs given as a dict of argument name to file or glob, skipping those set to
+    None. Returns the number of files matched by each glob and a list of error messages.
+    """
+    errors = list()
+    matched = dict()
+    for name in FILE_INPUTS:
+        if inputs.get(name) is not None:
+            error = check_file(inputs[name])
+            if error is not None:
+                errors.append('--' + name + ' ' + inputs[name] + ': ' + error)
+
+    ids = dict()
+    for name in GLOB_INPUTS:
+        if inputs.get(name) is not None:
+            paths, glob_errors = check_glob(inputs[name])
+            matched[name] = len(paths)
+            ids[name] = sample_ids(paths)
+            errors.extend(['--' + name + ' ' + inputs[name] + ': ' + x for x in glob_errors])
+
+    # every per-sample input should cover the same samples, peaks aside as IgG samples have none
+    per_sample = [x for x in ids if x != 'seacr_bed' and len(ids[x]) > 0]
+    for name in per_sample[1:]:
+        if ids[name] != ids[per_sample[0]]:
+            missing = sorted(ids[name] ^ ids[per_sample[0]])
+            errors.append('--' + name + ' and --' + per_sample[0] + ' cover different samples: ' + ', '.join(missing))
+
+    for target in inputs.get('blacklist_filter') or []:
+        if target not in BLACKLIST_TARGETS:
+            errors.append('--blacklist_filter ' + target + ': must be one of ' + ', '.join(BLACKLIST_TARGETS))
+    return matched, errors
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import errno
+import argparse
+
+from lib.regions import RegionSet, count_regions
+
+
+def parse_args(args=None):
+    Description = "Count the fragments of many samples over many BED region sets, writing a region x sample count matrix per region set and the fraction of each sample's fragments in each set."
+    Epilog = "Example usage: python region_counts.py <OUT_DIR> --regions promoters.bed enhancers.bed --samples *.fragments.tsv.gz"
+
+    parser = argparse.ArgumentParser(description=Description, epilog=Epilog)
+    parser.add_argument("OUT_DIR", help="Output directory.")
+    parser.add_argument("-r", "--regions", type=str, dest="REGIONS", nargs="+", required=True, help="BED files of regions, each counted as one region set named after the file.")
+    parser.add_argument("-s", "--samples", type=str, dest="SAMPLES", nargs="+", required=True, help="Fragments files (*.fragments.tsv.gz) or paired-end BAM files, one per sample.")
+    parser.add_argument("-t", "--threads", type=int, dest="THREADS", default=1, help="Number of samples to count in parallel.")
+    parser.add_argument("-kd", "--keep_duplicates", dest="KEEP_DUPLICATES", action="store_true", help="Count reads flagged as duplicates in BAM files and every copy of a fragment in fragments files.")
+    return parser.parse_args(args)
+
+
+def make_dir(path):
+    if len(path) > 0:
+        try:
+            os.makedirs(path)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise exception
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    for path in args.REGIONS + args.SAMPLES:
+        if not os.path.exists(path):
+            print("ERROR: Please check input file -> {}".format(path))
+            sys.exit(1)
+
+    region_sets = [RegionSet.from_bed(x) for x in args.REGIONS]
+    names = [x.name for x in region_sets]
+    if len(set(names)) != len(names):
+        print("ERROR: Region set names must be unique -> {}".format(", ".join(names)))
+        sys.exit(1)
+
+    matrices, fractions = count_regions(region_sets, args.SAMPLES, args.THREADS, args.KEEP_DUPLICATES)
+
+    make_dir(args.OUT_DIR)
+    for name, matrix in matrices.items():
+        matrix.to_csv(os.path.join(args.OUT_DIR, name + ".counts.tsv"), sep="\t", index=False)
+    fractions.to_csv(os.path.join(args.OUT_DIR, "region_fractions.tsv"), sep="\t")
+    print("Counted {} samples over {} region sets".format(fractions.shape[1], len(region_sets)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
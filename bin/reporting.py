@@ -5,10 +5,15 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import sys
 import argparse
 import logging
 
-from lib.reports import Reports
+# Only light modules are imported here; each subcommand imports the plotting and genomics
+# libraries it needs so that validation and argument errors return without loading them
+from lib.options import parse_preview, BLACKLIST_TARGETS, DATA_FORMATS
+from lib.backend import BACKENDS, get_backend
+from lib.validate import validate_inputs
 
 def init_logger(app_name, log_file = None):
     logger = logging.getLogger(app_name)
@@ -36,10 +41,106 @@ def gen_png(parsed_args):
     bin_frag_path = parsed_args.bin_frag
     seacr_bed_path = parsed_args.seacr_bed
     bams_path = parsed_args.bams
+    stats_path = parsed_args.stats
+    data_format = parsed_args.data_format
+    blacklist_path = parsed_args.blacklist
+    blacklist_filter = parsed_args.blacklist_filter
+    preview = parsed_args.preview
+    fragments_path = parsed_args.fragments
+
+    if stats_path is None and None in [seacr_bed_path, fragments_path] and None in [frag_path, bin_frag_path, seacr_bed_path, bams_path]:
+        logger.error('Either --stats, --fragments and --seacr_bed, or all of --raw_frag, --bin_frag, --seacr_bed and --bams must be provided')
+        sys.exit(1)
+
+    _, errors = validate_inputs(vars(parsed_args))
+    if len(errors) > 0:
+        for error in errors:
+            logger.error(error)
+        sys.exit(1)
+
+    from lib.reports import Reports
+
+    backend = None
+    if parsed_args.backend is not None and stats_path is None:
+        logger.info('Partitioning samples by chromosome on the ' + parsed_args.backend + ' backend')
+        try:
+            backend = get_backend(parsed_args.backend, parsed_args.workers, parsed_args.scheduler)
+        except ImportError as e:
+            logger.error(str(e))
+            sys.exit(1)
 
     logger.info('Generating plots to output folder')
-    fig = Reports(logger, meta_path, frag_path, bin_frag_path, seacr_bed_path, bams_path)
-    fig.gen_plots_to_folder(output_path)
+    fig = Reports(logger, meta_path, frag_path, bin_frag_path, seacr_bed_path, bams_path, stats_path, blacklist_path, blacklist_filter, preview, fragments_path, backend, genes=parsed_args.genes)
+    try:
+        fig.gen_plots_to_folder(output_path, data_format, parsed_args.html)
+    finally:
+        if backend is not None:
+            backend.close()
+
+    if parsed_args.write_summaries:
+        paths = fig.gen_summaries(output_path, parsed_args.run)
+        logger.info('Wrote ' + str(len(paths)) + ' sample summaries')
+
+    logger.info('Completed')
+
+def aggregate(parsed_args):
+    logger = init_logger('aggregate', parsed_args.log)
+
+    _, errors = validate_inputs(vars(parsed_args))
+    if len(errors) > 0:
+        for error in errors:
+            logger.error(error)
+        sys.exit(1)
+
+    from lib.reports import Reports
+
+    logger.info('Generating cohort plots to output folder')
+    fig = Reports(logger, None, None, None, None, None, preview=parsed_args.preview, summaries=parsed_args.summaries, genes=parsed_args.genes)
+    try:
+        fig.gen_plots_to_folder(parsed_args.output, parsed_args.data_format, parsed_args.html)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    logger.info('Completed')
+
+def gen_stats(parsed_args):
+    logger = init_logger('gen_stats', parsed_args.log)
+
+    from lib.intervals import IntervalIndex
+    from lib.stats import compute_sample_stats, write_shard
+
+    blacklist = None
+    if parsed_args.blacklist is not None:
+        blacklist = IntervalIndex.from_bed(parsed_args.blacklist)
+
+    logger.info('Calculating stats for ' + parsed_args.id)
+    stats = compute_sample_stats(parsed_args.id, parsed_args.bam, parsed_args.bin_frag, parsed_args.seacr_bed, parsed_args.raw_frag, blacklist, parsed_args.blacklist_filter, parsed_args.threads, parsed_args.preview, parsed_args.fragments)
+    write_shard(parsed_args.output, stats)
+
+    logger.info('Completed')
+
+def gen_fragments(parsed_args):
+    logger = init_logger('gen_fragments', parsed_args.log)
+
+    from lib.fragment_file import bam_to_fragment_file
+
+    logger.info('Writing fragments for ' + parsed_args.id)
+    frags = bam_to_fragment_file(parsed_args.bam, parsed_args.output, parsed_args.id, parsed_args.threads, parsed_args.skip_duplicates)
+    logger.info('Wrote ' + str(frags.shape[0]) + ' unique fragments from ' + str(frags['count'].sum()) + ' fragments')
+
+    logger.info('Completed')
+
+def validate(parsed_args):
+    logger = init_logger('validate', parsed_args.log)
+
+    matched, errors = validate_inputs(vars(parsed_args))
+    for name, count in matched.items():
+        logger.info('--' + name + ' matched ' + str(count) + ' files')
+    if len(errors) > 0:
+        for error in errors:
+            logger.error(error)
+        sys.exit(1)
 
     logger.info('Completed')
 
@@ -53,11 +154,76 @@ if __name__ == '__main__':
     parser_genimg.set_defaults(func=gen_png)
     parser_genimg.add_argument('--log', required=False)
     parser_genimg.add_argument('--meta', required=True)
-    parser_genimg.add_argument('--raw_frag', required=True)
-    parser_genimg.add_argument('--bin_frag', required=True)
-    parser_genimg.add_argument('--seacr_bed', required=True)
+    parser_genimg.add_argument('--raw_frag', required=False)
+    parser_genimg.add_argument('--bin_frag', required=False)
+    parser_genimg.add_argument('--seacr_bed', required=False)
     parser_genimg.add_argument('--output', required=True)
-    parser_genimg.add_argument('--bams', required=True)
+    parser_genimg.add_argument('--bams', required=False)
+    parser_genimg.add_argument('--stats', required=False)
+    parser_genimg.add_argument('--data_format', required=False, default='csv', choices=DATA_FORMATS, help="Format of the bulky report tables, 'auto' writes parquet if pyarrow is installed and csv otherwise")
+    parser_genimg.add_argument('--blacklist', required=False)
+    parser_genimg.add_argument('--blacklist_filter', required=False, nargs='+', default=BLACKLIST_TARGETS, choices=BLACKLIST_TARGETS)
+    parser_genimg.add_argument('--fragments', required=False)
+    parser_genimg.add_argument('--preview', required=False, type=parse_preview, help='Report from a sample of fragments, given as a fraction (<= 1) or a whole number of fragments per sample. Only fragment-level stats are sampled and only FRiP carries a confidence interval')
+    parser_genimg.add_argument('--backend', required=False, choices=BACKENDS, help='Compute per-sample stats as one task per sample and chromosome on this backend')
+    parser_genimg.add_argument('--workers', required=False, type=int, default=1)
+    parser_genimg.add_argument('--scheduler', required=False, help='Address of a running dask scheduler for the dask backend')
+    parser_genimg.add_argument('--genes', required=False, help='Gene BED file to annotate peaks with their nearest gene and genomic class')
+    parser_genimg.add_argument('--write_summaries', required=False, action='store_true', help='Also write a versioned summary per sample for aggregate')
+    parser_genimg.add_argument('--run', required=False, default='', help='Name of the run, recorded in the summaries')
+    parser_genimg.add_argument('--html', required=False, action='store_true', help='Also write an interactive html report')
+
+    # Cohort reporting function
+    parser_aggregate = subparsers.add_parser('aggregate')
+    parser_aggregate.set_defaults(func=aggregate)
+    parser_aggregate.add_argument('--log', required=False)
+    parser_aggregate.add_argument('--summaries', required=True, help='Glob of sample summaries (*.summary.npz) from any number of runs')
+    parser_aggregate.add_argument('--output', required=True)
+    parser_aggregate.add_argument('--data_format', required=False, default='csv', choices=DATA_FORMATS, help="Format of the bulky report tables, 'auto' writes parquet if pyarrow is installed and csv otherwise")
+    parser_aggregate.add_argument('--genes', required=False, help='Gene BED file to annotate peaks with their nearest gene and genomic class')
+    parser_aggregate.add_argument('--preview', required=False, type=parse_preview, help='Report from a sample of fragments, given as a fraction (<= 1) or a whole number of fragments per sample. Only fragment-level stats are sampled and only FRiP carries a confidence interval')
+    parser_aggregate.add_argument('--html', required=False, action='store_true', help='Also write an interactive html report')
+
+    # Per-sample stats function
+    parser_stats = subparsers.add_parser('gen_stats')
+    parser_stats.set_defaults(func=gen_stats)
+    parser_stats.add_argument('--log', required=False)
+    parser_stats.add_argument('--id', required=True)
+    parser_stats.add_argument('--raw_frag', required=False)
+    parser_stats.add_argument('--bin_frag', required=False)
+    parser_stats.add_argument('--seacr_bed', required=False)
+    parser_stats.add_argument('--bam', required=False)
+    parser_stats.add_argument('--output', required=True)
+    parser_stats.add_argument('--threads', required=False, type=int, default=1)
+    parser_stats.add_argument('--preview', required=False, type=parse_preview, help='Compute stats from a sample of fragments, given as a fraction (<= 1) or a whole number of fragments')
+    parser_stats.add_argument('--fragments', required=False)
+    parser_stats.add_argument('--blacklist', required=False)
+    parser_stats.add_argument('--blacklist_filter', required=False, nargs='+', default=BLACKLIST_TARGETS, choices=BLACKLIST_TARGETS)
+
+    # Fragments file function
+    parser_frags = subparsers.add_parser('gen_fragments')
+    parser_frags.set_defaults(func=gen_fragments)
+    parser_frags.add_argument('--log', required=False)
+    parser_frags.add_argument('--id', required=True)
+    parser_frags.add_argument('--bam', required=True)
+    parser_frags.add_argument('--output', required=True)
+    parser_frags.add_argument('--threads', required=False, type=int, default=1)
+    parser_frags.add_argument('--skip_duplicates', required=False, action='store_true', help='Leave out reads flagged as duplicates, which are kept by default')
+
+    # Input validation function
+    parser_validate = subparsers.add_parser('validate')
+    parser_validate.set_defaults(func=validate)
+    parser_validate.add_argument('--log', required=False)
+    parser_validate.add_argument('--meta', required=False)
+    parser_validate.add_argument('--raw_frag', required=False)
+    parser_validate.add_argument('--bin_frag', required=False)
+    parser_validate.add_argument('--seacr_bed', required=False)
+    parser_validate.add_argument('--bams', required=False)
+    parser_validate.add_argument('--stats', required=False)
+    parser_validate.add_argument('--fragments', required=False)
+    parser_validate.add_argument('--blacklist', required=False)
+    parser_validate.add_argument('--summaries', required=False)
+    parser_validate.add_argument('--genes', required=False)
 
     # Parse
     parsed_args = parser.parse_args()
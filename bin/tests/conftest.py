@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pysam
+import pytest
+
+# the scripts import their helpers as lib.*, relative to bin/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+READ_LENGTH = 50
+
+
+def write_pairs(path, pairs, chroms=(('chr1', 100000),), index=True):
+    """
+    Write a coordinate-sorted paired-end BAM file of 50bp reads. Each pair is given as
+    (name, chrom, start, mate_start) with an optional fourth field flagging it as a duplicate,
+    the first read on the forward strand and its mate on the reverse strand.
+    """
+    header = {'HD': {'VN': '1.6', 'SO': 'coordinate'}, 'SQ': [{'SN': x, 'LN': y} for x, y in chroms]}
+    tids = dict([(x[0], i) for i, x in enumerate(chroms)])
+    reads = list()
+    for pair in pairs:
+        name, chrom, start, mate_start = pair[:4]
+        duplicate = len(pair) > 4 and pair[4]
+        for first, pos, mpos in [(True, start, mate_start), (False, mate_start, start)]:
+            read = pysam.AlignedSegment()
+            read.query_name = name
+            read.query_sequence = 'A' * READ_LENGTH
+            read.flag = 1 | 2 | (64 if first else 128) | (32 if first else 16) | (1024 if duplicate else 0)
+            read.reference_id = read.next_reference_id = tids[chrom]
+            read.reference_start, read.next_reference_start = pos, mpos
+            read.cigarstring = str(READ_LENGTH) + 'M'
+            read.mapping_quality = 60
+            read.template_length = (mate_start + READ_LENGTH - start) * (1 if first else -1)
+            reads.append(read)
+    with pysam.AlignmentFile(str(path), 'wb', header=header) as fout:
+        for read in sorted(reads, key=lambda x: (x.reference_id, x.reference_start)):
+            fout.write(read)
+    if index:
+        pysam.index(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def bam_writer():
+    return write_pairs
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from lib.annotation import GeneIndex
+
+GENES = pd.DataFrame([
+    ['chr1', 1000, 5000, 'plus', '0', '+'],
+    ['chr1', 20000, 30000, 'minus', '0', '-'],
+    ['chr2', 500, 900, 'other', '0', '+']
+], columns=['chrom', 'start', 'end', 'name', 'score', 'strand'])
+
+
+def brute_force_distance(genes, chrom, start, end):
+    # gap from the TSS to the nearest base of the interval, signed by which side of the TSS it lies on
+    best = None
+    for _, gene in genes[genes['chrom'] == chrom].iterrows():
+        tss = gene['end'] - 1 if gene['strand'] == '-' else gene['start']
+        offset = 0 if start <= tss < end else (start - tss if start > tss else tss - (end - 1))
+        offset = offset if start > tss or offset == 0 else -offset
+        offset = -offset if gene['strand'] == '-' else offset
+        if best is None or abs(offset) < abs(best):
+            best = offset
+    return best
+
+
+def test_distance_sign_follows_gene_strand():
+    index = GeneIndex(GENES)
+    # downstream of the plus gene, upstream of it, over it; upstream and downstream of the minus gene
+    chroms = ['chr1'] * 5
+    starts = [1500, 200, 900, 30500, 28000]
+    ends = [1600, 300, 1100, 31000, 28500]
+    gene, distance = index.nearest_tss(chroms, starts, ends)
+    assert GENES['name'].values[gene].tolist() == ['plus', 'plus', 'plus', 'minus', 'minus']
+    assert distance.tolist() == [500, -701, 0, -501, 1500]
+
+
+def test_nearest_tss_matches_brute_force():
+    rng = np.random.default_rng(4)
+    starts = rng.integers(0, 100000, 60)
+    genes = pd.DataFrame({'chrom': rng.choice(['chr1', 'chr2'], 60), 'start': starts, 'end': starts + rng.integers(1, 5000, 60),
+        'name': ['g' + str(i) for i in range(60)], 'score': '0', 'strand': rng.choice(['+', '-'], 60)})
+    chroms = rng.choice(['chr1', 'chr2'], 300)
+    starts = rng.integers(0, 105000, 300)
+    ends = starts + rng.integers(1, 2000, 300)
+    gene, distance = GeneIndex(genes).nearest_tss(chroms, starts, ends)
+    for i in range(300):
+        expected = brute_force_distance(genes, chroms[i], starts[i], ends[i])
+        assert abs(distance[i]) == abs(expected)
+        assert distance[i] == brute_force_distance(genes.iloc[[gene[i]]], chroms[i], starts[i], ends[i])
+
+
+def test_annotation_classes():
+    annotation = GeneIndex(GENES).annotate(['chr1', 'chr1', 'chr1', 'chr1', 'chr3'], [1900, 2500, 10000, 30500, 100], [2000, 2600, 10100, 30600, 200])
+    assert annotation['annotation'].tolist() == ['promoter', 'genic', 'intergenic', 'promoter', 'intergenic']
+    assert annotation['nearest_gene'].tolist() == ['plus', 'plus', 'plus', 'minus', None]
+    assert annotation['distance_to_tss'].tolist()[:4] == [900, 1500, 9000, -501]
+    assert np.isnan(annotation['distance_to_tss'].iloc[4])
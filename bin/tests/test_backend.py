@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from lib.backend import LocalBackend, get_backend
+from lib.fragment_file import bam_to_fragment_file
+from lib.stats import compute_sample_stats, partitioned_sample_stats
+
+CHROMS = (('chr1', 20000), ('chr2', 20000))
+
+
+@pytest.fixture
+def sample(tmp_path, bam_writer):
+    rng = np.random.default_rng(1)
+    pairs = list()
+    for i in range(400):
+        chrom = CHROMS[i % 2][0]
+        start = int(rng.integers(0, 18000))
+        pairs.append(('r' + str(i), chrom, start, start + int(rng.integers(0, 600)), i % 17 == 0))
+    bam = bam_writer(tmp_path / 'h3k27me3_R1.bam', pairs, CHROMS)
+    fragments = str(tmp_path / 'h3k27me3_R1.fragments.tsv.gz')
+    bam_to_fragment_file(bam, fragments, 'h3k27me3_R1', skip_duplicates=True)
+    peaks = tmp_path / 'h3k27me3_R1.bed'
+    peaks.write_text('chr1\t1000\t6000\t10\t1\tchr1:2000-2100\nchr2\t5000\t9000\t10\t1\tchr2:6000-6100\n')
+    return {'sample_id': 'h3k27me3_R1', 'bam': bam, 'fragments': fragments, 'seacr_bed': str(peaks)}
+
+
+def assert_same_stats(expected, actual):
+    # partial histograms and bins are merged in a different order, so compare their contents
+    for key in ['hist_size', 'hist_count', 'bin_chrom', 'bin_pos', 'bin_count', 'frag_len', 'frag_len_count', 'dup_hist']:
+        if key in expected:
+            assert sorted(np.asarray(expected[key]).tolist()) == sorted(np.asarray(actual[key]).tolist()), key
+    assert expected['mapped_frags'] == actual['mapped_frags']
+    assert expected['frags_in_peaks'] == actual['frags_in_peaks'] > 0
+
+
+@pytest.mark.parametrize('inputs', [['bam', 'seacr_bed'], ['fragments', 'seacr_bed']])
+def test_partitioned_stats_match_whole_sample(sample, inputs):
+    sample = dict([('sample_id', sample['sample_id'])] + [(x, sample[x]) for x in inputs])
+    expected = compute_sample_stats(sample['sample_id'], bam=sample.get('bam'), seacr_bed=sample['seacr_bed'], fragments=sample.get('fragments'))
+    actual = partitioned_sample_stats(LocalBackend(), [sample, dict(sample)])
+    assert len(actual) == 2
+    for stats in actual:
+        assert_same_stats(expected, stats)
+
+
+def test_dask_backend_in_process(sample):
+    pytest.importorskip('dask.distributed')
+    sample = {'sample_id': sample['sample_id'], 'fragments': sample['fragments'], 'seacr_bed': sample['seacr_bed']}
+    expected = partitioned_sample_stats(LocalBackend(), [sample])[0]
+    backend = get_backend('dask', workers=1)
+    try:
+        assert_same_stats(expected, partitioned_sample_stats(backend, [sample])[0])
+    finally:
+        backend.close()
@@ -0,0 +1,44 @@
+import gzip
+import pytest
+
+from check_samplesheet import check_samplesheet
+
+
+def write_samplesheet(tmp_path, rows):
+    path = tmp_path / 'samplesheet.csv'
+    path.write_text('\n'.join(['group,replicate,fastq_1,fastq_2'] + rows) + '\n')
+    return str(path)
+
+
+def test_runs_of_a_sample_share_datatype(tmp_path, capsys):
+    samplesheet = write_samplesheet(tmp_path, [
+        'h3k27me3,1,S1_L001_R1.fastq.gz,S1_L001_R2.fastq.gz',
+        'h3k27me3,1,S1_L002_R1.fastq.gz,'
+    ])
+    with pytest.raises(SystemExit):
+        check_samplesheet(samplesheet, str(tmp_path / 'valid.csv'), 'false')
+    assert 'Multiple runs of a sample must be of the same datatype!' in capsys.readouterr().out
+
+
+def test_runs_of_a_sample_with_same_datatype(tmp_path):
+    samplesheet = write_samplesheet(tmp_path, [
+        'h3k27me3,1,S1_L001_R1.fastq.gz,S1_L001_R2.fastq.gz',
+        'h3k27me3,1,S1_L002_R1.fastq.gz,S1_L002_R2.fastq.gz'
+    ])
+    check_samplesheet(samplesheet, str(tmp_path / 'valid.csv'), 'false')
+    lines = (tmp_path / 'valid.csv').read_text().splitlines()
+    assert [x.split(',')[0] for x in lines[1:]] == ['h3k27me3_R1_T1', 'h3k27me3_R1_T2']
+
+
+def test_check_files_resolves_base_dir(tmp_path, capsys):
+    fastq_dir = tmp_path / 'reads'
+    fastq_dir.mkdir()
+    with gzip.open(str(fastq_dir / 'S1_R1.fastq.gz'), 'wt') as fout:
+        fout.write('@read1\nACGT\n+\nIIII\n')
+    (fastq_dir / 'S2_R1.fastq.gz').write_bytes(b'not gzip')
+    samplesheet = write_samplesheet(tmp_path, ['igg,1,S1_R1.fastq.gz,', 'igg,2,S2_R1.fastq.gz,', 'igg,3,S3_R1.fastq.gz,'])
+    with pytest.raises(SystemExit):
+        check_samplesheet(samplesheet, str(tmp_path / 'valid.csv'), 'true', check_files=True, base_dir=str(fastq_dir))
+    out = capsys.readouterr().out
+    assert 'S1_R1' not in out
+    assert 'not a valid gzip file' in out and 'does not exist' in out
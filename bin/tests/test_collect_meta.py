@@ -0,0 +1,26 @@
+import csv
+
+from collect_meta import collect_meta
+
+BT2_LOG = """1000 reads; of these:
+  1000 (100.00%) were paired; of these:
+    100 (10.00%) aligned concordantly 0 times
+    800 (80.00%) aligned concordantly exactly 1 time
+    100 (10.00%) aligned concordantly >1 times
+90.00% overall alignment rate
+"""
+
+
+def test_reports_only_annotate_meta_ids(tmp_path, capsys):
+    meta = tmp_path / 'meta.csv'
+    meta.write_text('id,group\nh3k27me3_R1,h3k27me3\n')
+    for sample_id in ['h3k27me3_R1', 'h3k4me3_R1']:
+        (tmp_path / (sample_id + '.target.bowtie2.log')).write_text(BT2_LOG)
+
+    output = tmp_path / 'collected.csv'
+    collect_meta(str(output), str(meta), str(tmp_path / '*.target.bowtie2.log'))
+    with open(output) as fin:
+        rows = list(csv.DictReader(fin))
+    assert [x['id'] for x in rows] == ['h3k27me3_R1']
+    assert rows[0]['bt2_total_aligned_target'] == '900'
+    assert 'h3k4me3_R1' in capsys.readouterr().out
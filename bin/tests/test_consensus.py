@@ -0,0 +1,49 @@
+from lib.consensus import consensus_count_matrix, consensus_peaks
+from lib.fragment_file import bam_to_fragment_file
+
+
+def write_peaks(tmp_path, sample_id, peaks):
+    path = tmp_path / (sample_id + '.peaks.bed')
+    path.write_text(''.join(['{0}\t{1}\t{2}\t10\t1\t{0}:{1}-{2}\n'.format(*x) for x in peaks]))
+    return str(path)
+
+
+def test_sweep_merges_book_ended_and_nested_peaks(tmp_path):
+    paths = [
+        write_peaks(tmp_path, 'h3k27me3_R1', [('chr1', 100, 200), ('chr1', 200, 300), ('chr1', 400, 1000), ('chr2', 10, 20)]),
+        # nested in 400-1000, and one base clear of it
+        write_peaks(tmp_path, 'h3k27me3_R2', [('chr1', 450, 500), ('chr1', 1001, 1100)])
+    ]
+    consensus = consensus_peaks(paths)
+    assert consensus[['chrom', 'start', 'end', 'support']].values.tolist() == [
+        ['chr1', 100, 300, 1], ['chr1', 400, 1000, 2], ['chr1', 1001, 1100, 1], ['chr2', 10, 20, 1]]
+    assert consensus['name'].tolist()[0] == 'chr1:100-300'
+
+
+def test_min_replicates_counts_replicates_within_a_group(tmp_path):
+    paths = [
+        write_peaks(tmp_path, 'h3k27me3_R1', [('chr1', 100, 200), ('chr1', 500, 600), ('chr1', 900, 950)]),
+        write_peaks(tmp_path, 'h3k27me3_R2', [('chr1', 150, 250), ('chr1', 920, 940)]),
+        write_peaks(tmp_path, 'h3k4me3_R1', [('chr1', 520, 580)])
+    ]
+    # 500-600 has two samples but only one replicate of each group
+    consensus = consensus_peaks(paths, min_replicates=2)
+    assert consensus[['start', 'end', 'support']].values.tolist() == [[100, 250, 2], [900, 950, 2]]
+    assert len(consensus_peaks(paths, min_replicates=3)) == 0
+
+
+def test_count_matrix_columns_with_uneven_replicates(tmp_path, bam_writer):
+    samples = {'h3k27me3_R10': 3, 'h3k27me3_R2': 2, 'h3k27me3_R1': 1, 'h3k4me3_R1': 4}
+    peak_paths, sample_paths = list(), list()
+    for sample_id, n in samples.items():
+        peak_paths.append(write_peaks(tmp_path, sample_id, [('chr1', 1000, 2000)]))
+        bam = bam_writer(tmp_path / (sample_id + '.bam'), [(str(i), 'chr1', 1000 + 10 * i, 1200) for i in range(n)] + [('out', 'chr1', 5000, 5100)])
+        sample_paths.append(str(tmp_path / (sample_id + '.fragments.tsv.gz')))
+        bam_to_fragment_file(bam, sample_paths[-1], sample_id)
+    # a sample without peaks is not counted
+    igg = bam_writer(tmp_path / 'igg_R1.bam', [('a', 'chr1', 1000, 1200)])
+
+    consensus, matrix = consensus_count_matrix(peak_paths, sample_paths + [igg])
+    assert list(matrix.columns) == ['chrom', 'start', 'end', 'name', 'h3k27me3_R1', 'h3k27me3_R2', 'h3k27me3_R10', 'h3k4me3_R1']
+    assert matrix.iloc[0, 4:].tolist() == [1, 2, 3, 4]
+    assert consensus['support'].tolist() == [4]
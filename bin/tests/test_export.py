@@ -0,0 +1,29 @@
+import logging
+import pandas as pd
+import pytest
+
+from lib import export
+
+
+def test_columnar_fallback_is_recorded(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(export, 'columnar_available', lambda: False)
+    data = {'peak_widths': pd.DataFrame({'group': ['a', 'b'], 'peak_width': [100, 200]})}
+    with caplog.at_level(logging.WARNING):
+        manifest = export.export_data(data, str(tmp_path), 'parquet', logging.getLogger('test'))
+    assert manifest['requested_format'] == 'parquet'
+    assert manifest['datasets']['peak_widths']['file'] == 'peak_widths.csv'
+    assert 'pyarrow is not installed' in caplog.text
+
+
+def test_auto_format_follows_pyarrow(tmp_path, monkeypatch, recwarn):
+    data = {'peak_widths': pd.DataFrame({'group': ['a', 'b'], 'peak_width': [100, 200]})}
+    monkeypatch.setattr(export, 'columnar_available', lambda: False)
+    manifest = export.export_data(data, str(tmp_path), 'auto')
+    assert manifest['datasets']['peak_widths']['format'] == 'csv'
+    assert 'warnings' not in manifest and len(recwarn) == 0
+
+    pytest.importorskip('pyarrow')
+    monkeypatch.undo()
+    manifest = export.export_data(data, str(tmp_path), 'auto')
+    assert manifest['requested_format'] == 'auto'
+    assert manifest['datasets']['peak_widths']['format'] == 'parquet'
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fastq_download
+from fastq_download import download_file, PART_SUFFIX
+
+DATA = bytes(range(256)) * 64
+MD5 = hashlib.md5(DATA).hexdigest()
+
+
+class Handler(BaseHTTPRequestHandler):
+    # responses to corrupt before serving the real data, and every Range header seen
+    corrupt = 0
+    ranges = []
+
+    def do_GET(self):
+        header = self.headers.get('Range')
+        type(self).ranges.append(header)
+        start = int(header.split('=')[1].rstrip('-')) if header else 0
+        if start >= len(DATA):
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */{}'.format(len(DATA)))
+            self.end_headers()
+            return
+        body = DATA[start:]
+        if type(self).corrupt > 0:
+            type(self).corrupt -= 1
+            body = bytes(len(body))
+        self.send_response(206 if header else 200)
+        if header:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(DATA) - 1, len(DATA)))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    Handler.corrupt = 0
+    Handler.ranges = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}/reads.fastq.gz'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def check_complete(file_out):
+    assert not os.path.exists(file_out + PART_SUFFIX)
+    with open(file_out, 'rb') as fin:
+        assert fin.read() == DATA
+    with open(file_out + '.md5') as fin:
+        assert fin.read() == '{}  {}\n'.format(MD5, os.path.basename(file_out))
+
+
+def test_download_is_moved_into_place(url, tmp_path):
+    file_out = str(tmp_path / 'reads.fastq.gz')
+    download_file(url, MD5, file_out)
+    check_complete(file_out)
+    assert Handler.ranges == [None]
+
+
+def test_partial_download_is_resumed(url, tmp_path):
+    file_out = str(tmp_path / 'reads.fastq.gz')
+    with open(file_out + PART_SUFFIX, 'wb') as fout:
+        fout.write(DATA[:1000])
+    download_file(url, MD5, file_out)
+    check_complete(file_out)
+    assert Handler.ranges == ['bytes=1000-']
+
+
+def test_complete_partial_download_is_not_fetched_again(url, tmp_path):
+    file_out = str(tmp_path / 'reads.fastq.gz')
+    with open(file_out + PART_SUFFIX, 'wb') as fout:
+        fout.write(DATA)
+    download_file(url, MD5, file_out)
+    check_complete(file_out)
+    assert Handler.ranges == ['bytes={}-'.format(len(DATA))]
+
+
+def test_md5_mismatch_is_retried(url, tmp_path):
+    Handler.corrupt = 1
+    file_out = str(tmp_path / 'reads.fastq.gz')
+    download_file(url, MD5, file_out, retries=1)
+    check_complete(file_out)
+    assert Handler.ranges == [None, None]
+
+
+def test_md5_mismatch_leaves_no_file(url, tmp_path):
+    Handler.corrupt = 2
+    file_out = str(tmp_path / 'reads.fastq.gz')
+    with pytest.raises(IOError):
+        download_file(url, MD5, file_out, retries=1)
+    assert not os.path.exists(file_out) and not os.path.exists(file_out + PART_SUFFIX)
+
+
+def test_max_time_resumes_transfer(url, tmp_path, monkeypatch):
+    # every attempt stops after its first chunk and the next one resumes from there
+    monkeypatch.setattr(fastq_download, 'CHUNK_SIZE', 4096)
+    monkeypatch.setattr(fastq_download.time, 'sleep', lambda x: None)
+    file_out = str(tmp_path / 'reads.fastq.gz')
+    download_file(url, MD5, file_out, retries=10, max_time=1e-9)
+    check_complete(file_out)
+    assert Handler.ranges == [None, 'bytes=4096-', 'bytes=8192-', 'bytes=12288-', 'bytes=16384-']
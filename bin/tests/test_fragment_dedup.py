@@ -0,0 +1,34 @@
+import pysam
+
+from lib.fragments import dedup_fragments
+
+# Three copies of one fragment, two distinct fragments sharing its start, and a pair whose
+# read 2 comes first in the file with a copy of it. MarkDuplicates keeps one read pair of each
+# set of pairs with the same 5' ends and orientation, so it flags 3 of these 7 pairs.
+PAIRS = [('a', 'chr1', 100, 300), ('b', 'chr1', 100, 300), ('c', 'chr1', 100, 300), ('d', 'chr1', 100, 250),
+    ('e', 'chr1', 1000, 1250), ('f', 'chr1', 5000, 4800), ('g', 'chr1', 5000, 4800)]
+
+
+def flagged(path):
+    with pysam.AlignmentFile(path, 'rb') as bamfile:
+        reads = [(x.query_name, x.is_duplicate) for x in bamfile]
+    return sorted(set([x for x, y in reads if y])), len(reads)
+
+
+def test_metrics_and_flags_match_markduplicates(tmp_path, bam_writer):
+    bam = bam_writer(tmp_path / 'sample.bam', PAIRS)
+    metrics = dedup_fragments(bam, str(tmp_path / 'metrics.txt'), str(tmp_path / 'marked.bam'))
+    assert metrics['READ_PAIRS_EXAMINED'] == 7
+    assert metrics['READ_PAIR_DUPLICATES'] == 3
+    assert metrics['UNPAIRED_READS_EXAMINED'] == 0
+    assert metrics['PERCENT_DUPLICATION'] == 0.428571
+
+    # Picard solves c / x = 1 - exp(-n / x) for 4 unique of 7 pairs, x = 5.6, and truncates it
+    assert metrics['ESTIMATED_LIBRARY_SIZE'] == 5
+
+    # both mates of a duplicate are flagged, the first copy in the file is kept
+    names, n_reads = flagged(str(tmp_path / 'marked.bam'))
+    assert names == ['b', 'c', 'g'] and n_reads == 14
+
+    dedup_fragments(bam, str(tmp_path / 'metrics.txt'), str(tmp_path / 'dedup.bam'), remove_duplicates=True)
+    assert flagged(str(tmp_path / 'dedup.bam')) == ([], 8)
@@ -0,0 +1,36 @@
+import numpy as np
+import pysam
+
+from lib.fragments import MATE_BUFFER_SIZE, bam_to_fragments, pair_fragments
+from lib.fragment_file import frags_bin_counts
+
+
+def test_duplicates_are_optional(tmp_path, bam_writer):
+    bam = bam_writer(tmp_path / 'sample.bam', [('a', 'chr1', 100, 200), ('b', 'chr1', 100, 200, True)])
+    assert len(bam_to_fragments(bam)[1]) == 1
+    _, starts, ends = bam_to_fragments(bam, skip_duplicates=False)
+    assert starts.tolist() == [100, 100] and ends.tolist() == [249, 249]
+
+
+def test_bins_leave_out_long_fragments():
+    frags = {'chrom': np.array(['chr1'] * 3), 'start': np.array([0, 0, 0]), 'end': np.array([300, 999, 1000]), 'count': np.array([1, 2, 4])}
+    assert frags_bin_counts(frags, 500).sum() == 3
+    assert frags_bin_counts(frags, 500, None).sum() == 7
+
+
+def test_pairing_does_not_depend_on_buffer_size(tmp_path, bam_writer):
+    pairs = [('t' + str(i), 'chr1', 100 + 20 * i, 300 + 35 * i) for i in range(40)]
+    bam = bam_writer(tmp_path / 'sample.bam', pairs)
+    with pysam.AlignmentFile(bam, 'rb') as bamfile:
+        reads = list(bamfile.fetch('chr1'))
+    # every fifth template loses one of its reads to the duplicate filter, alternating which one
+    for read in reads:
+        index = int(read.query_name[1:])
+        if index % 5 == 0 and read.is_read1 == (index % 10 == 0):
+            read.is_duplicate = True
+    expected = sorted((100 + 20 * i, 349 + 35 * i) for i in range(40) if i % 5 != 0)
+
+    for coordinate_sorted, ordered in [(True, reads), (False, reads[::-1])]:
+        for max_buffer in [1, 3, 10, MATE_BUFFER_SIZE]:
+            _, starts, ends = pair_fragments(ordered, max_buffer=max_buffer, coordinate_sorted=coordinate_sorted)
+            assert sorted(zip(starts.tolist(), ends.tolist())) == expected
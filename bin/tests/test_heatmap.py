@@ -0,0 +1,63 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from lib.heatmap import cluster_order, group_correlation, heatmap_pages
+
+
+def brute_force_order(corr):
+    # average linkage on 1 - correlation, recomputing every cluster distance from the samples
+    dist = 1 - np.nan_to_num(corr, nan=0.0)
+    clusters = dict([(i, [i]) for i in range(corr.shape[0])])
+    while len(clusters) > 1:
+        a, b = min(itertools.combinations(sorted(clusters), 2), key=lambda x: dist[np.ix_(clusters[x[0]], clusters[x[1]])].mean())
+        clusters[a] = clusters[a] + clusters.pop(b)
+    return list(clusters.values())[0]
+
+
+def block_corr(rng, sizes):
+    # samples correlate through their group's signal plus noise
+    signal = np.concatenate([np.repeat(rng.normal(size=(1, 200)), n, axis=0) for n in sizes])
+    return np.corrcoef(signal + rng.normal(scale=0.8, size=signal.shape))
+
+
+def test_cluster_order_matches_average_linkage():
+    rng = np.random.default_rng(9)
+    for sizes in [[3, 4, 2], [1, 6], [5]]:
+        corr = block_corr(rng, sizes)
+        corr[0, 1] = corr[1, 0] = np.nan
+        assert cluster_order(corr).tolist() == brute_force_order(corr)
+    assert cluster_order(np.zeros((0, 0))).tolist() == []
+
+
+def test_cluster_order_keeps_groups_together():
+    rng = np.random.default_rng(10)
+    corr = block_corr(rng, [4, 4, 4])
+    shuffle = rng.permutation(12)
+    order = cluster_order(corr[np.ix_(shuffle, shuffle)])
+    assert sorted(order.tolist()) == list(range(12))
+    groups = shuffle[order] // 4
+    assert (np.diff(groups) != 0).sum() == 2
+
+
+def test_group_correlation():
+    corr = np.array([
+        [1.0, 0.8, 0.2, np.nan],
+        [0.8, 1.0, 0.4, 0.1],
+        [0.2, 0.4, 1.0, 0.6],
+        [np.nan, 0.1, 0.6, 1.0]
+    ])
+    summary = group_correlation(corr, ['a', 'a', 'b', 'b'])
+    expected = pd.DataFrame([[0.8, (0.2 + 0.4 + 0.1) / 3], [(0.2 + 0.4 + 0.1) / 3, 0.6]], index=['a', 'b'], columns=['a', 'b'])
+    pd.testing.assert_frame_equal(summary, expected)
+    # a group of one sample has nothing to correlate with but the other groups
+    summary = group_correlation(corr, ['a', 'a', 'a', 'c'])
+    assert np.isnan(summary.loc['c', 'c']) and summary.loc['a', 'c'] == (0.1 + 0.6) / 2
+
+
+def test_heatmap_pages():
+    corr = pd.DataFrame(np.eye(7))
+    pages = heatmap_pages(corr, page_size=3)
+    assert [x.shape for x in pages] == [(3, 7), (3, 7), (1, 7)]
+    pd.testing.assert_frame_equal(pd.concat(pages), corr)
@@ -0,0 +1,34 @@
+import json
+import re
+
+import pandas as pd
+import pytest
+
+from lib import html_report
+from lib.export import export_data
+
+
+@pytest.fixture
+def report(tmp_path):
+    data = {'peak_widths': pd.DataFrame({'group': ['a, b'] * 240, 'replicate': [1, 2] * 120, 'peak_width': range(240)})}
+    manifest = export_data(data, str(tmp_path), 'csv')
+    return str(tmp_path), data, manifest
+
+
+def test_plotly_is_inlined_and_previews_embedded(report, monkeypatch):
+    monkeypatch.setattr(html_report, 'plotly_bundle', lambda: 'var Plotly = {};')
+    with open(html_report.write_html_report(*report)) as fin:
+        page = fin.read()
+    assert 'var Plotly = {};' in page and html_report.PLOTLY_JS not in page
+    previews = json.loads(re.search(r'<script id="previews" type="application/json">(.*?)</script>', page).group(1))
+    assert previews['peak_widths']['columns'] == ['group', 'replicate', 'peak_width']
+    assert len(previews['peak_widths']['rows']) == html_report.PREVIEW_ROWS
+    assert previews['peak_widths']['rows'][1] == ['a, b', 2, 1]
+
+
+def test_cdn_fallback_warns(report, monkeypatch):
+    monkeypatch.setattr(html_report, 'plotly_bundle', lambda: None)
+    with pytest.warns(UserWarning, match='plotly'):
+        path = html_report.write_html_report(*report)
+    with open(path) as fin:
+        assert html_report.PLOTLY_JS in fin.read()
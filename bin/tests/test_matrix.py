@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from lib.matrix import binned_means, compute_matrix, matrix_header, read_matrix, write_matrix
+
+
+def brute_force_means(values, lo, hi):
+    means = np.full(lo.shape, np.nan)
+    for i in np.ndindex(lo.shape):
+        if lo[i] < 0 or hi[i] > len(values) or hi[i] <= lo[i]:
+            continue
+        covered = values[lo[i]:hi[i]][values[lo[i]:hi[i]] != 0]
+        if len(covered):
+            means[i] = covered.mean()
+    return means
+
+
+def regions(rows):
+    return pd.DataFrame(rows, columns=['chrom', 'start', 'end', 'name', 'score', 'strand'])
+
+
+def test_binned_means_match_brute_force():
+    rng = np.random.default_rng(5)
+    values = rng.random(5000).astype(np.float32) * (rng.random(5000) > 0.4)
+    values[2000:2600] = 0
+    lo = rng.integers(-50, 5000, (40, 7))
+    hi = lo + rng.integers(-5, 200, (40, 7))
+    np.testing.assert_allclose(binned_means(values, lo, hi), brute_force_means(values, lo, hi), rtol=1e-6)
+
+
+def test_minus_strand_rows_run_five_to_three_prime():
+    coverage = {'chr1': np.arange(1, 2001, dtype=np.float32)}
+    rows = regions([['chr1', 800, 1200, 'plus', '.', '+'], ['chr1', 800, 1200, 'minus', '.', '-']])
+    for mode, body in [('scale-regions', 400), ('reference-point', 0)]:
+        _, matrix = compute_matrix(coverage, rows, mode, 200, 200, body, 50, 'center')
+        np.testing.assert_allclose(matrix[1], matrix[0][::-1])
+    # the minus strand TSS is the region end
+    _, matrix = compute_matrix(coverage, rows, 'reference-point', 100, 100, 0, 100)
+    assert matrix.tolist() == [[750.5, 850.5], [1250.5, 1150.5]]
+
+
+def test_regions_shorter_than_the_body():
+    coverage = {'chr1': np.ones(1000, dtype=np.float32)}
+    rows = regions([['chr1', 500, 503, 'short', '.', '+'], ['chr1', 100, 400, 'long', '.', '+']])
+    kept, matrix = compute_matrix(coverage, rows, 'scale-regions', 0, 0, 100, 10)
+    # every region gets the same bins, and a 3bp body spreads its bases over 3 of them
+    assert matrix.shape == (2, 10)
+    assert np.isfinite(matrix[0]).sum() == 3 and np.isfinite(matrix[1]).all()
+
+
+def test_skip_zeros_drops_regions_without_signal():
+    coverage = {'chr1': np.zeros(1000, dtype=np.float32), 'chr2': np.ones(10, dtype=np.float32)}
+    coverage['chr1'][600:700] = 2
+    rows = regions([['chr1', 100, 200, 'empty', '.', '+'], ['chr1', 600, 700, 'peak', '.', '+'], ['chr3', 0, 10, 'absent', '.', '+']])
+    kept, matrix = compute_matrix(coverage, rows, 'reference-point', 0, 100, 0, 50, 'TSS', skip_zeros=True)
+    assert kept['name'].tolist() == ['peak'] and matrix.tolist() == [[2, 2]]
+    kept, _ = compute_matrix(coverage, rows, 'reference-point', 0, 100, 0, 50, 'TSS')
+    assert kept['name'].tolist() == ['empty', 'peak']
+
+
+def test_matrix_file_round_trip(tmp_path):
+    rows = regions([['chr1', 100, 200, 'a', '0', '+'], ['chr2', 5, 50, 'b', '.', '-']])
+    matrix = np.array([[1.5, np.nan, 0.25], [np.nan, 3, 1e-5]])
+    header = matrix_header('scale-regions', 10, 10, 10, 10, 'TSS', True, 2, 3, 'h3k27me3_R1', 'genes.bed')
+    header_in, rows_in, matrix_in = read_matrix(write_matrix(str(tmp_path / 'sample.mat.gz'), rows, matrix, header))
+    assert header_in == header
+    assert header_in['ref point'] == [None] and header_in['sample_boundaries'] == [0, 3]
+    pd.testing.assert_frame_equal(rows_in, rows)
+    np.testing.assert_array_equal(matrix_in, matrix)
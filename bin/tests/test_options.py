@@ -0,0 +1,16 @@
+import pytest
+
+from lib.options import parse_preview
+
+
+def test_parse_preview_fraction_and_count():
+    assert parse_preview('0.3') == 0.3
+    assert parse_preview('1') == 1.0
+    assert parse_preview('5000') == 5000
+    assert isinstance(parse_preview('5e3'), int)
+
+
+@pytest.mark.parametrize('value', ['0', '-1', '2.5'])
+def test_parse_preview_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_preview(value)
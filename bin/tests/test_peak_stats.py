@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.peak_stats import PeakStats
+
+
+def random_peaks():
+    rng = np.random.default_rng(6)
+    rows = list()
+    for group, n_reps in [('h3k27me3', 3), ('h3k4me3', 2)]:
+        for r in range(n_reps):
+            n = int(rng.integers(30, 60))
+            starts = rng.integers(0, 50000, n)
+            rows.append(pd.DataFrame({'chrom': rng.choice(['chr1', 'chr2', 'chr3'], n), 'start': starts,
+                'end': starts + rng.integers(100, 3000, n), 'total_signal': rng.random(n) * 100, 'max_signal': rng.random(n) * 10,
+                'group': group, 'replicate': 'R' + str(r + 1)}))
+    peaks = pd.concat(rows).sample(frac=1, random_state=1).reset_index(drop=True)
+    peaks['summit'] = peaks['start'] + (peaks['end'] - peaks['start']) // 3
+    return peaks
+
+
+def masked(peaks, group, replicate):
+    # the per-sample masks over every peak that PeakStats replaced
+    return peaks[(peaks['group'] == group) & (peaks['replicate'] == replicate)]
+
+
+def test_partitions_match_masks():
+    peaks = random_peaks()
+    stats = PeakStats(peaks)
+    # h3k4me3 has no third replicate, so it gets an empty partition
+    assert sorted(map(tuple, stats.samples.values.tolist())) == [(g, r) for g in ['h3k27me3', 'h3k4me3'] for r in ['R1', 'R2', 'R3']]
+    counts = stats.peak_counts()
+    for _, row in counts.iterrows():
+        expected = masked(peaks, row['group'], row['replicate'])
+        actual = stats.sample_peaks(row['group'], row['replicate'])
+        assert row['all_peaks'] == expected.shape[0] == actual.shape[0]
+        # chromosomes are in order of first appearance, starts sorted within each
+        assert (actual.groupby('chrom', sort=False)['start'].diff().dropna() >= 0).all()
+        pd.testing.assert_frame_equal(actual[expected.columns].sort_values(['chrom', 'start', 'end']).reset_index(drop=True),
+            expected.sort_values(['chrom', 'start', 'end']).reset_index(drop=True))
+    assert stats.sample_peaks('h3k4me3', 'R3').shape[0] == 0
+    assert stats.sample_peaks('igg', 'R1').shape[0] == 0
+
+
+def test_quantiles_and_chrom_distribution_match_masks():
+    peaks = random_peaks()
+    stats = PeakStats(peaks)
+    quantiles = stats.quantiles().set_index(['group', 'replicate'])
+    distribution = stats.chrom_distribution()
+    for (group, replicate), row in quantiles.iterrows():
+        expected = masked(peaks, group, replicate)
+        if expected.shape[0] == 0:
+            assert row.isna().all()
+            continue
+        assert row['peak_width_q50'] == (expected['end'] - expected['start']).quantile(0.5)
+        assert row['total_signal_q95'] == expected['total_signal'].quantile(0.95)
+        assert row['summit_offset_q25'] == (expected['summit'] - (expected['start'] + expected['end']) // 2).quantile(0.25)
+        chroms = distribution[(distribution['group'] == group) & (distribution['replicate'] == replicate)].set_index('chrom')
+        assert chroms['peaks'].to_dict() == expected['chrom'].value_counts().to_dict()
+        assert chroms['percentage'].sum() == pytest.approx(100)
+
+
+def overlaps_any(peak, others):
+    return ((others['chrom'] == peak['chrom']) & (others['start'] < peak['end']) & (others['end'] > peak['start'])).any()
+
+
+def test_reproducibility_matches_masks():
+    peaks = random_peaks()
+    df = PeakStats(peaks).reproducibility().set_index(['group', 'replicate'])
+    for (group, replicate), row in df.iterrows():
+        sample = masked(peaks, group, replicate)
+        others = [masked(peaks, group, x) for x in peaks.loc[peaks['group'] == group, 'replicate'].unique() if x != replicate]
+        expected = sum([all([overlaps_any(peak, x) for x in others]) for _, peak in sample.iterrows()])
+        assert row['no_peaks_reproduced'] == expected
+    # the group without a third replicate is compared between the two it has
+    assert df.loc[('h3k4me3', 'R1'), 'no_peaks_reproduced'] > 0
@@ -0,0 +1,44 @@
+import numpy as np
+
+from lib.fragment_file import bam_to_fragment_file
+from lib.regions import RegionSet, SampleFragments, count_regions
+
+
+def brute_force_counts(regions, chroms, starts, ends, counts):
+    # half-open intervals overlap when each starts before the other ends
+    return np.array([counts[(chroms == c) & (starts < e) & (ends > s)].sum() for c, s, e in regions[['chrom', 'start', 'end']].values])
+
+
+def test_counts_match_brute_force():
+    rng = np.random.default_rng(3)
+    chroms = rng.choice(['chr1', 'chr2'], 500)
+    starts = rng.integers(0, 5000, 500)
+    ends = starts + rng.integers(1, 400, 500)
+    counts = rng.integers(1, 4, 500)
+    # overlapping, nested and book-ended regions, plus one on a chromosome without fragments
+    region_starts = np.append(rng.integers(0, 5000, 60), [1000, 1100, 1500, 0])
+    region_ends = np.append(region_starts[:60] + rng.integers(1, 800, 60), [1500, 1200, 2000, 10])
+    region_chroms = np.append(rng.choice(['chr1', 'chr2'], 60), ['chr1', 'chr1', 'chr1', 'chr3'])
+    region_set = RegionSet('regions', region_chroms, region_starts, region_ends)
+    sample = SampleFragments('sample', chroms, starts, ends, counts)
+
+    expected = brute_force_counts(region_set.regions, chroms, starts, ends, counts)
+    assert sample.count(region_set).tolist() == expected.tolist()
+
+    in_any = np.array([((region_chroms == c) & (region_starts < e) & (region_ends > s)).any() for c, s, e in zip(chroms, starts, ends)])
+    assert sample.fraction_in(region_set) == counts[in_any].sum() / counts.sum()
+
+
+def test_bam_and_fragments_file_count_alike(tmp_path, bam_writer):
+    # 'b' repeats the coordinates of 'a' and is flagged as its duplicate
+    pairs = [('a', 'chr1', 100, 300), ('b', 'chr1', 100, 300, True), ('c', 'chr1', 1000, 1200)]
+    bam = bam_writer(tmp_path / 'h3k27me3_R1.bam', pairs)
+    fragments = str(tmp_path / 'h3k27me3_R1.fragments.tsv.gz')
+    bam_to_fragment_file(bam, fragments, 'h3k27me3_R1')
+    # the second region starts on the base after the shared fragment ends
+    region_set = RegionSet('regions', ['chr1', 'chr1'], [0, 350], [120, 1000])
+
+    for keep_duplicates, expected in [(False, [1, 0]), (True, [2, 0])]:
+        from_bam, _ = count_regions([region_set], [bam], keep_duplicates=keep_duplicates)
+        from_fragments, _ = count_regions([region_set], [fragments], keep_duplicates=keep_duplicates)
+        assert from_bam['regions']['h3k27me3_R1'].tolist() == from_fragments['regions']['h3k27me3_R1'].tolist() == expected
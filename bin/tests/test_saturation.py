@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from lib.fragments import estimate_library_size
+from lib.saturation import expected_unique, frame_multiplicity_hist, lander_waterman_unique, merge_multiplicity_hists, multiplicity_hist, saturation_curve
+
+
+def sample_hist():
+    rng = np.random.default_rng(11)
+    # fragments drawn with replacement from a finite library, so some are seen several times
+    return multiplicity_hist(np.bincount(rng.integers(0, 20000, 30000))[1:])
+
+
+def test_expected_unique_at_full_depth_is_unique():
+    hist = sample_hist()
+    assert expected_unique(hist, [1.0])[0] == hist[1:].sum()
+    assert expected_unique(hist, [0.0])[0] == 0
+    # one fragment seen twice survives half the reads with probability 3/4
+    np.testing.assert_allclose(expected_unique(np.array([0, 0, 1]), [0.5]), [0.75])
+
+
+def test_expected_unique_matches_subsampling():
+    rng = np.random.default_rng(2)
+    counts = rng.integers(1, 6, 2000)
+    reads = np.repeat(np.arange(len(counts)), counts)
+    observed = np.mean([len(np.unique(reads[rng.random(len(reads)) < 0.3])) for _ in range(200)])
+    expected = expected_unique(multiplicity_hist(counts), [0.3])[0]
+    assert abs(observed - expected) / expected < 0.01
+
+
+def test_curve_is_continuous_at_sequenced_depth():
+    hist = sample_hist()
+    total, unique = int((np.arange(len(hist)) * hist).sum()), int(hist[1:].sum())
+    curve = saturation_curve(hist, n_points=50)
+    at_depth = curve[curve['depth'] == total]
+    assert len(at_depth) == 1 and not at_depth['extrapolated'].item()
+    assert at_depth['unique_frags'].item() == unique
+    # the model for the estimated library size passes within a fragment of the observed unique count
+    assert abs(lander_waterman_unique(total, estimate_library_size(total, unique)) - unique) < 1
+    assert (np.diff(curve['unique_frags']) > 0).all()
+
+    # from totals alone, as with Picard metrics, the model runs through the same point
+    picard = saturation_curve(total=total, unique=unique, n_points=50)
+    assert abs(picard.loc[picard['depth'] == total, 'unique_frags'].item() - unique) < 1
+
+
+def test_curve_without_duplicates_is_linear():
+    curve = saturation_curve(multiplicity_hist(np.ones(500, dtype=int)), max_fold=4, n_points=8)
+    np.testing.assert_allclose(curve['unique_frags'], curve['depth'])
+    assert curve['extrapolated'].tolist() == [False] * 2 + [True] * 6
+
+
+def test_multiplicity_hists():
+    df = pd.DataFrame({'Chromosome': ['chr1'] * 4 + ['chr2'], 'Start': [1, 1, 1, 5, 1], 'End': [9, 9, 9, 9, 9]})
+    assert frame_multiplicity_hist(df).tolist() == [0, 2, 0, 1]
+    assert merge_multiplicity_hists([np.array([0, 2, 0, 1]), np.array([0, 1, 1])]).tolist() == [0, 3, 1, 1]
+    assert merge_multiplicity_hists([]).tolist() == []
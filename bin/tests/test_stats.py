@@ -0,0 +1,71 @@
+import logging
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+
+from lib.fragment_file import bam_to_fragment_file
+from lib.intervals import IntervalIndex
+from lib.stats import wilson_interval, blacklist_frags, compute_sample_stats
+from lib.reports import Reports
+
+
+def test_wilson_interval_contains_proportion():
+    low, high = wilson_interval([0, 5, 10], [10, 10, 10])
+    p = np.array([0, 0.5, 1])
+    assert (low >= 0).all() and (high <= 1).all()
+    assert (low <= p).all() and (p <= high).all()
+    assert low[0] == 0 and high[2] == 1
+
+
+def test_preview_frip_plot_with_no_fragments_in_peaks():
+    # an IgG control sampled for a preview with no fragments in its peaks
+    reports = Reports(logging.getLogger('test'), None, None, None, None, None)
+    lens, counts = np.array([150, 300]), np.array([10, 5])
+    reports.set_frag_series_frip([
+        ('igg', 'R1', lens, counts, 1000, 0, 0.3),
+        ('h3k27me3', 'R1', lens, counts, 1000, 250, 0.3)
+    ])
+    assert reports.frip['percentage_ci_low'].iloc[0] == 0
+    reports.frags_in_peaks()
+
+
+def test_blacklist_frags_inclusive_end():
+    blacklist = IntervalIndex(['chr1'], [100], [200])
+    bam_df = pd.DataFrame({'Chromosome': ['chr1', 'chr1', 'chr1'], 'Start': [50, 50, 200], 'End': [99, 100, 250]})
+    kept = blacklist_frags(bam_df, blacklist)
+    # the fragment ending on the first blacklisted base overlaps it
+    assert kept['End'].tolist() == [99, 250]
+
+
+def test_fragments_file_with_duplicates_matches_bam(tmp_path, bam_writer):
+    # 'b' and 'd' repeat the coordinates of 'a' and 'c' and are flagged as their duplicates
+    pairs = [('a', 'chr1', 1000, 1100), ('b', 'chr1', 1000, 1100, True), ('c', 'chr1', 5000, 5200),
+        ('d', 'chr1', 5000, 5200, True), ('e', 'chr1', 8000, 8010)]
+    bam = bam_writer(tmp_path / 'h3k27me3_R1.bam', pairs)
+    fragments = str(tmp_path / 'h3k27me3_R1.fragments.tsv.gz')
+    bam_to_fragment_file(bam, fragments, 'h3k27me3_R1')
+    peaks = tmp_path / 'h3k27me3_R1.bed'
+    peaks.write_text('chr1\t900\t1200\t10\t1\tchr1:1000-1100\n')
+
+    from_bam = compute_sample_stats('h3k27me3_R1', bam=bam, seacr_bed=str(peaks))
+    from_fragments = compute_sample_stats('h3k27me3_R1', seacr_bed=str(peaks), fragments=fragments)
+    assert from_fragments['mapped_frags'] == from_bam['mapped_frags'] == 3
+    assert from_fragments['frags_in_peaks'] == from_bam['frags_in_peaks'] == 1
+    # lengths follow TLEN, like the fragment length histogram of the fragments file
+    assert from_bam['frag_len'].tolist() == from_fragments['frag_len'].tolist() == [60, 150, 250]
+    assert sorted(from_fragments['hist_size'].tolist()) == [60, 150, 250]
+    # duplicates still count towards the duplicate histogram of the fragments file
+    assert from_fragments['dup_hist'].tolist()[1:3] == [1, 2]
+
+
+def test_fingerprint_uses_raw_bin_counts():
+    reports = Reports(logging.getLogger('test'), None, None, None, None, None)
+    reports.set_frag_bin500([
+        ('h3k27me3_R1', pd.DataFrame({'chrom': ['chr1'] * 3, 'bin': [250, 750, 1250], 'count': [3, 1000001, 7]})),
+        ('h3k27me3_R2', pd.DataFrame({'chrom': ['chr1'], 'bin': [750], 'count': [5]}))
+    ])
+    assert reports.frag_bin500_counts['h3k27me3_R1'].tolist() == [3, 1000001, 7]
+    assert reports.frag_bin500_counts['h3k27me3_R2'].tolist() == [0, 5, 0]
+    _, _, metrics = reports.fingerprint()
+    assert metrics['zero_bins'].tolist() == [0, 2 / 3]
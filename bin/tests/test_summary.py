@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from lib.fragment_file import bam_to_fragment_file
+from lib.stats import compute_sample_stats
+from lib.summary import SUMMARY_VERSION, build_summary, merge_summaries, read_summary, write_summary, write_shard
+
+CHROMS = (('chr1', 50000), ('chr2', 50000))
+
+
+@pytest.fixture
+def stats(tmp_path, bam_writer):
+    rng = np.random.default_rng(3)
+    pairs = list()
+    for i in range(300):
+        start = int(rng.integers(0, 45000))
+        pairs.append(('r' + str(i), CHROMS[i % 2][0], start, start + int(rng.integers(0, 400))))
+    bam = bam_writer(tmp_path / 'h3k27me3_R1.bam', pairs, CHROMS)
+    fragments = str(tmp_path / 'h3k27me3_R1.fragments.tsv.gz')
+    bam_to_fragment_file(bam, fragments, 'h3k27me3_R1')
+    peaks = tmp_path / 'h3k27me3_R1.bed'
+    peaks.write_text('chr1\t1000\t16000\t10\t1\tchr1:2000-2100\n')
+    return compute_sample_stats('h3k27me3_R1', bam=bam, seacr_bed=str(peaks), fragments=fragments)
+
+
+def test_summary_round_trip(tmp_path, stats):
+    summary = build_summary(stats, {'id': 'h3k27me3_R1', 'group': 'h3k27me3', 'reads': np.int64(7), 'note': None}, run='run1', bin_width=5000)
+    path = str(tmp_path / 'h3k27me3_R1.summary.npz')
+    write_summary(path, summary)
+    actual = read_summary(path)
+    assert actual['summary_version'] == SUMMARY_VERSION and actual['run'] == 'run1' and actual['bin_width'] == 5000
+    assert actual['meta'] == {'id': 'h3k27me3_R1', 'group': 'h3k27me3', 'reads': 7, 'note': None}
+    for key in ['hist_size', 'hist_count', 'bin_pos', 'bin_count', 'peak_start', 'peak_end']:
+        np.testing.assert_array_equal(actual[key], summary[key])
+    assert actual['mapped_frags'] == stats['mapped_frags'] and actual['frags_in_peaks'] == stats['frags_in_peaks']
+    # coarsening keeps every fragment and puts bins at the centre of their window
+    assert actual['bin_count'].sum() == stats['bin_count'].sum()
+    assert set(actual['bin_pos'] % 5000) == {2500}
+
+
+def test_read_summary_checks_version(tmp_path, stats):
+    write_shard(str(tmp_path / 'stats.npz'), stats)
+    with pytest.raises(ValueError, match='Not a report summary'):
+        read_summary(str(tmp_path / 'stats.npz'))
+    summary = build_summary(stats)
+    summary['summary_version'] = SUMMARY_VERSION + 1
+    write_summary(str(tmp_path / 'newer.npz'), summary)
+    with pytest.raises(ValueError, match='newer than the supported version'):
+        read_summary(str(tmp_path / 'newer.npz'))
+
+
+def test_merge_summaries(tmp_path, stats):
+    paths = list()
+    for run, width in [('run1', 5000), ('run2', 10000)]:
+        paths.append(str(tmp_path / (run + '.summary.npz')))
+        write_summary(paths[-1], build_summary(stats, run=run, bin_width=width))
+    meta, summaries = merge_summaries([read_summary(x) for x in paths])
+
+    # clashing ids are prefixed with their run and bins coarsened to the widest summary
+    assert meta['id'].tolist() == ['run1-h3k27me3_R1', 'run2-h3k27me3_R1']
+    assert meta['group'].tolist() == ['run1-h3k27me3', 'run2-h3k27me3']
+    assert [x['bin_width'] for x in summaries] == [10000, 10000]
+    np.testing.assert_array_equal(summaries[0]['bin_pos'], summaries[1]['bin_pos'])
+    np.testing.assert_array_equal(summaries[0]['bin_count'], summaries[1]['bin_count'])
+
+    with pytest.raises(ValueError, match='Duplicate sample ids'):
+        merge_summaries([read_summary(paths[0]), read_summary(paths[0])])
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.fragment_file import FragmentFile, collapse_fragments, write_fragment_file
+from lib.tracks import CPM_SCALE, SIZE_CLASSES, write_tracks
+
+CHROM_SIZES = {'chr1': 3000, 'chr2': 2000}
+CLASSES = ['all', 'subnucleosomal', 'mononucleosomal', 'polynucleosomal']
+
+
+@pytest.fixture
+def fragments(tmp_path):
+    rng = np.random.default_rng(8)
+    chroms = rng.choice(['chr1', 'chr2'], 400)
+    starts = rng.integers(0, 1900, 400)
+    ends = starts + rng.integers(20, 400, 400)
+    # one fragment runs off the end of chr2
+    chroms[0], starts[0], ends[0] = 'chr2', 1900, 2150
+    df = collapse_fragments(chroms, starts, ends, ['chr1', 'chr2'])
+    return df, str(write_fragment_file(str(tmp_path / 'sample.fragments.tsv.gz'), df, 'sample'))
+
+
+def pileup(df, size_class, chrom):
+    low, high = SIZE_CLASSES[size_class]
+    coverage = np.zeros(CHROM_SIZES[chrom])
+    for _, frag in df[df['chrom'] == chrom].iterrows():
+        length = frag['end'] - frag['start']
+        if length >= low and (high is None or length < high):
+            coverage[frag['start']:frag['end']] += frag['count']
+    return coverage
+
+
+def read_track(path, chrom):
+    bedgraph = pd.read_csv(path, sep='\t', header=None, names=['chrom', 'start', 'end', 'value'])
+    coverage = np.zeros(CHROM_SIZES[chrom])
+    for _, interval in bedgraph[bedgraph['chrom'] == chrom].iterrows():
+        assert interval['value'] != 0
+        coverage[interval['start']:interval['end']] = interval['value']
+    return coverage
+
+
+@pytest.mark.parametrize('chunk_size', [1000000, 7])
+def test_tracks_match_pileup(tmp_path, fragments, chunk_size):
+    df, path = fragments
+    paths = write_tracks(FragmentFile(path), str(tmp_path / 'sample'), CLASSES, ['raw', 'spikein', 'cpm'], scale=0.5,
+        chrom_sizes=CHROM_SIZES, chunk_size=chunk_size)
+    assert len(paths) == 12
+    for size_class in CLASSES:
+        low, high = SIZE_CLASSES[size_class]
+        length = df['end'] - df['start']
+        total = df.loc[(length >= low) & ((length < high) if high is not None else True), 'count'].sum()
+        for chrom in CHROM_SIZES:
+            expected = pileup(df, size_class, chrom)
+            prefix = str(tmp_path / ('sample.' + size_class))
+            np.testing.assert_array_equal(read_track(prefix + '.raw.bedGraph', chrom), expected)
+            np.testing.assert_allclose(read_track(prefix + '.spikein.bedGraph', chrom), expected * 0.5)
+            np.testing.assert_allclose(read_track(prefix + '.cpm.bedGraph', chrom), expected * CPM_SCALE / total, rtol=1e-5)
+
+
+def test_cpm_tracks_sum_to_a_million_fragments(tmp_path, fragments):
+    df, path = fragments
+    write_tracks(FragmentFile(path), str(tmp_path / 'sample'), ['all'], ['cpm'])
+    bedgraph = pd.read_csv(str(tmp_path / 'sample.all.cpm.bedGraph'), sep='\t', header=None, names=['chrom', 'start', 'end', 'value'])
+    # without chromosome sizes nothing is clipped, so the area is a million times the mean fragment length
+    area = ((bedgraph['end'] - bedgraph['start']) * bedgraph['value']).sum()
+    mean_length = ((df['end'] - df['start']) * df['count']).sum() / df['count'].sum()
+    assert area == pytest.approx(CPM_SCALE * mean_length, rel=1e-5)
+
+
+def test_bigwig_needs_chrom_sizes(tmp_path, fragments):
+    with pytest.raises(ValueError, match='Chromosome sizes'):
+        write_tracks(FragmentFile(fragments[1]), str(tmp_path / 'sample'), bigwig=True)
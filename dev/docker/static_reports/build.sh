@@ -1,3 +1,3 @@
 #!/bin/bash
 
-docker build -f dev/docker/static_reports/Dockerfile -t luslab/cutandrun-dev-reporting:latest dev/docker/static_reports
+docker build -f dev/docker/static_reports/Dockerfile -t luslab/cutandrun-dev-reporting:latest -t luslab/cutandrun-dev-reporting:1.0.0 dev/docker/static_reports
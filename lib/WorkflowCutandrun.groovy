@@ -62,6 +62,19 @@ class WorkflowCutandrun {
         return yaml_file_text
     }
 
+    //
+    // Get the number of read pairs aligned by bowtie2 from its log text
+    //
+    public static Integer getBowtie2AlignedCount(String log_text) {
+        def aligned = 0
+        log_text.eachLine { line ->
+            if (line.contains("aligned concordantly exactly 1 time") || line.contains("aligned concordantly >1 times")) {
+                aligned += line.trim().tokenize(" ")[0].toInteger()
+            }
+        }
+        return aligned
+    }
+
     //
     // Exit pipeline if incorrect --genome key provided
     //
@@ -0,0 +1,41 @@
+include { initOptions; saveFiles; getSoftwareName } from './functions'
+
+params.options = [:]
+def options    = initOptions(params.options)
+
+/*
+ * Parse the aligner and duplication reports for all samples into one meta-data table
+ */
+process COLLECT_META {
+    label 'process_low'
+    publishDir "${params.outdir}",
+        mode: params.publish_dir_mode,
+        saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:getSoftwareName(task.process), publish_id:'') }
+
+    conda (params.enable_conda ? "conda-forge::python=3.8.3" : null)
+    if (workflow.containerEngine == 'singularity' && !params.singularity_pull_docker_container) {
+        container "https://depot.galaxyproject.org/singularity/python:3.8.3"
+    } else {
+        container "quay.io/biocontainers/python:3.8.3"
+    }
+
+    input:
+    path meta
+    path bt2_logs
+    path bt2_spikein_logs
+    path dedup_metrics
+
+    output:
+    path "meta_table_collected.csv", emit: csv
+
+    script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    """
+    collect_meta.py \\
+        meta_table_collected.csv \\
+        --meta $meta \\
+        --bt2_target "*.target.bowtie2.log" \\
+        --bt2_spikein "*.spikein.bowtie2.log" \\
+        --picard_dedup "*.MarkDuplicates.metrics.txt" \\
+        $options.args
+    """
+}
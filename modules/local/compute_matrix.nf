@@ -0,0 +1,35 @@
+include { initOptions; saveFiles; getSoftwareName } from './functions'
+
+params.options = [:]
+def options    = initOptions(params.options)
+
+/*
+ * Compute deeptools computeMatrix style matrices for a batch of coverage stores over the same regions
+ */
+process COMPUTE_MATRIX {
+    tag "$meta.id"
+    label 'process_medium'
+    publishDir "${params.outdir}",
+        mode: params.publish_dir_mode,
+        saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:getSoftwareName(task.process), publish_id:meta.id) }
+
+    container "luslab/cutandrun-dev-reporting:latest"
+
+    input:
+    tuple val(meta), path(coverage), path(bed)
+    path  sizes
+
+    output:
+    tuple val(meta), path("*.computeMatrix.mat.gz"), emit: matrix
+
+    script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    """
+    compute_matrix.py \\
+        $options.args \\
+        --regionsFileName $bed \\
+        --scoreFileName $coverage \\
+        --chrom_sizes $sizes \\
+        --outdir ./ \\
+        --numberOfProcessors $task.cpus
+    """
+}
@@ -0,0 +1,36 @@
+include { initOptions; saveFiles; getSoftwareName } from './functions'
+
+params.options = [:]
+def options    = initOptions(params.options)
+
+/*
+ * Merge the peaks of all samples into consensus peaks and count the fragments of each sample in them
+ */
+process CONSENSUS_COUNTS {
+    label 'process_medium'
+    publishDir "${params.outdir}",
+        mode: params.publish_dir_mode,
+        saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:getSoftwareName(task.process), publish_id:'') }
+
+    container "luslab/cutandrun-dev-reporting:latest"
+
+    input:
+    path peak_beds
+    path fragments
+
+    output:
+    path "consensus_peaks.bed"    , emit: bed
+    path "consensus_counts.tsv.gz", emit: counts
+
+    script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    def fragment_files = fragments.findAll { it.name.endsWith('.fragments.tsv.gz') }.join(' ')
+    """
+    consensus_counts.py \\
+        ./ \\
+        --peaks $peak_beds \\
+        --samples $fragment_files \\
+        --min_replicates $params.consensus_min_replicates \\
+        --threads $task.cpus \\
+        $options.args
+    """
+}
@@ -16,8 +16,7 @@ process DESEQ2_DIFF {
 
     input:
     val groups
-    path peak_beds
-    path bams
+    path count_matrix
 
     output:
     path "*.pdf"                , optional:true, emit: pdf
@@ -37,14 +36,11 @@ process DESEQ2_DIFF {
 
     // Convert to comma separated strings
     String str_groups = groups.join(",")
-    String str_beds = peak_beds.join(",")
-    String str_bams = bams.join(",")
 
     """
     deseq2_diff.r \\
         --groups $str_groups \\
-        --bed $str_beds \\
-        --bam $str_bams \\
+        --count_matrix $count_matrix \\
         --cores $task.cpus \\
         $options.args
 
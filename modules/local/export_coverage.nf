@@ -0,0 +1,33 @@
+include { initOptions; saveFiles; getSoftwareName } from './functions'
+
+params.options = [:]
+def options    = initOptions(params.options)
+
+/*
+ * Convert a bedGraph into a memory-mapped coverage store shared by downstream python steps
+ */
+process EXPORT_COVERAGE {
+    tag "$meta.id"
+    label 'process_low'
+    publishDir "${params.outdir}",
+        mode: params.publish_dir_mode,
+        saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:getSoftwareName(task.process), publish_id:meta.id) }
+
+    container "luslab/cutandrun-dev-reporting:latest"
+
+    input:
+    tuple val(meta), path(bedgraph)
+    path  sizes
+
+    output:
+    tuple val(meta), path("*.coverage.bin"), emit: coverage
+
+    script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    """
+    coverage_store.py \\
+        $bedgraph \\
+        ${meta.id}.coverage.bin \\
+        --chrom_sizes $sizes \\
+        $options.args
+    """
+}
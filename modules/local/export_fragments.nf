@@ -0,0 +1,34 @@
+include { initOptions; saveFiles; getSoftwareName } from './functions'
+
+params.options = [:]
+def options    = initOptions(params.options)
+
+/*
+ * Export the fragments of a BAM file to a bgzip-compressed, tabix-indexed fragments file
+ */
+process EXPORT_FRAGMENTS {
+    tag "$meta.id"
+    label 'process_medium'
+    publishDir "${params.outdir}",
+        mode: params.publish_dir_mode,
+        saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:getSoftwareName(task.process), publish_id:meta.id) }
+
+    container "luslab/cutandrun-dev-reporting:latest"
+
+    input:
+    tuple val(meta), path(bam), path(bai)
+
+    output:
+    tuple val(meta), path("*.fragments.tsv.gz"), path("*.fragments.tsv.gz.tbi"), emit: fragments
+
+    script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    """
+    reporting.py gen_fragments \\
+        --id $meta.id \\
+        --bam $bam \\
+        --threads $task.cpus \\
+        --output ${meta.id}.fragments.tsv.gz \\
+        --log ${meta.id}.log.txt \\
+        $options.args
+    """
+}
@@ -0,0 +1,38 @@
+include { initOptions; saveFiles; getSoftwareName } from './functions'
+
+params.options = [:]
+def options    = initOptions(params.options)
+
+/*
+ * Mark or remove fragment-level duplicates, a lightweight alternative to Picard MarkDuplicates
+ */
+process FRAGMENT_MARKDUPLICATES {
+    tag "$meta.id"
+    label 'process_medium'
+    publishDir "${params.outdir}",
+        mode: params.publish_dir_mode,
+        saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:getSoftwareName(task.process), publish_id:meta.id) }
+
+    container "luslab/cutandrun-dev-reporting:latest"
+
+    input:
+    tuple val(meta), path(bam)
+
+    output:
+    tuple val(meta), path("*.bam")        , emit: bam
+    tuple val(meta), path("*.metrics.txt"), emit: metrics
+    path  "*.version.txt"                 , emit: version
+
+    script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    def software = getSoftwareName(task.process)
+    def prefix   = options.suffix ? "${meta.id}${options.suffix}" : "${meta.id}"
+    """
+    fragment_dedup.py \\
+        $bam \\
+        ${prefix}.MarkDuplicates.metrics.txt \\
+        --output ${prefix}.bam \\
+        $options.args
+
+    python -c "import pysam; print(pysam.__version__)" > ${software}.version.txt
+    """
+}
@@ -0,0 +1,34 @@
+include { initOptions; saveFiles; getSoftwareName } from './functions'
+
+params.options = [:]
+def options    = initOptions(params.options)
+
+/*
+ * Write coverage tracks for several fragment length classes and normalisations from one pass over a fragments file
+ */
+process FRAGMENT_TRACKS {
+    tag "$meta.id"
+    label 'process_medium'
+    publishDir "${params.outdir}",
+        mode: params.publish_dir_mode,
+        saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:getSoftwareName(task.process), publish_id:meta.id) }
+
+    container "luslab/cutandrun-dev-reporting:latest"
+
+    input:
+    tuple val(meta), path(fragments), path(tbi)
+    path  sizes
+
+    output:
+    tuple val(meta), path("*.{bedGraph,bigWig}"), emit: tracks
+
+    script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    """
+    fragment_tracks.py \\
+        $fragments \\
+        $meta.id \\
+        --chrom_sizes $sizes \\
+        --scale $meta.scale_factor \\
+        $options.args
+    """
+}
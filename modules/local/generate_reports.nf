@@ -16,27 +16,33 @@ process GENERATE_REPORTS {
 
     input:
     path meta_data
-    path raw_fragments
-    path bed_fragments
-    path seacr_beds
-    path bam_bais
+    path stats
+    path genes
 
     output:
     path '*.pdf', emit: pdf
+    path '*.html', optional: true, emit: html
     path '*.csv', emit: csv
+    path '*.{parquet,feather}', optional: true, emit: data
+    path 'manifest.json', emit: manifest
+    path 'log.txt', emit: log
+    path '*.summary.npz', emit: summaries
     path '*.png', emit: png
     path '*.version.txt', emit: version
 
     script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    // Peaks are annotated against the gene BED when one is given in place of the dummy file
+    def gene_bed = genes.name != 'dummy_file.txt' ? "--genes $genes" : ""
     """
     reporting.py gen_reports \\
         --meta $meta_data \\
-        --raw_frag "*.frag_len.txt" \\
-        --bin_frag "*bin500.awk.bed" \\
-        --seacr_bed "*bed.*.bed" \\
-        --bams "*.bam" \\
+        --stats "*.stats.npz" \\
         --output . \\
-        --log log.txt
+        --write_summaries \\
+        $gene_bed \\
+        --run $workflow.runName \\
+        --log log.txt \\
+        $options.args
 
     python --version | grep -E -o \"([0-9]{1,}\\.)+[0-9]{1,}\" > python.version.txt
     """
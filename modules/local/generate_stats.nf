@@ -0,0 +1,39 @@
+include { initOptions; saveFiles; getSoftwareName } from './functions'
+
+params.options = [:]
+def options    = initOptions(params.options)
+
+/*
+ * Compute the compact per-sample statistics consumed by GENERATE_REPORTS
+ */
+process GENERATE_STATS {
+    tag "$meta.id"
+    label 'process_medium'
+    publishDir "${params.outdir}",
+        mode: params.publish_dir_mode,
+        saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:getSoftwareName(task.process), publish_id:meta.id) }
+
+    container "luslab/cutandrun-dev-reporting:latest"
+
+    input:
+    tuple val(meta), path(fragments), path(tbi), path(seacr_bed)
+    path blacklist
+
+    output:
+    tuple val(meta), path("*.stats.npz"), emit: stats
+
+    script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    // Samples without peaks (e.g. IgG) are given the dummy file in place of a peak bed
+    def peaks = seacr_bed.name != 'dummy_file.txt' ? "--seacr_bed $seacr_bed" : ""
+    """
+    reporting.py gen_stats \\
+        --id $meta.id \\
+        --fragments $fragments \\
+        $peaks \\
+        --blacklist $blacklist \\
+        --threads $task.cpus \\
+        --output ${meta.id}.stats.npz \\
+        --log ${meta.id}.log.txt \\
+        $options.args
+    """
+}
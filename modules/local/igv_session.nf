@@ -12,17 +12,20 @@ process IGV_SESSION {
         mode: params.publish_dir_mode,
         saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:'pipeline_info', publish_id:'') }
 
-    conda     (params.enable_conda ? "conda-forge::python=3.8.3" : null)
-    container "quay.io/biocontainers/python:3.8.3"
+    // pysam is needed to tabix-index tracks and the UCSC tools to convert them to bigBed/bigWig (see --igv_index_tracks).
+    // The pinned image is built from dev/docker/static_reports/environment.yml, which carries the same versions.
+    conda     (params.enable_conda ? "conda-forge::python=3.8.3 bioconda::pysam=0.16.0.1 bioconda::ucsc-bedtobigbed=377 bioconda::ucsc-bedgraphtobigwig=377" : null)
+    container "luslab/cutandrun-dev-reporting:1.0.0"
 
     input:
     path genome
     path gtf
+    path sizes
     path beds
     path bigwig
 
     output:
-    path('*.{txt,xml,bed,bigWig,fa,gtf}', includeInputs:true)
+    path('*.{txt,xml,bed,bigWig,fa,gtf,gz,tbi,bb}', includeInputs:true)
 
     script:
     output = ''
@@ -52,7 +55,14 @@ process IGV_SESSION {
     echo "$output" > exp_files.txt
     find -L * -iname "*.gtf" -exec echo -e {}"\\t0,48,73" \\; > gtf.igv.txt
     cat *.txt > igv_files.txt
-    igv_files_to_session.py igv_session.xml igv_files.txt $genome --path_prefix './'
+    igv_files_to_session.py \\
+        igv_session.xml \\
+        igv_files.txt \\
+        $genome \\
+        --path_prefix './' \\
+        --index_tracks $params.igv_index_tracks \\
+        --chrom_sizes $sizes \\
+        $options.args
     """
 }
 
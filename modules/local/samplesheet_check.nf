@@ -1,7 +1,8 @@
 // Import generic module functions
-include { saveFiles } from './functions'
+include { initOptions; saveFiles } from './functions'
 
 params.options = [:]
+def options    = initOptions(params.options)
 
 /*
  * Reformat design file and check validity
@@ -15,6 +16,8 @@ process SAMPLESHEET_CHECK {
 
     conda     (params.enable_conda ? "conda-forge::python=3.8.3" : null)
     container "quay.io/biocontainers/python:3.8.3"
+    // FastQ files checked with --check_files are read in place, so docker needs the launch directory mounted
+    containerOptions { workflow.containerEngine == 'docker' ? "-v ${workflow.launchDir}:${workflow.launchDir}:ro" : '' }
 
     input:
     path samplesheet
@@ -24,8 +27,15 @@ process SAMPLESHEET_CHECK {
 
 
     script:  // This script is bundled with the pipeline, in nf-core/cutandrun/bin/
+    // Relative FastQ paths are resolved from the launch directory, as they are when the reads are staged
     """
-    check_samplesheet.py $samplesheet samplesheet.valid.csv $params.igg_control
+    check_samplesheet.py \\
+        $samplesheet \\
+        samplesheet.valid.csv \\
+        $params.igg_control \\
+        --base_dir $workflow.launchDir \\
+        --threads $task.cpus \\
+        $options.args
     """
 }
 
@@ -16,11 +16,11 @@ process SRA_FASTQ_FTP {
         mode: params.publish_dir_mode,
         saveAs: { filename -> saveFiles(filename:filename, options:params.options, publish_dir:getSoftwareName(task.process), meta:meta, publish_by_meta:['id']) }
 
-    conda (params.enable_conda ? "conda-forge::sed=4.7" : null)
+    conda (params.enable_conda ? "conda-forge::python=3.8.3" : null)
     if (workflow.containerEngine == 'singularity' && !params.singularity_pull_docker_container) {
-        container "https://containers.biocontainers.pro/s3/SingImgsRepo/biocontainers/v1.2.0_cv1/biocontainers_v1.2.0_cv1.img"
+        container "https://depot.galaxyproject.org/singularity/python:3.8.3"
     } else {
-        container "biocontainers/biocontainers:v1.2.0_cv1"
+        container "quay.io/biocontainers/python:3.8.3"
     }
 
     input:
@@ -31,24 +31,17 @@ process SRA_FASTQ_FTP {
     tuple val(meta), path("*md5")     , emit: md5
 
     script:
+    // Both reads of a pair are fetched concurrently and verified against their md5sums as they stream in
     if (meta.single_end) {
         """
-        bash -c 'until curl $options.args -L ${fastq[0]} -o ${meta.id}.fastq.gz; do sleep 1; done';
-
-        echo "${meta.md5_1} ${meta.id}.fastq.gz" > ${meta.id}.fastq.gz.md5
-        md5sum -c ${meta.id}.fastq.gz.md5
+        echo -e "${fastq[0]}\\t${meta.md5_1}\\t${meta.id}.fastq.gz" > download_list.txt
+        fastq_download.py download_list.txt . --threads 1 $options.args
         """
     } else {
         """
-        bash -c 'until curl $options.args -L ${fastq[0]} -o ${meta.id}_1.fastq.gz; do sleep 1; done';
-
-        echo "${meta.md5_1} ${meta.id}_1.fastq.gz" > ${meta.id}_1.fastq.gz.md5
-        md5sum -c ${meta.id}_1.fastq.gz.md5
-
-        bash -c 'until curl $options.args -L ${fastq[1]} -o ${meta.id}_2.fastq.gz; do sleep 1; done';
-
-        echo "${meta.md5_2} ${meta.id}_2.fastq.gz" > ${meta.id}_2.fastq.gz.md5
-        md5sum -c ${meta.id}_2.fastq.gz.md5
+        echo -e "${fastq[0]}\\t${meta.md5_1}\\t${meta.id}_1.fastq.gz" > download_list.txt
+        echo -e "${fastq[1]}\\t${meta.md5_2}\\t${meta.id}_2.fastq.gz" >> download_list.txt
+        fastq_download.py download_list.txt . --threads 2 $options.args
         """
     }
 }
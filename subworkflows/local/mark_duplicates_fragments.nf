@@ -0,0 +1,52 @@
+/*
+ * Fragment-level MarkDuplicates, index BAM file and run samtools stats, flagstat and idxstats
+ */
+
+params.markduplicates_options = [:]
+params.samtools_options       = [:]
+params.control_only           = false
+
+include { FRAGMENT_MARKDUPLICATES } from '../../modules/local/fragment_markduplicates'             addParams( options: params.markduplicates_options )
+include { SAMTOOLS_INDEX          } from '../../modules/nf-core/software/samtools/index/main'     addParams( options: params.samtools_options       )
+include { BAM_STATS_SAMTOOLS      } from '../nf-core/bam_stats_samtools'                          addParams( options: params.samtools_options       )
+
+workflow MARK_DUPLICATES_FRAGMENTS {
+    take:
+    bam // channel: [ val(meta), [ bam ] ]
+
+    main:
+    /*
+    * Fragment MarkDuplicates, optionally on the IgG controls only
+    */
+    if( !params.control_only ) {
+        FRAGMENT_MARKDUPLICATES ( bam )
+        out_bam = FRAGMENT_MARKDUPLICATES.out.bam
+    }
+    else {
+        bam.branch { it ->
+            target: it[0].group != 'igg'
+            control: it[0].group == 'igg'
+        }
+        .set { ch_split }
+
+        FRAGMENT_MARKDUPLICATES ( ch_split.control )
+        out_bam = FRAGMENT_MARKDUPLICATES.out.bam.mix ( ch_split.target )
+    }
+
+    /*
+    * Index BAM file and run samtools stats, flagstat and idxstats
+    */
+    SAMTOOLS_INDEX     ( out_bam )
+    BAM_STATS_SAMTOOLS ( out_bam.join(SAMTOOLS_INDEX.out.bai, by: [0]) )
+
+    emit:
+    bam              = out_bam                                // channel: [ val(meta), [ bam ] ]
+    metrics          = FRAGMENT_MARKDUPLICATES.out.metrics    // channel: [ val(meta), [ metrics ] ]
+    picard_version   = FRAGMENT_MARKDUPLICATES.out.version    // path: *.version.txt
+
+    bai              = SAMTOOLS_INDEX.out.bai                 // channel: [ val(meta), [ bai ] ]
+    stats            = BAM_STATS_SAMTOOLS.out.stats           // channel: [ val(meta), [ stats ] ]
+    flagstat         = BAM_STATS_SAMTOOLS.out.flagstat        // channel: [ val(meta), [ flagstat ] ]
+    idxstats         = BAM_STATS_SAMTOOLS.out.idxstats        // channel: [ val(meta), [ idxstats ] ]
+    samtools_version = SAMTOOLS_INDEX.out.version             // path: *.version.txt
+}
@@ -35,10 +35,6 @@ if (anno_readme && file(anno_readme).exists()) {
 // Stage dummy file to be used as an optional input where required
 ch_dummy_file = file("$projectDir/assets/dummy_file.txt", checkIfExists: true)
 
-// Stage awk files for parsing log files
-ch_bt2_to_csv_awk     = file("$projectDir/assets/awk/bt2_report_to_csv.awk"    , checkIfExists: true)
-ch_dt_frag_to_csv_awk = file("$projectDir/assets/awk/dt_frag_report_to_csv.awk", checkIfExists: true)
-
 /*
 ========================================================================================
     CONFIG FILES
@@ -130,19 +126,23 @@ if (!params.skip_markduplicates) {
     }
 }
 
+// Fragment-level duplicate marking publishes like Picard but takes its own arguments
+def fragment_markduplicates_options = picard_markduplicates_options + [args: modules["fragment_markduplicates"].args]
+def fragment_deduplicates_options   = picard_deduplicates_options + [args: modules["fragment_dedup"].args]
+
 if (params.save_unaligned)         { bowtie2_align_options.publish_files.put(".gz","") }
 if (params.save_unaligned)         { bowtie2_spikein_align_options.publish_files.put(".gz","") }
 
+// Probe the FastQ files from the samplesheet check
+def samplesheet_check_options = modules["samplesheet_check"]
+if (params.check_fastq_files) {
+    samplesheet_check_options.args += " --check_files"
+}
+
 if (params.minimum_alignment_q_score > 0) {
     samtools_view_options.args = "-b -q " + params.minimum_alignment_q_score
 }
 
-// Meta annotation options
-def awk_bt2_options         = modules["awk_bt2"]
-def awk_bt2_spikein_options = modules["awk_bt2_spikein"]
-def awk_dedup_options       = modules["awk_dedup"]
-def awk_dt_frag_options     = modules["awk_dt_frag"]
-
 /*
 ========================================================================================
     IMPORT LOCAL MODULES/SUBWORKFLOWS
@@ -154,17 +154,23 @@ def awk_dt_frag_options     = modules["awk_dt_frag"]
  */
 include { GET_SOFTWARE_VERSIONS          } from "../modules/local/get_software_versions"                     addParams( options: [publish_files : ["csv":""]]               )
 include { MULTIQC                        } from "../modules/local/multiqc"                                   addParams( options: multiqc_options                            )
-include { INPUT_CHECK                    } from "../subworkflows/local/input_check"                          addParams( options: [:]                                        )
+include { INPUT_CHECK                    } from "../subworkflows/local/input_check"                          addParams( options: samplesheet_check_options                 )
 include { CAT_FASTQ                      } from "../modules/local/cat_fastq"                                 addParams( options: cat_fastq_options                          )
 include { BEDTOOLS_GENOMECOV_SCALE       } from "../modules/local/bedtools_genomecov_scale"                  addParams( options: modules["bedtools_genomecov_bedgraph"]     )
 include { IGV_SESSION                    } from "../modules/local/igv_session"                               addParams( options: modules["igv"]                             )
 include { EXPORT_META                    } from "../modules/local/export_meta"                               addParams( options: modules["export_meta"]                     )
+include { COLLECT_META                   } from "../modules/local/collect_meta"                              addParams( options: modules["collect_meta"]                    )
+include { EXPORT_FRAGMENTS               } from "../modules/local/export_fragments"                          addParams( options: modules["export_fragments"]                )
+include { GENERATE_STATS                 } from "../modules/local/generate_stats"                            addParams( options: modules["generate_stats"]                  )
 include { GENERATE_REPORTS               } from "../modules/local/generate_reports"                          addParams( options: modules["generate_reports"]                )
 include { DEEPTOOLS_BAMPEFRAGMENTSIZE    } from "../modules/local/software/deeptools/bamPEFragmentSize/main" addParams( options: modules["deeptools_fragmentsize"]          )
-include { AWK as AWK_FRAG_BIN            } from "../modules/local/awk"                                       addParams( options: modules["awk_frag_bin"]                    )
 include { AWK as AWK_EDIT_PEAK_BED       } from "../modules/local/awk"                                       addParams( options: modules["awk_edit_peak_bed"]               )
+include { EXPORT_COVERAGE                } from "../modules/local/export_coverage"                           addParams( options: modules["export_coverage"]                 )
+include { FRAGMENT_TRACKS                } from "../modules/local/fragment_tracks"                           addParams( options: modules["fragment_tracks"]                 )
+include { COMPUTE_MATRIX as COMPUTE_MATRIX_GENE  } from "../modules/local/compute_matrix"                       addParams( options: modules["dt_compute_mat_gene"]             )
+include { COMPUTE_MATRIX as COMPUTE_MATRIX_PEAKS } from "../modules/local/compute_matrix"                       addParams( options: modules["dt_compute_mat_peaks"]            )
+include { CONSENSUS_COUNTS               } from "../modules/local/consensus_counts"                          addParams( options: modules["consensus_counts"]                )
 include { DESEQ2_DIFF                    } from "../modules/local/deseq2_diff"                               addParams( options: modules["deseq2"],  multiqc_label: "deseq2")
-include { SAMTOOLS_CUSTOMVIEW            } from "../modules/local/software/samtools/custom_view/main"        addParams( options: modules["samtools_frag_len"]               )
 include { SEACR_CALLPEAK as SEACR_NO_IGG } from "../modules/local/seacr_no_igg"                              addParams( options: modules["seacr"]                           )
 
 /*
@@ -173,11 +179,8 @@ include { SEACR_CALLPEAK as SEACR_NO_IGG } from "../modules/local/seacr_no_igg"
 include { PREPARE_GENOME }                                  from "../subworkflows/local/prepare_genome"           addParams( genome_options: genome_options, spikein_genome_options: spikein_genome_options, bt2_index_options: bowtie2_index_options, bt2_spikein_index_options: bowtie2_spikein_index_options )
 include { ALIGN_BOWTIE2 }                                   from "../subworkflows/local/align_bowtie2"            addParams( align_options: bowtie2_align_options, spikein_align_options: bowtie2_spikein_align_options, samtools_spikein_options: samtools_spikein_sort_options )
 include { SAMTOOLS_VIEW_SORT_STATS }                        from "../subworkflows/local/samtools_view_sort_stats" addParams( samtools_options: samtools_qfilter_options, samtools_view_options: samtools_view_options )
-include { CALCULATE_FRAGMENTS }                             from "../subworkflows/local/calculate_fragments"      addParams( samtools_options: modules["calc_frag_samtools"], samtools_view_options: modules["calc_frag_samtools_view"], bamtobed_options: modules["calc_frag_bamtobed"], awk_options: modules["calc_frag_awk"], cut_options: modules["calc_frag_cut"] )
-include { ANNOTATE_META_AWK as ANNOTATE_BT2_META }          from "../subworkflows/local/annotate_meta_awk"        addParams( options: awk_bt2_options, meta_suffix: "_target", script_mode: true )
-include { ANNOTATE_META_AWK as ANNOTATE_BT2_SPIKEIN_META }  from "../subworkflows/local/annotate_meta_awk"        addParams( options: awk_bt2_spikein_options, meta_suffix: "_spikein", script_mode: true )
-include { ANNOTATE_META_AWK as ANNOTATE_DEDUP_META }        from "../subworkflows/local/annotate_meta_awk"        addParams( options: awk_dedup_options, meta_suffix: "",meta_prefix: "dedup_", script_mode: false )
-include { ANNOTATE_META_AWK as ANNOTATE_DT_FRAG_META }      from "../subworkflows/local/annotate_meta_awk"        addParams( options: awk_dt_frag_options, meta_suffix: "", meta_prefix: "", script_mode: true )
+include { MARK_DUPLICATES_FRAGMENTS }                       from "../subworkflows/local/mark_duplicates_fragments" addParams( markduplicates_options: fragment_markduplicates_options, samtools_options: picard_markduplicates_samtools_options, control_only: false )
+include { MARK_DUPLICATES_FRAGMENTS as DEDUP_FRAGMENTS }    from "../subworkflows/local/mark_duplicates_fragments" addParams( markduplicates_options: fragment_deduplicates_options, samtools_options: picard_deduplicates_samtools_options, control_only: dedup_control_only )
 
 /*
 ========================================================================================
@@ -193,7 +196,6 @@ include { DEEPTOOLS_COMPUTEMATRIX as DEEPTOOLS_COMPUTEMATRIX_GENE  } from "../mo
 include { DEEPTOOLS_COMPUTEMATRIX as DEEPTOOLS_COMPUTEMATRIX_PEAKS } from "../modules/nf-core/software/deeptools/computematrix/main" addParams( options: modules["dt_compute_mat_peaks"]  )
 include { DEEPTOOLS_PLOTHEATMAP as DEEPTOOLS_PLOTHEATMAP_GENE      } from "../modules/nf-core/software/deeptools/plotheatmap/main"   addParams( options: modules["dt_plotheatmap_gene"]   )
 include { DEEPTOOLS_PLOTHEATMAP as DEEPTOOLS_PLOTHEATMAP_PEAKS     } from "../modules/nf-core/software/deeptools/plotheatmap/main"   addParams( options: modules["dt_plotheatmap_peaks"]  )
-include { SAMTOOLS_SORT                                            } from "../modules/nf-core/software/samtools/sort/main.nf"        addParams( options: modules["samtools_sort"]         )
 include { SEACR_CALLPEAK                                           } from "../modules/nf-core/software/seacr/callpeak/main"          addParams( options: modules["seacr"]                 )
 include { UCSC_BEDCLIP                                             } from "../modules/nf-core/software/ucsc/bedclip/main"            addParams( options: modules["ucsc_bedclip"]          )
 
@@ -334,7 +336,17 @@ workflow CUTANDRUN {
      * SUBWORKFLOW: Mark duplicates on all samples
      */
     ch_markduplicates_multiqc = Channel.empty()
-    if (!params.skip_markduplicates) {
+    if (!params.skip_markduplicates && params.dedup_mode == "fragment") {
+        MARK_DUPLICATES_FRAGMENTS (
+            ch_samtools_bam
+        )
+        ch_samtools_bam           = MARK_DUPLICATES_FRAGMENTS.out.bam
+        ch_samtools_bai           = MARK_DUPLICATES_FRAGMENTS.out.bai
+        ch_samtools_stats         = MARK_DUPLICATES_FRAGMENTS.out.stats
+        ch_samtools_flagstat      = MARK_DUPLICATES_FRAGMENTS.out.flagstat
+        ch_samtools_idxstats      = MARK_DUPLICATES_FRAGMENTS.out.idxstats
+        ch_markduplicates_multiqc = MARK_DUPLICATES_FRAGMENTS.out.metrics
+    } else if (!params.skip_markduplicates) {
         MARK_DUPLICATES_PICARD (
             ch_samtools_bam
         )
@@ -353,7 +365,17 @@ workflow CUTANDRUN {
      * SUBWORKFLOW: Remove duplicates - default is on IgG controls only
      */
     ch_dedup_multiqc = Channel.empty()
-    if (!params.skip_markduplicates && !params.skip_removeduplicates) {
+    if (!params.skip_markduplicates && !params.skip_removeduplicates && params.dedup_mode == "fragment") {
+        DEDUP_FRAGMENTS (
+            ch_samtools_bam
+        )
+        ch_samtools_bam      = DEDUP_FRAGMENTS.out.bam
+        ch_samtools_bai      = DEDUP_FRAGMENTS.out.bai
+        ch_samtools_stats    = DEDUP_FRAGMENTS.out.stats
+        ch_samtools_flagstat = DEDUP_FRAGMENTS.out.flagstat
+        ch_samtools_idxstats = DEDUP_FRAGMENTS.out.idxstats
+        ch_dedup_multiqc     = DEDUP_FRAGMENTS.out.metrics
+    } else if (!params.skip_markduplicates && !params.skip_removeduplicates) {
         DEDUP_PICARD (
             ch_samtools_bam
         )
@@ -367,38 +389,13 @@ workflow CUTANDRUN {
     //EXAMPLE CHANNEL STRUCT: [[id:h3k27me3_R1, group:h3k27me3, replicate:1, single_end:false], [BAM]]
     //ch_samtools_bam | view
 
-    /*
-     * SUBWORKFLOW: Annotate meta-data with aligner stats for target and spike-in
-     * the meta-data is annotated additivley so we only need to track the final channel output
-     */
-    if (params.aligner == "bowtie2") {
-        ANNOTATE_BT2_META (
-            ch_samtools_bam,
-            ch_bowtie2_log,
-            ch_bt2_to_csv_awk
-        )
-
-        ANNOTATE_BT2_SPIKEIN_META (
-            ANNOTATE_BT2_META.out.output,
-            ch_bowtie2_spikein_log,
-            ch_bt2_to_csv_awk
-        )
-        ch_samtools_bam = ANNOTATE_BT2_SPIKEIN_META.out.output
-    }
-    // META-DATA example state:
-    //[[id:h3k27me3_R1, group:h3k27me3, replicate:1, single_end:false,
-    // bt2_total_reads_spikein:9616, bt2_align1_spikein:1, bt2_align_gt1_spikein:0, bt2_non_aligned_spikein:9615, bt2_total_aligned_spikein:1,
-    // bt2_total_reads_target:9616, bt2_align1_target:315, bt2_align_gt1_target:449, bt2_non_aligned_target:8852, bt2_total_aligned_target:764], BAM]
-    //ch_samtools_bam | view
-    //EXPORT_META ( ch_annotated_meta.collect{ it[0] } )
-
     /*
      * CHANNEL: Calculate scale factor for each sample based on a constant devided by the number
-     *          of reads aligned to the spike-in genome
+     *          of reads aligned to the spike-in genome, read directly from the spike-in bowtie2 log
      */
-    ch_samtools_bam
+    ch_bowtie2_spikein_log
         .map { row ->
-            def denominator = row[0].find{ it.key == "bt2_total_aligned_spikein" }?.value.toInteger()
+            def denominator = WorkflowCutandrun.getBowtie2AlignedCount(row[1].text)
             [ row[0].id, params.normalisation_c / (denominator != 0 ? denominator : 1) ]
         }
         .set { ch_scale_factor }
@@ -416,10 +413,7 @@ workflow CUTANDRUN {
             row[0].put("scale_factor", row[2])
             [ row[0], row[1], row[2] ] }
         .set { ch_samtools_bam_scale }
-    //EXAMPLE CHANNEL STRUCT: [[id:h3k27me3_R1, group:h3k27me3, replicate:1, single_end:false,
-    // bt2_total_reads_target:9616, bt2_align1_target:315, bt2_align_gt1_target:449, bt2_non_aligned_target:8852, bt2_total_aligned_target:764,
-    // bt2_total_reads_spikein:9616, bt2_align1_spikein:1, bt2_align_gt1_spikein:0, bt2_non_aligned_spikein:9615, bt2_total_aligned_spikein:1,
-    // scale_factor:10000], BAM, SCALE_FACTOR]
+    //EXAMPLE CHANNEL STRUCT: [[id:h3k27me3_R1, group:h3k27me3, replicate:1, single_end:false, scale_factor:10000], BAM, SCALE_FACTOR]
     //ch_samtools_bam_scale | view
 
     /*
@@ -429,25 +423,32 @@ workflow CUTANDRUN {
         .map { row -> [ row[0], row[1] ] }
         .set { ch_samtools_bam_sf }
     ch_samtools_bam = ch_samtools_bam_sf
-    //EXAMPLE CHANNEL STRUCT: [[id:h3k27me3_R1, group:h3k27me3, replicate:1, single_end:false,
-    // bt2_total_reads_target:9616, bt2_align1_target:315, bt2_align_gt1_target:449, bt2_non_aligned_target:8852, bt2_total_aligned_target:764,
-    // bt2_total_reads_spikein:9616, bt2_align1_spikein:1, bt2_align_gt1_spikein:0, bt2_non_aligned_spikein:9615, bt2_total_aligned_spikein:1,
-    // scale_factor:10000], BAM]
+    //EXAMPLE CHANNEL STRUCT: [[id:h3k27me3_R1, group:h3k27me3, replicate:1, single_end:false, scale_factor:10000], BAM]
     //ch_samtools_bam | view
 
     /*
-     * SUBWORKFLOW: Calculate fragment bed from bams
-     * - Filter for mapped reads
-     * - Convert to bed file
-     * - Keep the read pairs that are on the same chromosome and fragment length less than 1000bp
-     * - Only extract the fragment related columns using cut
+     * MODULE: Export the fragments of each bam to an indexed fragments file shared by downstream reporting
      */
-    CALCULATE_FRAGMENTS (
+    EXPORT_FRAGMENTS (
         ch_samtools_bam
+            .map { row -> [ row[0].id, row[0], row[1] ] }
+            .join ( ch_samtools_bai.map { row -> [ row[0].id, row[1] ] } )
+            .map { row -> [ row[1], row[2], row[3] ] }
     )
-    ch_software_versions = ch_software_versions.mix(CALCULATE_FRAGMENTS.out.bedtools_version.first().ifEmpty(null))
-    //EXAMPLE CHANNEL STRUCT: NO CHANGE
-    //CALCULATE_FRAGMENTS.out.bed | view
+    //EXAMPLE CHANNEL STRUCT: [[META], FRAGMENTS, TBI]
+    //EXPORT_FRAGMENTS.out.fragments | view
+
+    /*
+     * MODULE: Write coverage tracks per fragment length class and normalisation in one pass over each fragments file
+     */
+    if (params.fragment_tracks) {
+        FRAGMENT_TRACKS (
+            EXPORT_FRAGMENTS.out.fragments,
+            PREPARE_GENOME.out.chrom_sizes
+        )
+        //EXAMPLE CHANNEL STRUCT: [[META], [TRACKS]]
+        //FRAGMENT_TRACKS.out.tracks | view
+    }
 
     /*
      * MODULE: Convert bam files to bedgraph
@@ -459,6 +460,7 @@ workflow CUTANDRUN {
     // bt2_total_reads_target:9616, bt2_align1_target:315, bt2_align_gt1_target:449, bt2_non_aligned_target:8852, bt2_total_aligned_target:764,
     // bt2_total_reads_spikein:9616, bt2_align1_spikein:1, bt2_align_gt1_spikein:0, bt2_non_aligned_spikein:9615, bt2_total_aligned_spikein:1,
     // scale_factor:10000], BEDGRAPH]
+    ch_software_versions = ch_software_versions.mix(BEDTOOLS_GENOMECOV_SCALE.out.version.first().ifEmpty(null))
     //BEDTOOLS_GENOMECOV_SCALE.out.bedgraph | view
 
     /*
@@ -558,6 +560,7 @@ workflow CUTANDRUN {
         IGV_SESSION (
             PREPARE_GENOME.out.fasta,
             PREPARE_GENOME.out.gtf,
+            PREPARE_GENOME.out.chrom_sizes,
             ch_seacr_bed.collect{it[1]}.ifEmpty([]),
             UCSC_BEDGRAPHTOBIGWIG.out.bigwig.collect{it[1]}.ifEmpty([])
         )
@@ -582,13 +585,34 @@ workflow CUTANDRUN {
             .set { ch_bigwig_no_igg }
         //ch_bigwig_no_igg | view
 
+        /*
+         * MODULE: Convert the clipped bedgraphs, without IgG, to memory-mapped coverage stores for the native matrix engine
+         */
+        ch_coverage_no_igg = Channel.empty()
+        if (params.matrix_engine == "native") {
+            EXPORT_COVERAGE (
+                UCSC_BEDCLIP.out.bedgraph.filter { it[0].group != "igg" },
+                PREPARE_GENOME.out.chrom_sizes
+            )
+            ch_coverage_no_igg = EXPORT_COVERAGE.out.coverage
+        }
+        //EXAMPLE CHANNEL STRUCT: [[META], COVERAGE_STORE]
+        //ch_coverage_no_igg | view
+
+        /*
+        * MODULE: Build consensus peaks and count the fragments of every sample in them
+        */
+        CONSENSUS_COUNTS (
+            ch_seacr_bed.collect{it[1]},
+            EXPORT_FRAGMENTS.out.fragments.collect{ [ it[1], it[2] ] }
+        )
+
         /*
         * MODULE: DESeq2 QC Analysis
         */
         DESEQ2_DIFF (
             ch_groups_no_igg,
-            ch_seacr_bed.collect{it[1]},
-            ch_samtools_bam.collect{it[1]}
+            CONSENSUS_COUNTS.out.counts
         )
         ch_software_versions = ch_software_versions.mix(DESEQ2_DIFF.out.version.ifEmpty(null))
 
@@ -596,17 +620,43 @@ workflow CUTANDRUN {
         * MODULE: Compute DeepTools matrix used in heatmap plotting for Genes
         */
         if (params.gene_bed){
-            DEEPTOOLS_COMPUTEMATRIX_GENE (
-                ch_bigwig_no_igg,
-                PREPARE_GENOME.out.bed
-            )
-            ch_software_versions = ch_software_versions.mix(DEEPTOOLS_COMPUTEMATRIX_GENE.out.version.first().ifEmpty(null))
+            if (params.matrix_engine == "native") {
+                /*
+                * MODULE: Compute the gene matrices for all samples in one process pool
+                */
+                COMPUTE_MATRIX_GENE (
+                    ch_coverage_no_igg
+                        .map { row -> row[1] }
+                        .collect()
+                        .combine( PREPARE_GENOME.out.bed )
+                        .map { row -> [ [id:"genes"], row[0..-2], row[-1] ] },
+                    PREPARE_GENOME.out.chrom_sizes
+                )
+
+                /*
+                * CHANNEL: Give each gene matrix back its sample meta-data
+                */
+                COMPUTE_MATRIX_GENE.out.matrix
+                    .map { row -> row[1] }
+                    .flatten()
+                    .map { row -> [ row.name.split("\\.")[0], row ] }
+                    .join ( ch_coverage_no_igg.map { row -> [ row[0].id, row[0] ] } )
+                    .map { row -> [ row[2], row[1] ] }
+                    .set { ch_gene_matrix }
+            } else {
+                DEEPTOOLS_COMPUTEMATRIX_GENE (
+                    ch_bigwig_no_igg,
+                    PREPARE_GENOME.out.bed
+                )
+                ch_software_versions = ch_software_versions.mix(DEEPTOOLS_COMPUTEMATRIX_GENE.out.version.first().ifEmpty(null))
+                ch_gene_matrix = DEEPTOOLS_COMPUTEMATRIX_GENE.out.matrix
+            }
 
         /*
         * MODULE: Calculate DeepTools heatmap
         */
             DEEPTOOLS_PLOTHEATMAP_GENE (
-                DEEPTOOLS_COMPUTEMATRIX_GENE.out.matrix
+                ch_gene_matrix
             )
         }
 
@@ -637,9 +687,9 @@ workflow CUTANDRUN {
         //ch_seacr_bed_id | view
 
         /*
-         * CHANNEL: Join beds and bigwigs on id
+         * CHANNEL: Join beds and bigwigs, or coverage stores for the native matrix engine, on id
          */
-        ch_bigwig_no_igg
+        ( params.matrix_engine == "native" ? ch_coverage_no_igg : ch_bigwig_no_igg )
             .map { row -> [row[0].id, row ].flatten()}
             .join ( ch_seacr_bed_id )
             .set { ch_dt_peaks }
@@ -658,10 +708,19 @@ workflow CUTANDRUN {
         /*
         * MODULE: Compute DeepTools matrix used in heatmap plotting for Peaks
         */
-        DEEPTOOLS_COMPUTEMATRIX_PEAKS (
-            ch_ordered_bigwig,
-            ch_ordered_seacr_max
-        )
+        if (params.matrix_engine == "native") {
+            COMPUTE_MATRIX_PEAKS (
+                ch_dt_peaks.map { row -> [ row[1], row[2], row[-1] ] },
+                PREPARE_GENOME.out.chrom_sizes
+            )
+            ch_peak_matrix = COMPUTE_MATRIX_PEAKS.out.matrix
+        } else {
+            DEEPTOOLS_COMPUTEMATRIX_PEAKS (
+                ch_ordered_bigwig,
+                ch_ordered_seacr_max
+            )
+            ch_peak_matrix = DEEPTOOLS_COMPUTEMATRIX_PEAKS.out.matrix
+        }
         //EXAMPLE CHANNEL STRUCT: [[id:h3k27me3_R1, group:h3k27me3, replicate:1, single_end:false,
         // bt2_total_reads_target:9616, bt2_align1_target:315, bt2_align_gt1_target:449, bt2_non_aligned_target:8852, bt2_total_aligned_target:764,
         // bt2_total_reads_spikein:9616, bt2_align1_spikein:1, bt2_align_gt1_spikein:0, bt2_non_aligned_spikein:9615, bt2_total_aligned_spikein:1,
@@ -672,69 +731,53 @@ workflow CUTANDRUN {
         * MODULE: Calculate DeepTools heatmap
         */
         DEEPTOOLS_PLOTHEATMAP_PEAKS (
-            DEEPTOOLS_COMPUTEMATRIX_PEAKS.out.matrix
+            ch_peak_matrix
         )
 
         /*
-        * SUBWORKFLOW: Annotate meta-data with duplication stats
-        */
-        if (!params.skip_markduplicates) {
-            ANNOTATE_DEDUP_META(
-                ch_samtools_bam,
-                ch_markduplicates_multiqc,
-                ch_dummy_file.collect()
-            )
-            ch_samtools_bam = ANNOTATE_DEDUP_META.out.output
-        }
-        //EXAMPLE CHANNEL STRUCT: [[id:h3k27me3_R1, group:h3k27me3, replicate:1, single_end:false,
-        // bt2_total_reads_target:9616, bt2_align1_target:315, bt2_align_gt1_target:449, bt2_non_aligned_target:8852, bt2_total_aligned_target:764,
-        // bt2_total_reads_spikein:9616, bt2_align1_spikein:1, bt2_align_gt1_spikein:0, bt2_non_aligned_spikein:9615, bt2_total_aligned_spikein:1,
-        // scale_factor:10000, dedup_library:unknown library, dedup_unpaired_reads_examined:0, dedup_read_pairs_examined:350, dedup_secondary_or_supplementary_rds:0,
-        // dedup_unmapped_reads:0, dedup_unpaired_read_duplicates:0, dedup_read_pair_duplicates:0, dedup_read_pair_optical_duplicates:0, dedup_percent_duplication:0,
-        // dedup_estimated_library_size:], BAM]
-        //ch_samtools_bam | view
-
-        /*
-        * MODULE: Bin the fragments into 500bp bins ready for downstream reporting
+        * MODULE: Export meta-data to csv file
         */
-        AWK_FRAG_BIN(
-            CALCULATE_FRAGMENTS.out.bed
+        EXPORT_META (
+            ch_samtools_bam.collect{it[0]}.ifEmpty(["{NO-DATA}"])
         )
-        //AWK_FRAG_BIN.out.file | view
 
         /*
-        * MODULE: Calculate fragment lengths
+        * MODULE: Add the aligner and duplication report stats for all samples to the meta-data in one pass
         */
-        SAMTOOLS_CUSTOMVIEW (
-            ch_samtools_bam,
-            ch_samtools_bai
+        COLLECT_META (
+            EXPORT_META.out.csv,
+            ch_bowtie2_log.collect{it[1]}.ifEmpty([]),
+            ch_bowtie2_spikein_log.collect{it[1]}.ifEmpty([]),
+            ch_markduplicates_multiqc.collect{it[1]}.ifEmpty([])
         )
-        //SAMTOOLS_CUSTOMVIEW.out.tsv | view
 
         /*
-        * MODULE: Sort bams by mate pair ids (no position)
+        * CHANNEL: Join the per-sample reporting inputs on id, samples without peaks get the dummy file
         */
-        SAMTOOLS_SORT (
-            ch_samtools_bam
-        )
-        //SAMTOOLS_SORT.out.bam | view
+        EXPORT_FRAGMENTS.out.fragments
+            .map { row -> [ row[0].id, row[0], row[1], row[2] ] }
+            .join ( ch_seacr_bed.map { row -> [ row[0].id, row[1] ] }, remainder: true )
+            .filter { row -> row[1] != null }
+            .map { row -> [ row[1], row[2], row[3], row[4] ?: ch_dummy_file ] }
+            .set { ch_report_inputs }
+        //EXAMPLE CHANNEL STRUCT: [[META], FRAGMENTS, TBI, PEAK_BED]
+        //ch_report_inputs | view
 
         /*
-        * MODULE: Export meta-data to csv file
+        * MODULE: Compute per-sample report stats in parallel as samples complete
         */
-        EXPORT_META (
-            ch_samtools_bam.collect{it[0]}.ifEmpty(["{NO-DATA}"])
+        GENERATE_STATS (
+            ch_report_inputs,
+            ch_blacklist
         )
 
         /*
-        * MODULE: Generate python reporting using mixture of meta-data and direct file processing
+        * MODULE: Generate python reporting by aggregating the meta-data and per-sample stats
         */
         GENERATE_REPORTS(
-            EXPORT_META.out.csv,                        // meta-data report stats
-            SAMTOOLS_CUSTOMVIEW.out.tsv.collect{it[1]}, // raw fragments
-            AWK_FRAG_BIN.out.file.collect{it[1]},       // binned fragments
-            ch_seacr_bed.collect{it[1]},                // peak beds
-            SAMTOOLS_SORT.out.bam.collect{it[1]}        // bam files sorted by mate pair ids
+            COLLECT_META.out.csv,                       // meta-data report stats
+            GENERATE_STATS.out.stats.collect{it[1]},    // per-sample stats shards
+            params.gene_bed ? PREPARE_GENOME.out.bed : ch_dummy_file  // genes to annotate peaks with
         )
         ch_software_versions = ch_software_versions.mix(GENERATE_REPORTS.out.version.ifEmpty(null))
     }